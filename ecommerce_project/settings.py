@@ -45,10 +45,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'store.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
      'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -66,6 +67,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.cart_count',
             ],
         },
     },
@@ -124,6 +126,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Razorpay Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID', default='rzp_test_RQ6kCFDcF0Vmwa')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET', default='7oT5d3o3EbfRlKSVmnRI5gM1')
+# Secret set on the webhook in the Razorpay dashboard; webhooks are refused without it
+# (POST /webhooks/razorpay/, processed by python manage.py process_payment_events)
+RAZORPAY_WEBHOOK_SECRET = config('RAZORPAY_WEBHOOK_SECRET', default='')
 
 
 
@@ -134,5 +139,69 @@ COMPANY_ADDRESS = config('COMPANY_ADDRESS', default='123, Business Street, City
 COMPANY_PHONE = config('COMPANY_PHONE', default='+91-9876543210')
 COMPANY_EMAIL = config('COMPANY_EMAIL', default='info@yourcompany.com')
 
+# Invoice PDF backend: 'html' (xhtml2pdf) or 'reportlab'
+INVOICE_RENDERER = config('INVOICE_RENDERER', default='html')
+
+# Local memory by default. Set CACHE_LOCATION to a directory to use the
+# file-based backend, which all gunicorn workers share; with local memory,
+# other workers only see a fragment invalidation once their copy expires.
+CACHE_LOCATION = config('CACHE_LOCATION', default='')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Rendered home/category fragments (store.fragments; staff see hit/miss counts at /fragment-cache-stats/)
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# max-age (seconds) of public catalog pages; they are revalidated with ETag/Last-Modified
+CATALOG_CACHE_MAX_AGE = 60
+
+# Products per category page (keyset paginated)
+CATALOG_PAGE_SIZE = 24
+
+# Deepest search results page served; later pages fall back to the first
+SEARCH_MAX_PAGE = 1000
+
+# Orders per page of My Orders (keyset paginated)
+ORDERS_PAGE_SIZE = 20
+
+# Widths (px) of the resized product/category images in srcset
+# (python manage.py generate_image_derivatives)
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 1024]
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# "Frequently bought together" neighbours kept per product, and how old (minutes)
+# an order must be before it is counted, so late payments are not skipped
+# (python manage.py build_recommendations)
+RECOMMENDATIONS_PER_PRODUCT = 8
+RECOMMENDATION_SETTLE_MINUTES = 60
+
+# Seconds a checkout holds stock (python manage.py expire_stock_reservations)
+STOCK_RESERVATION_TTL = 15 * 60
+
+# python manage.py purge_stale_data: anonymous carts untouched for this many days
+# are deleted, and invoice files no order refers to once they are this many
+# seconds old
+ABANDONED_CART_DAYS = 30
+INVOICE_ORPHAN_MIN_AGE = 60 * 60
+
+# Invoice job queue (python manage.py run_invoice_worker)
+INVOICE_JOB_MAX_ATTEMPTS = 5
+INVOICE_JOB_BACKOFF_SECONDS = 30
+INVOICE_JOB_MAX_BACKOFF_SECONDS = 3600
+
+# Sessions (store.sessions). Anonymous visitors get a signed-cookie session, or
+# set ANONYMOUS_SESSION_ENGINE=django.contrib.sessions.backends.cache for one in
+# CACHES; it moves into the database once they have a cart or log in. A session
+# is re-saved to slide its expiry only in the last SESSION_REFRESH_WINDOW seconds
+# of SESSION_COOKIE_AGE, not on every request.
 SESSION_COOKIE_AGE = 86400
-SESSION_SAVE_EVERY_REQUEST = True
\ No newline at end of file
+SESSION_REFRESH_WINDOW = 6 * 60 * 60
+ANONYMOUS_SESSION_ENGINE = config('ANONYMOUS_SESSION_ENGINE', default='django.contrib.sessions.backends.signed_cookies')
+ANONYMOUS_SESSION_COOKIE_NAME = 'anonsessionid'
@@ -1,5 +1,20 @@
 from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .models import (
+    Category, Product, Cart, CartItem, Order, OrderItem, InvoiceJob, StockReservation, GstSummary, PaymentEvent,
+)
+from .exports import csv_chunks, ndjson_chunks, stream_csv, streaming_download
+from .gst_reports import GROUPINGS, current_month, parse_month, report
+from .orders import (
+    ACCOUNTING_HEADER, accounting_csv_rows, accounting_documents, filter_orders, iter_orders_with_lines,
+)
+from .jobs import enqueue_invoice
+from .inventory import cancel_order
+from .search import match_queryset
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -15,9 +30,15 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['is_active', 'featured', 'stock']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Served from the full-text index instead of LIKE '%term%' scans
+        if not search_term.strip():
+            return queryset, False
+        return match_queryset(queryset, search_term), False
+
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'session_key', 'created_at', 'get_total_items']
+    list_display = ['id', 'user', 'session_key', 'created_at', 'get_total_items', 'subtotal']
     list_filter = ['created_at']
 
 @admin.register(CartItem)
@@ -36,6 +57,8 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ['order_id', 'email', 'phone', 'full_name']
     readonly_fields = ['order_id', 'razorpay_order_id', 'razorpay_payment_id', 'created_at']
     inlines = [OrderItemInline]
+    actions = ['cancel_and_restock']
+    change_list_template = 'admin/store/order/change_list.html'
     
     fieldsets = (
         ('Order Info', {
@@ -52,3 +75,115 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('invoice_generated', 'invoice_file')
         }),
     )
+
+    @admin.action(description='Cancel selected orders and restock items')
+    def cancel_and_restock(self, request, queryset):
+        cancelled = sum(cancel_order(order) for order in queryset)
+        self.message_user(request, f"{cancelled} order(s) cancelled and restocked.")
+
+    def get_urls(self):
+        return [
+            path('export/', self.admin_site.admin_view(self.export_view), name='store_order_export'),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        """
+        Streams orders and their lines for accounting:
+        ?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD&status=...&paid=yes|no&gzip=1
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            orders = filter_orders(request.GET)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        rows = iter_orders_with_lines(orders)
+        compress = bool(request.GET.get('gzip'))
+        if request.GET.get('format') == 'ndjson':
+            return streaming_download('orders.ndjson', ndjson_chunks(accounting_documents(rows)),
+                                      'application/x-ndjson', compress=compress)
+        return streaming_download('orders.csv', csv_chunks(ACCOUNTING_HEADER, accounting_csv_rows(rows)),
+                                  'text/csv', compress=compress)
+
+
+@admin.register(InvoiceJob)
+class InvoiceJobAdmin(admin.ModelAdmin):
+    list_display = ['order', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['order__order_id']
+    readonly_fields = ['order', 'attempts', 'last_error', 'created_at', 'updated_at']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected invoice jobs')
+    def retry_jobs(self, request, queryset):
+        for job in queryset.select_related('order'):
+            enqueue_invoice(job.order)
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event', 'payment_id', 'razorpay_order_id', 'status', 'received_at']
+    list_filter = ['status', 'event']
+    search_fields = ['event_id', 'payment_id', 'razorpay_order_id']
+    readonly_fields = ['event_id', 'event', 'payment_id', 'razorpay_order_id', 'payload', 'last_error',
+                       'received_at', 'updated_at']
+    actions = ['retry_events']
+
+    @admin.action(description='Process selected events again')
+    def retry_events(self, request, queryset):
+        queryset.update(status='pending', updated_at=timezone.now())
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'cart', 'order', 'expires_at']
+    list_filter = ['expires_at']
+    raw_id_fields = ['product', 'cart', 'order']
+
+
+@admin.register(GstSummary)
+class GstSummaryAdmin(admin.ModelAdmin):
+    list_display = ['period', 'state', 'hsn_code', 'gst_rate', 'taxable_value', 'gst_amount', 'lines']
+    list_filter = ['period', 'gst_rate', 'state']
+    search_fields = ['hsn_code', 'state']
+    change_list_template = 'admin/store/gstsummary/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('report/', self.admin_site.admin_view(self.report_view), name='store_gstsummary_report'),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        month = current_month().strftime('%Y-%m')
+        try:
+            start = parse_month(request.GET.get('from') or month)
+            end = parse_month(request.GET.get('to') or request.GET.get('from') or month)
+        except ValueError:
+            start = end = parse_month(month)
+        by = request.GET.get('by') if request.GET.get('by') in GROUPINGS else 'hsn'
+        result = report(start, max(start, end), by=by, refresh=bool(request.GET.get('refresh')))
+
+        if request.GET.get('format') == 'csv':
+            amounts = ['taxable_value', 'gst_amount', 'total', 'quantity', 'lines']
+            return stream_csv(
+                f"gst-{start:%Y-%m}-{end:%Y-%m}-{by}.csv",
+                result['columns'] + amounts,
+                ([row[column] for column in result['columns'] + amounts] for row in result['rows']),
+            )
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'GST report',
+            'result': result,
+            'start': start,
+            'end': end,
+            'by': by,
+            'groupings': list(GROUPINGS),
+        }
+        return TemplateResponse(request, 'admin/store/gstsummary/report.html', context)
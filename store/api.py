@@ -0,0 +1,220 @@
+"""
+Read-only JSON catalog API for the mobile app and partner feeds.
+
+    GET /api/categories/?fields=id,name&after=<cursor>&limit=50
+    GET /api/products/?fields=id,name,selling_price&category=<slug>&sort=price_asc&after=<cursor>
+    GET /api/products/batch/?ids=1,2,3&slugs=red-shirt,blue-shirt
+
+Only the requested fields are selected, and rows are serialized straight from
+.values() querysets, so no model instances are built. Lists page with the
+keyset cursors of store.catalog. Every response carries a strong ETag over
+its body and answers a matching If-None-Match with a 304.
+"""
+import hashlib
+import json
+from functools import wraps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+from .catalog import MAX_ID, SORT_OPTIONS, keyset_page, valid_id
+from .models import Category, Product
+
+# API field name -> column or expression passed to .values()
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'description': 'description',
+    'category_id': 'category_id',
+    'category_slug': F('category__slug'),
+    'price': 'price',
+    'discounted_price': 'discounted_price',
+    'selling_price': 'selling_price',
+    'discount_pct': 'discount_pct',
+    'stock': 'stock',
+    'hsn_code': 'hsn_code',
+    'gst_rate': 'gst_rate',
+    'featured': 'featured',
+    'image': 'image',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+PRODUCT_DEFAULT_FIELDS = ['id', 'name', 'slug', 'selling_price', 'image']
+
+CATEGORY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'description': 'description',
+    'image': 'image',
+    'updated_at': 'updated_at',
+}
+CATEGORY_DEFAULT_FIELDS = ['id', 'name', 'slug']
+CATEGORY_ORDERING = ('name', 'id')
+
+MAX_LIMIT = 100
+MAX_BATCH = 100
+
+
+class BadRequest(Exception):
+    pass
+
+
+def api_view(view):
+    """
+    Turns BadRequest into a 400 JSON error response.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    return wrapper
+
+
+def parse_fields(request, available, default):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    fields = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    return fields
+
+
+def parse_limit(request, default=50):
+    limit = request.GET.get('limit', '')
+    if not limit:
+        return default
+    if not limit.isdecimal() or not 1 <= int(limit) <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return int(limit)
+
+
+def parse_list(request, name):
+    return [value for value in request.GET.get(name, '').split(',') if value]
+
+
+def select(queryset, available, fields, extra=()):
+    """
+    .values() queryset selecting `fields` plus any `extra` columns (such as the
+    sort key), with expressions aliased to their API names.
+    """
+    columns = {}
+    expressions = {}
+    for name in list(fields) + [name for name in extra if name not in fields]:
+        source = available.get(name, name)
+        if isinstance(source, str) and source == name:
+            columns[name] = None
+        else:
+            expressions[name] = source
+    return queryset.values(*columns, **expressions)
+
+
+def to_output(rows, fields):
+    """
+    Keeps only the requested fields of each row and turns image paths into URLs.
+    """
+    output = []
+    for row in rows:
+        item = {name: row[name] for name in fields}
+        if 'image' in item:
+            item['image'] = default_storage.url(item['image']) if item['image'] else None
+        output.append(item)
+    return output
+
+
+def json_response(request, data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    etag = quote_etag(hashlib.sha256(body).hexdigest()[:32])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'CATALOG_CACHE_MAX_AGE', 60))
+    return response
+
+
+def page_response(request, queryset, ordering, fields):
+    page = keyset_page(
+        queryset, ordering,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=parse_limit(request),
+    )
+    return json_response(request, {
+        'results': to_output(page['items'], fields),
+        'next_cursor': page['next_cursor'],
+        'previous_cursor': page['previous_cursor'],
+    })
+
+
+@require_GET
+@api_view
+def category_list(request):
+    fields = parse_fields(request, CATEGORY_FIELDS, CATEGORY_DEFAULT_FIELDS)
+    rows = select(Category.objects.all(), CATEGORY_FIELDS, fields, extra=CATEGORY_ORDERING)
+    return page_response(request, rows, CATEGORY_ORDERING, fields)
+
+
+@require_GET
+@api_view
+def product_list(request):
+    fields = parse_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    sort = request.GET.get('sort', 'newest')
+    if sort not in SORT_OPTIONS:
+        raise BadRequest(f"sort must be one of: {', '.join(SORT_OPTIONS)}")
+    ordering = SORT_OPTIONS[sort]
+
+    products = Product.objects.filter(is_active=True)
+    if request.GET.get('category'):
+        products = products.filter(category__slug=request.GET['category'])
+    rows = select(products, PRODUCT_FIELDS, fields, extra=[f.lstrip('-') for f in ordering])
+    return page_response(request, rows, ordering, fields)
+
+
+@require_GET
+@api_view
+def product_batch(request):
+    """
+    Active products by id and/or slug in one query, in the order asked for.
+    Ids and slugs that match nothing are listed under "missing".
+    """
+    fields = parse_fields(request, PRODUCT_FIELDS, PRODUCT_DEFAULT_FIELDS)
+    ids = parse_list(request, 'ids')
+    slugs = parse_list(request, 'slugs')
+    if not ids and not slugs:
+        raise BadRequest("Pass ids and/or slugs as comma-separated lists")
+    if len(ids) + len(slugs) > MAX_BATCH:
+        raise BadRequest(f"At most {MAX_BATCH} ids and slugs per request")
+    if not all(value.isdecimal() and valid_id(int(value)) for value in ids):
+        raise BadRequest(f"ids must be integers between 0 and {MAX_ID}")
+    ids = [int(value) for value in ids]
+
+    rows = select(
+        Product.objects.filter(Q(pk__in=ids) | Q(slug__in=slugs), is_active=True),
+        PRODUCT_FIELDS, fields, extra=['id', 'slug'],
+    )
+    by_id = {}
+    by_slug = {}
+    for row in rows:
+        by_id[row['id']] = by_slug[row['slug']] = row
+
+    found = []
+    seen = set()
+    missing = []
+    for key, lookup in [(pk, by_id) for pk in ids] + [(slug, by_slug) for slug in slugs]:
+        row = lookup.get(key)
+        if row is None:
+            missing.append(key)
+        elif row['id'] not in seen:
+            seen.add(row['id'])
+            found.append(row)
+    return json_response(request, {'results': to_output(found, fields), 'missing': missing})
@@ -0,0 +1,258 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Count, Q
+from .models import Product
+
+# Largest SQLite INTEGER; bigger ids cannot be bound as query parameters
+MAX_ID = 2 ** 63 - 1
+
+SORT_OPTIONS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('selling_price', 'id'),
+    'price_desc': ('-selling_price', '-id'),
+    'discount': ('-discount_pct', '-id'),
+    'name': ('name', 'id'),
+}
+
+
+def _decimal_param(params, name):
+    try:
+        value = Decimal(params.get(name, ''))
+    except InvalidOperation:
+        return None
+    # NaN and Infinity parse, but cannot be compared with a column
+    return value if value.is_finite() else None
+
+
+def filter_products(products, params):
+    """
+    Applies the min_price, max_price, min_discount and in_stock query parameters
+    using the stored selling_price/discount_pct columns. Returns the filtered
+    queryset and the filters that were applied.
+    """
+    filters = {}
+    min_price = _decimal_param(params, 'min_price')
+    if min_price is not None:
+        products = products.filter(selling_price__gte=min_price)
+        filters['min_price'] = min_price
+    max_price = _decimal_param(params, 'max_price')
+    if max_price is not None:
+        products = products.filter(selling_price__lte=max_price)
+        filters['max_price'] = max_price
+    min_discount = params.get('min_discount', '')
+    # A percentage: anything larger could only overflow the query
+    if min_discount.isdecimal() and int(min_discount) <= 100:
+        products = products.filter(discount_pct__gte=int(min_discount))
+        filters['min_discount'] = int(min_discount)
+    if params.get('in_stock'):
+        products = products.filter(stock__gt=0)
+        filters['in_stock'] = True
+    return products, filters
+
+
+def sort_products(products, sort, default='newest'):
+    """
+    Orders by one of SORT_OPTIONS; every option ends in the primary key so the
+    order is stable. Returns the queryset and the sort key used.
+    """
+    if sort not in SORT_OPTIONS:
+        sort = default
+    return products.order_by(*SORT_OPTIONS[sort]), sort
+
+
+PRICE_BANDS = [
+    ('Under ₹500', None, 500),
+    ('₹500 - ₹1,000', 500, 1000),
+    ('₹1,000 - ₹5,000', 1000, 5000),
+    ('Over ₹5,000', 5000, None),
+]
+DISCOUNT_LEVELS = [10, 30, 50]
+
+
+def price_band_limits(low, high):
+    """
+    The min_price/max_price filter values that select a PRICE_BANDS band.
+    """
+    # prices have two decimal places, so this matches selling_price < high
+    return low, Decimal(high) - Decimal('0.01') if high is not None else None
+
+
+def listing_cache_key(filters):
+    """
+    The key a product listing under `filters` is cached by as a fragment, or
+    None if it must be rendered every time: in_stock results change with each
+    sale, which does not invalidate fragments, and prices or discounts other
+    than the facet links' would add a cache entry per value asked for.
+    """
+    if filters.get('in_stock'):
+        return None
+    parts = []
+    if 'min_price' in filters or 'max_price' in filters:
+        bands = [price_band_limits(low, high) for _, low, high in PRICE_BANDS]
+        limits = (filters.get('min_price'), filters.get('max_price'))
+        if limits not in bands:
+            return None
+        parts.append(f"price:{bands.index(limits)}")
+    if 'min_discount' in filters:
+        if filters['min_discount'] not in DISCOUNT_LEVELS:
+            return None
+        parts.append(f"discount:{filters['min_discount']}")
+    return ','.join(parts) or 'all'
+
+
+def encode_cursor(product, ordering):
+    values = []
+    for field in ordering:
+        name = field.lstrip('-')
+        # Rows from .values() querysets are dicts
+        value = product[name] if isinstance(product, dict) else getattr(product, name)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+    return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def valid_id(value):
+    return -MAX_ID <= value <= MAX_ID
+
+
+def _cursor_value(field, value):
+    value = field.to_python(value)
+    if isinstance(value, int) and not valid_id(value):
+        raise ValueError(f"{field.name} out of range")
+    if isinstance(value, Decimal) and not value.is_finite():
+        raise ValueError(f"{field.name} is not a number")
+    # Runs the backend's conversions (fitting decimals to the column, shifting
+    # datetimes to UTC) now, so a value they reject is a bad cursor, not a 500
+    field.get_db_prep_save(value, connection)
+    return value
+
+
+def decode_cursor(token, ordering, model=Product):
+    """
+    The sort key values in a cursor from encode_cursor(), or None if the token
+    is malformed or holds values the database could not be queried with.
+    """
+    try:
+        values = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [
+            _cursor_value(model._meta.get_field(field.lstrip('-')), value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, OverflowError, InvalidOperation, ValidationError):
+        return None
+
+
+def _seek_filter(ordering, values, backwards=False):
+    """
+    WHERE clause selecting rows after (or before) the given sort key values,
+    e.g. price >= p AND ((price > p) OR (price = p AND id > i)) for ordering
+    ('price', 'id'). The redundant bound on the first column lets the database
+    start a range scan on the sort index at the cursor.
+    """
+    first = ordering[0]
+    bound = 'gte' if first.startswith('-') == backwards else 'lte'
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        ascending = not field.startswith('-')
+        lookup = 'gt' if ascending != backwards else 'lt'
+        term = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            term &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= term
+    return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+def keyset_page(products, sort, after=None, before=None, per_page=24):
+    """
+    Returns one page of `products` ordered by SORT_OPTIONS[sort], seeking from
+    the `after`/`before` cursor with an indexed WHERE instead of OFFSET, so deep
+    pages cost the same as the first one. `sort` may also be an ordering tuple
+    ending in the primary key, and `products` any queryset, including .values()
+    querysets that select the ordering fields.
+    """
+    ordering = SORT_OPTIONS[sort] if isinstance(sort, str) else sort
+    model = products.model
+    backwards = False
+    cursor_values = decode_cursor(after, ordering, model) if after else None
+    if before and not cursor_values:
+        cursor_values = decode_cursor(before, ordering, model)
+        backwards = cursor_values is not None
+
+    if backwards:
+        reversed_ordering = [f[1:] if f.startswith('-') else f'-{f}' for f in ordering]
+        products = products.filter(_seek_filter(ordering, cursor_values, backwards=True)).order_by(*reversed_ordering)
+    else:
+        if cursor_values:
+            products = products.filter(_seek_filter(ordering, cursor_values))
+        products = products.order_by(*ordering)
+
+    items = list(products[:per_page + 1])
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    has_next = has_more if not backwards else True
+    has_previous = bool(cursor_values) if not backwards else has_more
+    return {
+        'items': items,
+        'next_cursor': encode_cursor(items[-1], ordering) if items and has_next else None,
+        'previous_cursor': encode_cursor(items[0], ordering) if items and has_previous else None,
+    }
+
+
+def get_facets(products):
+    """
+    Counts for the price band, discount and in-stock facets, computed in one
+    aggregate query.
+    """
+    aggregates = {
+        'total': Count('id'),
+        'in_stock': Count('id', filter=Q(stock__gt=0)),
+    }
+    for i, (label, low, high) in enumerate(PRICE_BANDS):
+        band = Q()
+        if low is not None:
+            band &= Q(selling_price__gte=low)
+        if high is not None:
+            band &= Q(selling_price__lt=high)
+        aggregates[f'price_{i}'] = Count('id', filter=band)
+    for level in DISCOUNT_LEVELS:
+        aggregates[f'discount_{level}'] = Count('id', filter=Q(discount_pct__gte=level))
+
+    counts = products.order_by().aggregate(**aggregates)
+    price_bands = []
+    for i, (label, low, high) in enumerate(PRICE_BANDS):
+        min_price, max_price = price_band_limits(low, high)
+        price_bands.append({
+            'label': label, 'min_price': min_price, 'max_price': max_price, 'count': counts[f'price_{i}'],
+        })
+    return {
+        'total': counts['total'],
+        'in_stock': counts['in_stock'],
+        'price_bands': price_bands,
+        'discounts': [
+            {'min_discount': level, 'count': counts[f'discount_{level}']} for level in DISCOUNT_LEVELS
+        ],
+    }
+
+
+def build_query(params, **updates):
+    """
+    Copy of the request's query parameters with `updates` applied (None removes
+    a key) and any page cursor dropped, urlencoded for links.
+    """
+    params = params.copy()
+    for key in ('after', 'before'):
+        params.pop(key, None)
+    for key, value in updates.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return params.urlencode()
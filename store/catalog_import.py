@@ -0,0 +1,289 @@
+"""
+Bulk product import from CSV or NDJSON, used by `manage.py import_catalog`.
+
+Rows are streamed from the file and written in chunks with bulk_create() and
+update_rows(), so the search index and fragment versions are kept in step by
+ProductQuerySet. Everything a row needs to be resolved is loaded up front:
+categories into one name/slug map, and every existing product into a map keyed
+by slug (or by HSN code and name) plus the set of taken slugs. New slugs are
+made unique against that set in memory. Images named in the file are copied
+from a local directory into storage by a thread pool, a chunk at a time.
+
+Each chunk is written in one transaction, so every row is checked before it is
+written: a bad row is skipped and reported, and the rest of its chunk lands.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils.text import slugify
+from .catalog import MAX_ID
+from .models import Category, Product
+
+# Columns an input row may have; only name, category and price are required
+FIELDS = ['slug', 'name', 'category', 'description', 'price', 'discounted_price', 'stock', 'hsn_code',
+          'gst_rate', 'is_active', 'featured', 'image']
+KEYS = ['slug', 'hsn_name']
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, file_format=None):
+    """
+    Yields (line number, row dict) from a CSV file with a header row or an
+    NDJSON file with one object per line. An NDJSON line that is not a JSON
+    object is yielded as a RowError in place of the row.
+    """
+    file_format = file_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='' if file_format == 'csv' else None, encoding='utf-8') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Values past the header's columns are collected under None
+                row.pop(None, None)
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = RowError(f"not valid JSON: {e}")
+                if not isinstance(row, (dict, RowError)):
+                    row = RowError(f"not a JSON object: {line.strip()[:40]!r}")
+                yield line_number, row
+
+
+def _decimal(row, name, required=False):
+    value = row.get(name)
+    if value in (None, ''):
+        if required:
+            raise RowError(f"{name} is required")
+        return None
+    try:
+        number = Decimal(str(value))
+        if not number.is_finite():
+            raise InvalidOperation
+    except InvalidOperation:
+        raise RowError(f"{name} is not a number: {value!r}")
+    try:
+        # Rounds to the column as the write will, which fails on numbers too
+        # long for it
+        Product._meta.get_field(name).get_db_prep_save(number, connection)
+    except InvalidOperation:
+        raise RowError(f"{name} is out of range: {value!r}")
+    return number
+
+
+def _bool(value):
+    return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+
+
+class SlugAllocator:
+    """
+    Unique slugs checked against an in-memory set of every slug in use.
+    """
+
+    def __init__(self, taken):
+        self.taken = set(taken)
+        self.next_suffix = {}
+
+    def allocate(self, text):
+        base = slugify(text)[:45] or 'product'
+        slug = base
+        suffix = self.next_suffix.get(base, 2)
+        while slug in self.taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        self.next_suffix[base] = suffix
+        self.taken.add(slug)
+        return slug
+
+
+class CatalogImporter:
+
+    def __init__(self, key='slug', images_dir=None, chunk_size=2000, image_workers=8, create_categories=True):
+        if key not in KEYS:
+            raise ValueError(f"key must be one of {', '.join(KEYS)}")
+        self.key = key
+        self.images_dir = images_dir
+        self.chunk_size = chunk_size
+        self.image_workers = image_workers
+        self.create_categories = create_categories
+        self.stats = {'created': 0, 'updated': 0, 'skipped': 0, 'images': 0}
+        self.errors = []
+        self.stored_images = {}
+        self.load()
+
+    def load(self):
+        self.categories = {}
+        self.category_slugs = set()
+        for pk, name, slug in Category.objects.values_list('pk', 'name', 'slug'):
+            self.categories[name.lower()] = self.categories[slug] = pk
+            self.category_slugs.add(slug)
+
+        self.existing = {}
+        slugs = []
+        for pk, slug, name, hsn_code, category_id in Product.objects.values_list(
+            'pk', 'slug', 'name', 'hsn_code', 'category_id',
+        ).iterator(chunk_size=10000):
+            key = slug if self.key == 'slug' else (hsn_code, name)
+            self.existing[key] = (pk, slug, category_id)
+            slugs.append(slug)
+        self.slugs = SlugAllocator(slugs)
+
+    def category_id(self, value):
+        value = str(value or '').strip()
+        if not value:
+            raise RowError("category is required")
+        pk = self.categories.get(value.lower()) or self.categories.get(value)
+        if pk is None:
+            if not self.create_categories:
+                raise RowError(f"unknown category {value!r}")
+            slug = slugify(value) or 'category'
+            suffix = 2
+            while slug in self.category_slugs:
+                slug = f"{slugify(value)}-{suffix}"
+                suffix += 1
+            pk = Category.objects.create(name=value, slug=slug).pk
+            self.categories[value.lower()] = self.categories[slug] = pk
+            self.category_slugs.add(slug)
+        return pk
+
+    def values(self, row):
+        """
+        Model field values from the columns present in `row`. Raises RowError
+        for anything the write would fail on.
+        """
+        if isinstance(row, RowError):
+            raise row
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise RowError("name is required")
+        values = {
+            'name': name,
+            'category_id': self.category_id(row.get('category')),
+            'price': _decimal(row, 'price', required=True),
+        }
+        # A row states the whole price, so no discounted_price means no discount
+        values['discounted_price'] = _decimal(row, 'discounted_price')
+        if values['discounted_price'] is not None and values['discounted_price'] > values['price']:
+            raise RowError("discounted_price is more than price")
+        gst_rate = _decimal(row, 'gst_rate')
+        if gst_rate is not None:
+            values['gst_rate'] = gst_rate
+        if row.get('stock') not in (None, ''):
+            try:
+                values['stock'] = int(row['stock'])
+            except (TypeError, ValueError, OverflowError):
+                raise RowError(f"stock is not a whole number: {row['stock']!r}")
+            if not 0 <= values['stock'] <= MAX_ID:
+                raise RowError(f"stock is out of range: {row['stock']!r}")
+        for field in ('description', 'hsn_code'):
+            if row.get(field) not in (None, ''):
+                values[field] = str(row[field]).strip()
+        for field in ('is_active', 'featured'):
+            if row.get(field) not in (None, ''):
+                values[field] = _bool(row[field])
+        return values
+
+    def store_image(self, file_name):
+        """
+        Copies one file from images_dir into media/products and returns its
+        storage name. Runs in the thread pool.
+        """
+        path = os.path.join(self.images_dir, os.path.basename(file_name))
+        with open(path, 'rb') as f:
+            return default_storage.save(f"products/{os.path.basename(file_name)}", File(f))
+
+    def attach_images(self, pool, planned):
+        wanted = {row['image'] for _, row, _ in planned if row.get('image') and row['image'] not in self.stored_images}
+        if not wanted:
+            return
+        if self.images_dir is None:
+            # Names already in storage
+            self.stored_images.update({name: name for name in wanted})
+            return
+        futures = {name: pool.submit(self.store_image, name) for name in wanted}
+        for name, future in futures.items():
+            try:
+                self.stored_images[name] = future.result()
+                self.stats['images'] += 1
+            except OSError as e:
+                self.stored_images[name] = None
+                self.errors.append((None, f"image {name}: {e}"))
+
+    def write_chunk(self, pool, chunk):
+        planned = []
+        for line_number, row in chunk:
+            try:
+                planned.append((line_number, row, self.values(row)))
+            except RowError as e:
+                self.errors.append((line_number, str(e)))
+                self.stats['skipped'] += 1
+        self.attach_images(pool, planned)
+
+        to_create = {}
+        to_update = {}
+        for line_number, row, values in planned:
+            image = self.stored_images.get(row.get('image')) if row.get('image') else None
+            if image:
+                values['image'] = image
+                values['image_hash'] = ''
+            slug = (row.get('slug') or '').strip()
+            key = slug if self.key == 'slug' else (values.get('hsn_code', '00000000'), values['name'])
+            if key and key in to_create:
+                # Repeated in this chunk: the last row wins
+                for field, value in values.items():
+                    setattr(to_create[key], field, value)
+                continue
+            match = self.existing.get(key) if key else None
+            if match is None:
+                if slug in self.slugs.taken or not slug:
+                    slug = self.slugs.allocate(slug or values['name'])
+                else:
+                    self.slugs.taken.add(slug)
+                to_create[key or slug] = Product(slug=slug, **{'image': '', **values})
+            else:
+                pk, _, category_id = match
+                to_update.setdefault(pk, {'category_id': category_id, 'values': {}})['values'].update(values)
+
+        by_fields = {}
+        for pk, update in to_update.items():
+            product = Product(pk=pk, **update['values'])
+            # Lets update_rows invalidate the category the product moves out of
+            product._loaded_category_id = update['category_id']
+            by_fields.setdefault(tuple(sorted(update['values'])), []).append(product)
+
+        with transaction.atomic():
+            created = Product.objects.bulk_create(to_create.values(), batch_size=500)
+            for fields, products in by_fields.items():
+                Product.objects.update_rows(products, fields)
+        for product in created:
+            key = product.slug if self.key == 'slug' else (product.hsn_code, product.name)
+            self.existing[key] = (product.pk, product.slug, product.category_id)
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(to_update)
+
+    def run(self, rows):
+        """
+        Imports (line number, row) pairs. Returns the stats dict.
+        """
+        chunk = []
+        with ThreadPoolExecutor(max_workers=self.image_workers) as pool:
+            for item in rows:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size:
+                    self.write_chunk(pool, chunk)
+                    chunk = []
+            if chunk:
+                self.write_chunk(pool, chunk)
+        return self.stats
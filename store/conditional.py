@@ -0,0 +1,125 @@
+"""
+Conditional GET for catalog pages. Each page has a validator function that
+fetches its freshness signals (latest updated_at, the number of visible
+products and how many of them are in stock) in one small aggregate query; the ETag is a hash of those plus the
+parts of the page that depend on the visitor (user and cart size), so a repeat
+visit gets a 304 without the view or its templates running.
+
+Visitors without a session get `Cache-Control: public` with a short max-age
+and a Last-Modified header, so a CDN can cache and revalidate the page.
+Everyone else gets `private, no-cache` and the ETag only.
+"""
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, Max, Q, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import Category, Product, ProductRecommendation
+from .sessions import anonymous_cookie_name
+
+
+def _category_state(categories, recommendations=None, **annotations):
+    active = Q(products__is_active=True)
+    if recommendations is not None:
+        # Recommended products can come from other categories, and a rebuild
+        # replaces the rows, which raises their highest pk
+        recommendations = recommendations.values('product')
+        annotations.update(
+            recommended_modified=Subquery(
+                recommendations.annotate(modified=Max('recommended__updated_at')).values('modified')
+            ),
+            recommendations_version=Subquery(recommendations.annotate(version=Max('pk')).values('version')),
+        )
+    # Stock changes leave updated_at alone (see ProductQuerySet.update), so
+    # the in-stock count stands in for the stock badges and facet
+    rows = categories.values('pk', 'updated_at').annotate(
+        products_modified=Max('products__updated_at', filter=active),
+        product_count=Count('products', filter=active),
+        in_stock_count=Count('products', filter=active & Q(products__stock__gt=0)),
+        **annotations,
+    )[:1]
+    if not rows:
+        return None
+    row = rows[0]
+    # The products only show additions and edits; removals bump the
+    # category's own updated_at (CategoryQuerySet.touch)
+    last_modified = max(filter(None, [row['updated_at'], row['products_modified'], row.get('recommended_modified')]))
+    return last_modified, [
+        row['pk'], row['product_count'], row['in_stock_count'], row.get('stock'), row.get('recommendations_version'),
+    ]
+
+
+def category_state(request, slug):
+    """
+    (last modified, fingerprint) for a category page, or None if there is no
+    such category.
+    """
+    return _category_state(Category.objects.filter(slug=slug))
+
+
+def product_state(request, slug):
+    """
+    The same for a product page. Related products are its recommendations,
+    topped up from its category, so both are freshness signals, as is the
+    product's own stock, which the page shows.
+    """
+    product = Product.objects.filter(slug=slug, is_active=True)
+    return _category_state(
+        Category.objects.filter(pk=Subquery(product.values('category_id')[:1])),
+        recommendations=ProductRecommendation.objects.filter(product__slug=slug),
+        stock=Subquery(product.values('stock')[:1]),
+    )
+
+
+def is_personal(request):
+    return request.user.is_authenticated or any(
+        name in request.COOKIES for name in (settings.SESSION_COOKIE_NAME, anonymous_cookie_name())
+    )
+
+
+def patch_catalog_headers(response, personal):
+    patch_vary_headers(response, ['Cookie'])
+    if personal:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'CATALOG_CACHE_MAX_AGE', 60))
+    return response
+
+
+def conditional_page(get_state):
+    """
+    Decorates a catalog view with ETag/Last-Modified validation driven by
+    get_state(request, *args, **kwargs), which returns (last modified,
+    fingerprint values) or None to always run the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            personal = is_personal(request)
+            # Pending messages are shown once, so the page must be rendered
+            if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+                return patch_catalog_headers(view(request, *args, **kwargs), personal)
+            state = get_state(request, *args, **kwargs)
+            if state is None:
+                return patch_catalog_headers(view(request, *args, **kwargs), personal)
+
+            last_modified, fingerprint = state
+            parts = [view.__name__, last_modified.isoformat(), *fingerprint]
+            if personal:
+                cart = request.cart
+                parts += [request.user.pk, cart.pk, cart.get_total_items()]
+            etag = quote_etag(hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+            timestamp = None if personal else int(last_modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response.headers.setdefault('ETag', etag)
+                if timestamp is not None:
+                    response.headers.setdefault('Last-Modified', http_date(timestamp))
+            return patch_catalog_headers(response, personal)
+        return wrapper
+    return decorator
@@ -0,0 +1,76 @@
+"""
+CSV and NDJSON downloads streamed as they are generated, so large exports are
+never held in memory and the first bytes go out before the last rows are read.
+"""
+import csv
+import json
+import zlib
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows, chunk_size=500):
+    """
+    Yields `header` and then the `rows` iterable as CSV text, `chunk_size`
+    rows per chunk.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def ndjson_chunks(objects, chunk_size=500):
+    """
+    Yields one JSON document per line for each of `objects`.
+    """
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    chunk = []
+    for obj in objects:
+        chunk.append(encoder.encode(obj))
+        if len(chunk) >= chunk_size:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Compresses a stream of text chunks into a gzip file, chunk by chunk.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_download(filename, chunks, content_type, compress=False):
+    """
+    StreamingHttpResponse offering `chunks` as a file download; with
+    compress=True the file is gzipped and '.gz' is added to its name.
+    """
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_csv(filename, header, rows, chunk_size=500):
+    return streaming_download(filename, csv_chunks(header, rows, chunk_size), 'text/csv')
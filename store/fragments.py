@@ -0,0 +1,121 @@
+"""
+Versioned cache for rendered template fragments ({% fragment %} in
+store/templatetags/fragments.py). Fragment keys include the current value of
+one or more version counters, so bumping a counter orphans every fragment
+built from it and stale entries simply age out:
+
+    catalog         any product write: the home page carousels
+    categories      any category write: the home page category grid
+    category:<id>   writes to that category or its products: product cards
+
+store.signals bumps the counters on Product/Category save and delete, and
+ProductQuerySet does so for update()/bulk_update()/bulk_create(). Counters
+and per-fragment hit/miss counts live in the FRAGMENT_CACHE_ALIAS cache and
+only use get/set/add/incr, so any backend works, including local-memory and
+file-based ones.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+# Fragments reported by get_stats()
+FRAGMENTS = ['home-categories', 'home-featured', 'home-latest', 'product-card', 'category-card']
+
+
+def get_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def category_scope(category_id):
+    return f"category:{category_id}"
+
+
+def _version_key(scope):
+    return f"fragments:version:{scope}"
+
+
+def _initial_version():
+    # Starts from the clock, so a counter that was evicted never restarts at a
+    # value that older fragments were cached under
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    cache = get_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            initial = _initial_version()
+            versions[key] = initial if cache.add(key, initial, None) else cache.get(key, initial)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    cache = get_cache()
+    for scope in set(scopes):
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+
+
+def invalidate_products(category_ids):
+    """
+    Called after products in the given categories were added, changed or removed.
+    """
+    bump('catalog', *(category_scope(pk) for pk in category_ids if pk is not None))
+
+
+def invalidate_category(category_id):
+    bump('categories', category_scope(category_id))
+
+
+def fragment_key(name, versions, vary_on):
+    vary = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f"fragments:{name}:{'.'.join(str(v) for v in versions)}:{vary}"
+
+
+def _count(name, outcome):
+    cache = get_cache()
+    key = f"fragments:{outcome}:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_or_render(name, scopes, vary_on, render):
+    """
+    Returns the cached fragment for name/vary_on under the current versions of
+    `scopes`, calling render() and caching its result on a miss.
+    """
+    cache = get_cache()
+    key = fragment_key(name, get_versions(scopes), vary_on)
+    content = cache.get(key)
+    if content is not None:
+        _count(name, 'hits')
+        return content
+    _count(name, 'misses')
+    content = render()
+    cache.set(key, content, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600))
+    return content
+
+
+def get_stats():
+    """
+    {fragment name: {'hits': n, 'misses': n}} since the last reset_stats().
+    """
+    cache = get_cache()
+    counts = cache.get_many([f"fragments:{outcome}:{name}" for name in FRAGMENTS for outcome in ('hits', 'misses')])
+    return {
+        name: {outcome: counts.get(f"fragments:{outcome}:{name}", 0) for outcome in ('hits', 'misses')}
+        for name in FRAGMENTS
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([f"fragments:{outcome}:{name}" for name in FRAGMENTS for outcome in ('hits', 'misses')])
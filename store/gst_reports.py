@@ -0,0 +1,159 @@
+"""
+GST return figures: taxable value and GST of paid, uncancelled orders per
+month, customer state (Order.state), HSN code and rate.
+
+The database does the grouping and summing, in whole paise
+(pricing.line_*_paise_expression), so the figures match price_lines() to the
+paisa however many lines are summed. A month that has ended is materialized
+into GstSummary rows the first time it is reported and read back from them
+afterwards; the current month is always computed live.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time
+from django.db import transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import GstPeriod, GstSummary, OrderItem
+from .pricing import from_paise, line_gst_paise_expression, line_subtotal_paise_expression
+
+GROUP_KEYS = ['period', 'state', 'hsn_code', 'gst_rate']
+
+# Report layouts: the columns each one groups by
+GROUPINGS = {
+    'detail': GROUP_KEYS,
+    'hsn': ['hsn_code', 'gst_rate'],
+    'rate': ['gst_rate'],
+    'state': ['state'],
+    'month': ['period'],
+}
+
+TOTAL_FIELDS = ['taxable_value', 'gst_amount', 'quantity', 'lines']
+
+
+def parse_month(value):
+    """
+    'YYYY-MM' -> first day of that month. Raises ValueError.
+    """
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+def next_month(period):
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def previous_month(period):
+    return date(period.year - (period.month == 1), (period.month - 2) % 12 + 1, 1)
+
+
+def months(start, end):
+    period = start.replace(day=1)
+    while period <= end:
+        yield period
+        period = next_month(period)
+
+
+def current_month():
+    return timezone.localdate().replace(day=1)
+
+
+def _bounds(start, end):
+    """
+    Aware datetimes from the start of month `start` to the end of month `end`.
+    """
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(next_month(end), time.min), tz),
+    )
+
+
+def live_rows(start, end):
+    """
+    Grouped totals for months `start`..`end` straight from OrderItem, one
+    aggregate query. Money is returned in paise.
+    """
+    since, until = _bounds(start, end)
+    return OrderItem.objects.filter(
+        order__payment_status=True, order__created_at__gte=since, order__created_at__lt=until,
+    ).exclude(order__status='cancelled').annotate(
+        period=TruncMonth('order__created_at', output_field=DateField()),
+        state=F('order__state'),
+    ).values(*GROUP_KEYS).annotate(
+        taxable_paise=Sum(line_subtotal_paise_expression()),
+        gst_paise=Sum(line_gst_paise_expression()),
+        quantity=Sum('quantity'),
+        lines=Count('pk'),
+    ).order_by(*GROUP_KEYS)
+
+
+def _from_live(row):
+    return {
+        **{key: row[key] for key in GROUP_KEYS},
+        'taxable_value': from_paise(row['taxable_paise']),
+        'gst_amount': from_paise(row['gst_paise']),
+        'quantity': row['quantity'],
+        'lines': row['lines'],
+    }
+
+
+def materialize(period):
+    """
+    (Re)computes the GstSummary rows of one closed month.
+    """
+    if period >= current_month():
+        raise ValueError(f"{period:%Y-%m} has not ended yet")
+    with transaction.atomic():
+        GstSummary.objects.filter(period=period).delete()
+        GstSummary.objects.bulk_create(
+            [GstSummary(**_from_live(row)) for row in live_rows(period, period)], batch_size=1000,
+        )
+        GstPeriod.objects.update_or_create(period=period)
+
+
+def detail_rows(start, end, refresh=False):
+    """
+    Rows keyed by GROUP_KEYS for months `start`..`end`, materializing closed
+    months on first use (or again with refresh=True).
+    """
+    start = start.replace(day=1)
+    end = end.replace(day=1)
+    open_month = current_month()
+    closed = [period for period in months(start, min(end, open_month)) if period < open_month]
+    if closed:
+        done = set() if refresh else set(
+            GstPeriod.objects.filter(period__in=closed).values_list('period', flat=True)
+        )
+        for period in closed:
+            if period not in done:
+                materialize(period)
+
+    rows = list(
+        GstSummary.objects.filter(period__gte=start, period__lte=end)
+        .order_by(*GROUP_KEYS).values(*GROUP_KEYS, *TOTAL_FIELDS)
+    )
+    if start <= open_month <= end:
+        rows += [_from_live(row) for row in live_rows(open_month, open_month)]
+    return rows
+
+
+def report(start, end, by='detail', refresh=False):
+    """
+    {'rows': [...], 'totals': {...}} for months `start`..`end`, with rows
+    grouped by one of GROUPINGS. Each row has its group columns plus
+    taxable_value, gst_amount, total, quantity and lines.
+    """
+    keys = GROUPINGS[by]
+    groups = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS, 0))
+    totals = dict.fromkeys(TOTAL_FIELDS, 0)
+    for row in detail_rows(start, end, refresh=refresh):
+        group = groups[tuple(row[key] for key in keys)]
+        for field in TOTAL_FIELDS:
+            group[field] += row[field]
+            totals[field] += row[field]
+
+    rows = []
+    for values, group in sorted(groups.items()):
+        rows.append({**dict(zip(keys, values)), **group, 'total': group['taxable_value'] + group['gst_amount']})
+    totals['total'] = totals['taxable_value'] + totals['gst_amount']
+    return {'rows': rows, 'totals': totals, 'columns': keys}
@@ -0,0 +1,153 @@
+"""
+Resized WebP and JPEG copies of product and category images for srcset.
+Derivatives live under derived/ with the source file's content hash in their
+names (derived/products/shoe-<hash>-640w.webp), so they can be cached forever
+and a new upload never serves stale copies. The hash is stored on the model
+in image_hash. Derivatives are made after an upload is saved (store.signals),
+on first render by the {% responsive_image %} tag when they are missing, or in
+bulk by `manage.py generate_image_derivatives`.
+"""
+import hashlib
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# (extension, Pillow format, MIME type); the last one is the <img> fallback
+FORMATS = [
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+]
+# How long a checked set of derivatives is trusted before the files are looked at again
+CHECKED_TIMEOUT = 24 * 60 * 60
+FAILED_TIMEOUT = 5 * 60
+
+
+def get_widths():
+    return sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', [320, 640, 1024]))
+
+
+def content_hash(name, storage=default_storage):
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def derivative_name(name, digest, width, extension):
+    return f"derived/{os.path.splitext(name)[0]}-{digest}-{width}w.{extension}"
+
+
+def derivative_names(name, digest):
+    return [
+        derivative_name(name, digest, width, extension)
+        for width in get_widths()
+        for extension, _, _ in FORMATS
+    ]
+
+
+def _encode(image, image_format):
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    if image_format == 'JPEG':
+        if has_alpha:
+            # JPEG has no alpha channel: flatten onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            image = image.convert('RGB')
+    else:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80))
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage, force=False):
+    """
+    Writes every width and format of the image stored at `name` that does not
+    exist yet (all of them with force=True) and returns the content hash.
+    Images are never scaled up. Raises OSError if the source is missing or
+    is not an image.
+    """
+    digest = content_hash(name, storage)
+    missing = [
+        (width, extension, image_format)
+        for width in get_widths()
+        for extension, image_format, _ in FORMATS
+        if force or not storage.exists(derivative_name(name, digest, width, extension))
+    ]
+    if not missing:
+        return digest
+
+    with storage.open(name, 'rb') as f, Image.open(f) as source:
+        source = ImageOps.exif_transpose(source)
+        resized = {}
+        for width, extension, image_format in missing:
+            if width not in resized:
+                if source.width > width:
+                    resized[width] = source.resize(
+                        (width, max(round(source.height * width / source.width), 1)), Image.LANCZOS
+                    )
+                else:
+                    resized[width] = source
+            target = derivative_name(name, digest, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(_encode(resized[width], image_format)))
+    return digest
+
+
+def ensure_derivatives(instance, field='image', force=False):
+    """
+    Returns the content hash of an instance's image once all its derivatives
+    exist, generating any that are missing and saving image_hash if it changed.
+    Returns None if there is no image or it cannot be read. Results are cached
+    so rendering a page does not touch the files each time.
+    """
+    image = getattr(instance, field)
+    if not image:
+        return None
+    key = f"image-derivatives:{image.name}:{instance.image_hash}"
+    if not force:
+        checked = cache.get(key)
+        if checked is not None:
+            return checked or None
+
+    try:
+        digest = generate_derivatives(image.name, image.storage, force=force)
+    except (OSError, ValueError):
+        cache.set(key, '', FAILED_TIMEOUT)
+        return None
+    if digest != instance.image_hash:
+        type(instance)._default_manager.filter(pk=instance.pk).update(image_hash=digest)
+        instance.image_hash = digest
+        key = f"image-derivatives:{image.name}:{digest}"
+    cache.set(key, digest, CHECKED_TIMEOUT)
+    return digest
+
+
+def srcsets(instance, field='image'):
+    """
+    {mime type: srcset} for an instance's image plus the fallback JPEG URL, or
+    None if its derivatives cannot be made.
+    """
+    image = getattr(instance, field)
+    digest = ensure_derivatives(instance, field)
+    if not digest:
+        return None
+    widths = get_widths()
+    sets = {
+        mime_type: ', '.join(
+            f"{image.storage.url(derivative_name(image.name, digest, width, extension))} {width}w"
+            for width in widths
+        )
+        for extension, _, mime_type in FORMATS
+    }
+    extension = FORMATS[-1][0]
+    fallback = image.storage.url(derivative_name(image.name, digest, widths[len(widths) // 2], extension))
+    return sets, fallback
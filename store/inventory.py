@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+from .models import Order, OrderItem, Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when an order asks for more units than are in stock. `shortfall` maps
+    product id to a dict with the product name, requested and available units.
+    """
+
+    def __init__(self, shortfall):
+        self.shortfall = shortfall
+        names = ', '.join(
+            f"{line['name']} (requested {line['requested']}, available {line['available']})"
+            for line in shortfall.values()
+        )
+        super().__init__(f"Insufficient stock for {names}")
+
+
+def get_order_quantities(order):
+    """
+    Units per product for an order, sorted by product id. Lines for the same
+    product are merged so each product row is updated once.
+    """
+    quantities = defaultdict(int)
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    return sorted(quantities.items())
+
+
+def decrement_stock(quantities):
+    """
+    Takes (product_id, quantity) pairs out of stock in one transaction. Each row
+    is changed by a conditional UPDATE (stock >= quantity), in product id order
+    so concurrent orders lock rows in the same sequence. If any product is short
+    nothing is changed and InsufficientStock is raised.
+    """
+    with transaction.atomic():
+        short = {}
+        for product_id, quantity in sorted(quantities):
+            updated = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+                stock=F('stock') - quantity
+            )
+            if not updated:
+                short[product_id] = quantity
+
+        if short:
+            shortfall = {
+                product_id: {'name': name, 'requested': short[product_id], 'available': stock}
+                for product_id, name, stock in Product.objects.filter(
+                    pk__in=short
+                ).values_list('id', 'name', 'stock')
+            }
+            raise InsufficientStock(shortfall)
+
+
+def increment_stock(quantities):
+    with transaction.atomic():
+        for product_id, quantity in sorted(quantities):
+            Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity)
+
+
+def decrement_order_stock(order):
+    decrement_stock(get_order_quantities(order))
+
+
+def restock_order(order):
+    increment_stock(get_order_quantities(order))
+
+
+def cancel_order(order):
+    """
+    Marks an order cancelled and, if it was paid, puts its units back in stock.
+    Returns False if the order was already cancelled, so stock is only released once.
+    """
+    with transaction.atomic():
+        cancelled = Order.objects.filter(pk=order.pk).exclude(status='cancelled').update(status='cancelled')
+        if cancelled and order.payment_status:
+            restock_order(order)
+    if cancelled:
+        order.status = 'cancelled'
+    return bool(cancelled)
+
+
+def get_reserved_quantities(product_ids):
+    """
+    Units held by live reservations, per product id.
+    """
+    rows = StockReservation.objects.filter(
+        product_id__in=product_ids, expires_at__gt=timezone.now()
+    ).values('product_id').annotate(total=Sum('quantity')).order_by()
+    return {row['product_id']: row['total'] for row in rows}
+
+
+def get_available_stock(product, cart=None):
+    """
+    Stock left after live reservations held by other carts and orders.
+    """
+    reservations = StockReservation.objects.filter(product=product, expires_at__gt=timezone.now())
+    if cart is not None and cart.pk:
+        reservations = reservations.exclude(cart=cart)
+    reserved = reservations.aggregate(total=Sum('quantity'))['total'] or 0
+    return max(product.stock - reserved, 0)
+
+
+def reserve_cart(cart, ttl=None):
+    """
+    Holds stock for every line of the cart for `ttl` seconds (settings.
+    STOCK_RESERVATION_TTL), replacing any earlier hold by the same cart.
+    Raises InsufficientStock if other reservations leave too little.
+    """
+    ttl = ttl or getattr(settings, 'STOCK_RESERVATION_TTL', 900)
+    quantities = defaultdict(int)
+    products = {}
+    for item in cart.get_items():
+        quantities[item.product_id] += item.quantity
+        products[item.product_id] = item.product
+
+    with transaction.atomic():
+        StockReservation.objects.filter(cart=cart).delete()
+        reserved = get_reserved_quantities(list(quantities))
+
+        shortfall = {}
+        for product_id, quantity in quantities.items():
+            available = max(products[product_id].stock - reserved.get(product_id, 0), 0)
+            if available < quantity:
+                shortfall[product_id] = {
+                    'name': products[product_id].name, 'requested': quantity, 'available': available,
+                }
+        if shortfall:
+            raise InsufficientStock(shortfall)
+
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create([
+            StockReservation(product_id=product_id, cart=cart, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in sorted(quantities.items())
+        ])
+    return expires_at
+
+
+def convert_reservations(cart, order):
+    """
+    Moves the cart's holds on the order's products onto the order that is
+    being paid for, in one UPDATE. Holds on other products, and units beyond
+    those ordered, stay with the cart: the buyer may have added more since.
+    """
+    ordered = Subquery(
+        OrderItem.objects.filter(order=order, product=OuterRef('product'))
+        .values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    covered = Q(quantity__lte=ordered)
+    return StockReservation.objects.filter(cart=cart, product__in=order.items.values('product')).update(
+        cart=Case(When(covered, then=Value(None)), default=F('cart')),
+        order=Case(When(covered, then=Value(order.pk)), default=Value(None)),
+        quantity=Case(When(covered, then=F('quantity')), default=F('quantity') - ordered),
+    )
+
+
+def release_reservations(cart, order):
+    """
+    Drops the cart's holds on the order's products, up to the units ordered,
+    once the order has been paid for through another path.
+    """
+    with transaction.atomic():
+        convert_reservations(cart, order)
+        return StockReservation.objects.filter(order=order).delete()[0]
+
+
+def commit_order_stock(order):
+    """
+    Called once payment succeeds: takes the order's units out of stock and drops
+    the reservations that were holding them.
+    """
+    with transaction.atomic():
+        decrement_order_stock(order)
+        StockReservation.objects.filter(order=order).delete()
+
+
+def expire_reservations(batch_size=1000):
+    """
+    Deletes expired reservations in batches of `batch_size` rows so no single
+    statement holds the write lock for long. Returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(StockReservation.objects.filter(
+            expires_at__lte=timezone.now()
+        ).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += StockReservation.objects.filter(id__in=ids).delete()[0]
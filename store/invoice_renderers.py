@@ -0,0 +1,144 @@
+from io import BytesIO
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils.module_loading import import_string
+from xhtml2pdf import pisa
+from .pricing import price_order_items
+
+
+class InvoiceGenerationError(Exception):
+    pass
+
+
+def get_company_details():
+    return {
+        'name': settings.COMPANY_NAME,
+        'address': settings.COMPANY_ADDRESS,
+        'phone': settings.COMPANY_PHONE,
+        'email': settings.COMPANY_EMAIL,
+        'gst_number': settings.GST_NUMBER,
+    }
+
+
+def get_invoice_context(order, order_items):
+    prices = price_order_items(order_items)
+    return {
+        'order': order,
+        'order_items': order_items,
+        'price_lines': prices.lines,
+        'company': get_company_details(),
+        'subtotal': prices.subtotal,
+        'gst_amount': prices.gst_amount,
+        'grand_total': prices.total,
+    }
+
+
+class InvoiceRenderer:
+    """
+    Turns an order and its items into PDF bytes. Subclasses implement render().
+    """
+
+    def render(self, order, order_items):
+        raise NotImplementedError
+
+
+class HTMLInvoiceRenderer(InvoiceRenderer):
+    """
+    Renders store/invoice.html and converts it with xhtml2pdf.
+    """
+    template_name = 'store/invoice.html'
+
+    def render(self, order, order_items):
+        html = get_template(self.template_name).render(get_invoice_context(order, order_items))
+        result = BytesIO()
+        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
+        if pdf.err:
+            raise InvoiceGenerationError(f"Error generating PDF: {pdf.err}")
+        return result.getvalue()
+
+
+class ReportLabInvoiceRenderer(InvoiceRenderer):
+    """
+    Draws the invoice directly with ReportLab platypus, skipping the HTML parse,
+    CSS cascade and layout pass of the xhtml2pdf path.
+    """
+
+    def render(self, order, order_items):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+        context = get_invoice_context(order, order_items)
+        company = context['company']
+        styles = getSampleStyleSheet()
+        header = styles['Title']
+        centered = styles['Normal'].clone('Centered', alignment=1)
+        normal = styles['Normal']
+
+        story = [
+            Paragraph(escape(company['name']), header),
+            Paragraph(escape(company['address']), centered),
+            Paragraph(escape(f"Phone: {company['phone']} | Email: {company['email']}"), centered),
+            Paragraph(escape(f"GSTIN: {company['gst_number']}"), centered),
+            Paragraph(escape(f"Invoice - {order.order_id}"), centered),
+            Spacer(1, 16),
+            Paragraph(f"<b>Billing To:</b> {escape(order.full_name)}", normal),
+            Paragraph(f"<b>Email:</b> {escape(order.email)}", normal),
+            Paragraph(f"<b>Address:</b> {escape(order.address)}", normal),
+            Paragraph(f"<b>Phone:</b> {escape(order.phone)}", normal),
+            Spacer(1, 12),
+        ]
+
+        rows = [['Product', 'HSN', 'Qty', 'Price (Rs.)', 'GST Rate (%)', 'Total (Rs.)']]
+        for item, line in zip(order_items, context['price_lines']):
+            rows.append([
+                Paragraph(escape(item.product.name), normal),
+                item.hsn_code,
+                str(item.quantity),
+                f"{item.price:.2f}",
+                str(item.gst_rate),
+                f"{line.subtotal:.2f}",
+            ])
+        rows.append(['Subtotal', '', '', '', '', f"Rs.{context['subtotal']:.2f}"])
+        rows.append(['GST Amount', '', '', '', '', f"Rs.{context['gst_amount']:.2f}"])
+        rows.append(['Grand Total', '', '', '', '', f"Rs.{context['grand_total']:.2f}"])
+
+        table = Table(rows, colWidths=[170, 60, 40, 75, 75, 80], repeatRows=1)
+        table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
+            ('SPAN', (0, -3), (4, -3)),
+            ('SPAN', (0, -2), (4, -2)),
+            ('SPAN', (0, -1), (4, -1)),
+        ]))
+        story += [
+            table,
+            Spacer(1, 16),
+            Paragraph(escape(f"Thank you for shopping with {company['name']}!"), centered),
+            Paragraph("This is a computer-generated invoice and does not require a signature.", centered),
+        ]
+
+        result = BytesIO()
+        SimpleDocTemplate(result, pagesize=A4, title=f"Invoice - {order.order_id}").build(story)
+        return result.getvalue()
+
+
+INVOICE_RENDERERS = {
+    'html': HTMLInvoiceRenderer,
+    'reportlab': ReportLabInvoiceRenderer,
+}
+
+
+def get_invoice_renderer(name=None):
+    """
+    Returns the renderer named by settings.INVOICE_RENDERER ('html', 'reportlab'
+    or a dotted path to an InvoiceRenderer subclass).
+    """
+    name = name or getattr(settings, 'INVOICE_RENDERER', 'html')
+    renderer_class = INVOICE_RENDERERS.get(name) or import_string(name)
+    return renderer_class()
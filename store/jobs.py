@@ -0,0 +1,97 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import InvoiceJob, Order
+from .utils import generate_gst_invoice
+
+
+def get_backoff(attempts):
+    """
+    Seconds to wait before retrying a job that has failed `attempts` times.
+    """
+    base = getattr(settings, 'INVOICE_JOB_BACKOFF_SECONDS', 30)
+    cap = getattr(settings, 'INVOICE_JOB_MAX_BACKOFF_SECONDS', 3600)
+    return min(base * (2 ** max(attempts - 1, 0)), cap)
+
+
+def enqueue_invoice(order, retry_failed=True):
+    """
+    Queues invoice generation for an order. Jobs that are already pending or
+    running are left alone; finished or failed jobs are reset and queued again.
+    With retry_failed=False a job that has used up its attempts stays failed,
+    for staff (the admin action or regenerate_invoices) to retry.
+    """
+    job, created = InvoiceJob.objects.get_or_create(
+        order=order,
+        defaults={'max_attempts': getattr(settings, 'INVOICE_JOB_MAX_ATTEMPTS', 5)},
+    )
+    if not retry_failed and job.status == 'failed':
+        return job
+    if not created and job.status not in ('pending', 'running'):
+        job.status = 'pending'
+        job.attempts = 0
+        job.run_after = timezone.now()
+        job.last_error = ''
+        job.save(update_fields=['status', 'attempts', 'run_after', 'last_error', 'updated_at'])
+    return job
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Puts back jobs left in 'running' by a worker that died mid-render.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return InvoiceJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='pending', run_after=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def claim_jobs(limit):
+    """
+    Marks up to `limit` due jobs as running and returns their ids. Each claim is
+    a conditional UPDATE, so two workers never pick up the same job.
+    """
+    now = timezone.now()
+    candidates = InvoiceJob.objects.filter(
+        status='pending', run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+
+    claimed = []
+    for job_id in candidates:
+        updated = InvoiceJob.objects.filter(id=job_id, status='pending').update(
+            status='running', attempts=F('attempts') + 1, updated_at=now
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def run_invoice_job(job_id):
+    """
+    Renders the invoice for a claimed job and records the outcome. Failed renders
+    are retried with exponential backoff until max_attempts is reached.
+    """
+    job = InvoiceJob.objects.select_related('order').get(id=job_id)
+    order = job.order
+
+    try:
+        generate_gst_invoice(order, fail_silently=False)
+    except Exception as e:
+        job.last_error = str(e)
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            with transaction.atomic():
+                job.save(update_fields=['status', 'last_error', 'updated_at'])
+                Order.objects.filter(id=order.id).update(invoice_generated=False)
+        else:
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=get_backoff(job.attempts))
+            job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+        return job.status
+
+    job.status = 'done'
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated_at'])
+    return job.status
@@ -0,0 +1,117 @@
+"""
+Housekeeping for `manage.py purge_stale_data`: expired sessions, abandoned
+anonymous carts (with their lines and reservations) and invoice PDFs no
+order points at any more.
+
+Rows are deleted in batches of primary keys taken in key order, each batch
+in its own short transaction with an optional pause after it, so the SQLite
+write lock is never held for long and live traffic can interleave. Every
+batch re-applies the filter, so a cart that is used again between being
+selected and being deleted is kept. With dry_run=True nothing is changed and
+the stats count what would go.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from .models import Cart, Order
+
+INVOICE_DIR = 'invoices'
+
+
+def _stats():
+    return {'deleted': 0, 'batches': 0, 'seconds': 0.0}
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0, dry_run=False):
+    """
+    Deletes the rows of `queryset` `batch_size` primary keys at a time,
+    sleeping `pause` seconds between batches. Returns stats; 'related'
+    counts the rows removed along with them by cascades.
+    """
+    stats = {**_stats(), 'related': 0}
+    started = time.monotonic()
+    if dry_run:
+        stats['deleted'] = queryset.count()
+        stats['seconds'] = time.monotonic() - started
+        return stats
+
+    last = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        keys = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not keys:
+            break
+        last = keys[-1]
+        total, per_model = queryset.filter(pk__in=keys).delete()
+        deleted = per_model.get(queryset.model._meta.label, 0)
+        stats['deleted'] += deleted
+        stats['related'] += total - deleted
+        stats['batches'] += 1
+        if pause and len(keys) == batch_size:
+            time.sleep(pause)
+    stats['seconds'] = time.monotonic() - started
+    return stats
+
+
+def expired_sessions(now=None):
+    return Session.objects.filter(expire_date__lt=now or timezone.now())
+
+
+def abandoned_carts(now=None):
+    """
+    Anonymous carts untouched for ABANDONED_CART_DAYS, or whose session has
+    expired or gone, so nobody can reach them again.
+    """
+    now = now or timezone.now()
+    live_session = Session.objects.filter(session_key=OuterRef('session_key'), expire_date__gte=now)
+    days = getattr(settings, 'ABANDONED_CART_DAYS', 30)
+    return Cart.objects.filter(user__isnull=True).filter(
+        Q(updated_at__lt=now - timedelta(days=days)) | ~Exists(live_session)
+    )
+
+
+def orphaned_invoices(min_age=None, batch_size=1000):
+    """
+    Yields lists of up to `batch_size` (name, size) pairs of files in
+    media/invoices that no Order.invoice_file refers to. Files younger than
+    `min_age` seconds are skipped: generate_gst_invoice() writes the file
+    before it saves the order.
+    """
+    if min_age is None:
+        min_age = getattr(settings, 'INVOICE_ORPHAN_MIN_AGE', 60 * 60)
+    if not default_storage.exists(INVOICE_DIR):
+        return
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    names = sorted(f"{INVOICE_DIR}/{name}" for name in default_storage.listdir(INVOICE_DIR)[1])
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        referenced = set(Order.objects.filter(invoice_file__in=batch).values_list('invoice_file', flat=True))
+        orphans = []
+        for name in batch:
+            if name in referenced or default_storage.get_modified_time(name) > cutoff:
+                continue
+            orphans.append((name, default_storage.size(name)))
+        if orphans:
+            yield orphans
+
+
+def purge_orphaned_invoices(batch_size=1000, pause=0, dry_run=False, min_age=None):
+    stats = {**_stats(), 'bytes': 0}
+    started = time.monotonic()
+    for orphans in orphaned_invoices(min_age, batch_size):
+        for name, size in orphans:
+            if not dry_run:
+                default_storage.delete(name)
+            stats['deleted'] += 1
+            stats['bytes'] += size
+        stats['batches'] += 1
+        if pause and not dry_run:
+            time.sleep(pause)
+    stats['seconds'] = time.monotonic() - started
+    return stats
@@ -0,0 +1,74 @@
+import json
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from store.api import PRODUCT_FIELDS, select, to_output
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Times serializing products to JSON from .values() rows, as the catalog API '
+        'does, against reading the same fields off model instances. The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--fields', default='id,name,slug,selling_price,image',
+                            help='Comma-separated API fields to serialize.')
+
+    def seed(self, count):
+        category = Category.objects.create(name='API benchmark', slug='bench-api-serialization')
+        Product.objects.bulk_create([
+            Product(
+                category=category, name=f'Bench product {i}', slug=f'bench-api-product-{i}',
+                description='Benchmark product ' * 10, price=Decimal(100 + i % 900),
+                image='products/bench.jpg', stock=i % 50,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        return Product.objects.filter(category=category)
+
+    def time_call(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        fields = options['fields'].split(',')
+        unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+        if unknown:
+            raise CommandError(f"Unknown field(s): {', '.join(unknown)}")
+
+        # Both sides serialize exactly `fields`; model_to_dict would silently
+        # drop the non-editable ones, such as selling_price
+        def instance_row(product):
+            row = {
+                name: product.category.slug if name == 'category_slug' else getattr(product, name)
+                for name in fields
+            }
+            if 'image' in row:
+                row['image'] = row['image'].url if row['image'] else None
+            return row
+
+        def from_instances():
+            return json.dumps([instance_row(product) for product in products.select_related('category')],
+                              cls=DjangoJSONEncoder)
+
+        def from_values():
+            return json.dumps(to_output(select(products, PRODUCT_FIELDS, fields), fields), cls=DjangoJSONEncoder)
+
+        with transaction.atomic():
+            products = self.seed(options['products'])
+            self.stdout.write(f"{options['products']} products, fields={','.join(fields)}")
+            if from_instances() != from_values():
+                raise CommandError("Instances and .values() rows serialized differently")
+            instances_ms = self.time_call(from_instances, options['repeat'])
+            values_ms = self.time_call(from_values, options['repeat'])
+            self.stdout.write(f"{'instances':<16} {instances_ms:>10.1f} ms")
+            self.stdout.write(f"{'.values()':<16} {values_ms:>10.1f} ms ({instances_ms / values_ms:.1f}x faster)")
+            transaction.set_rollback(True)
@@ -0,0 +1,55 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.catalog_import import CatalogImporter, read_rows
+
+HSN_CODES = ['6109', '6403', '8517', '9102', '3304', '4901']
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes a generated catalog file and times import_catalog on it, first creating '
+        'then updating every product. The imported rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+
+    def write_file(self, path, count, categories):
+        rng = random.Random(42)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'category', 'description', 'price', 'discounted_price', 'stock',
+                             'hsn_code', 'gst_rate'])
+            for i in range(count):
+                price = rng.randint(100, 99999)
+                writer.writerow([
+                    # Every 10th name repeats, so slugs collide
+                    f"Bench product {i if i % 10 else i // 10}", f"Bench category {i % categories}",
+                    'Imported benchmark product', price, price - rng.randint(0, price // 2) if i % 3 == 0 else '',
+                    rng.randint(0, 100), rng.choice(HSN_CODES), '18.00',
+                ])
+
+    def handle(self, *args, **options):
+        count = options['products']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.csv')
+            self.write_file(path, count, options['categories'])
+            with transaction.atomic():
+                for label in ('create', 'update'):
+                    started = time.perf_counter()
+                    importer = CatalogImporter(key='hsn_name')
+                    stats = importer.run(read_rows(path))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{label:<7} {count} rows in {elapsed:.1f}s: {count / elapsed:,.0f} rows/s, "
+                        f"{count / elapsed * 60:,.0f} per minute "
+                        f"({stats['created']} created, {stats['updated']} updated)"
+                    )
+                transaction.set_rollback(True)
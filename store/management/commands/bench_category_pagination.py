@@ -0,0 +1,76 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from store.catalog import SORT_OPTIONS, encode_cursor, keyset_page
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Times keyset pagination of a category listing against OFFSET pagination '
+        'on a seeded category. The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=30000)
+        parser.add_argument('--per-page', type=int, default=24)
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000])
+        parser.add_argument('--sort', choices=list(SORT_OPTIONS), default='newest')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def seed(self, count):
+        rng = random.Random(42)
+        category = Category.objects.create(name='Pagination benchmark', slug='bench-category-pagination')
+        now = timezone.now()
+        batch = []
+        for i in range(count):
+            price = Decimal(rng.randint(100, 999999)) / 100
+            discounted = (price * rng.choice([0, 70, 85, 95]) / 100).quantize(Decimal('0.01'))
+            batch.append(Product(
+                category=category, name=f'Bench product {i}', slug=f'bench-product-{i}',
+                description='', price=price, discounted_price=discounted or None,
+                image='products/bench.jpg', stock=rng.randint(0, 50),
+                created_at=now - timedelta(minutes=rng.randint(0, 500000)),
+            ))
+        Product.objects.bulk_create(batch, batch_size=1000)
+        return Product.objects.filter(category=category, is_active=True)
+
+    def time_call(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+        sort = options['sort']
+        ordering = SORT_OPTIONS[sort]
+
+        with transaction.atomic():
+            products = self.seed(options['products'])
+            self.stdout.write(f"{options['products']} products, {per_page} per page, sort={sort}")
+            self.stdout.write(f"{'page':>6} {'offset ms':>10} {'keyset ms':>10}")
+
+            for page in options['pages']:
+                offset = (page - 1) * per_page
+                if offset >= options['products']:
+                    self.stdout.write(f"{page:>6} skipped, past the last product")
+                    continue
+                # The cursor a visitor would hold after reading the previous page.
+                after = None
+                if offset:
+                    after = encode_cursor(products.order_by(*ordering)[offset - 1], ordering)
+
+                offset_ms = self.time_call(
+                    lambda: list(products.order_by(*ordering)[offset:offset + per_page]), options['repeat']
+                )
+                keyset_ms = self.time_call(
+                    lambda: keyset_page(products, sort, after=after, per_page=per_page), options['repeat']
+                )
+                self.stdout.write(f"{page:>6} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+            transaction.set_rollback(True)
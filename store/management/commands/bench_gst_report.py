@@ -0,0 +1,125 @@
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from store.gst_reports import GROUP_KEYS, current_month, live_rows, previous_month, report
+from store.models import Category, Order, OrderItem, Product
+from store.pricing import price_lines
+
+STATES = ['Karnataka', 'Tamil Nadu', 'Maharashtra', 'Kerala', 'Delhi']
+HSN_RATES = [('6109', '5.00'), ('6403', '18.00'), ('8517', '18.00'), ('9102', '12.00'), ('3304', '28.00'), ('4901', '0.00')]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds order lines over the past months, checks the GST report against a Python '
+        'reference computed with price_lines(), and times the live, materializing and '
+        'materialized reports. The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1000000)
+        parser.add_argument('--months', type=int, default=6)
+        parser.add_argument('--lines-per-order', type=int, default=4)
+
+    def seed(self, count, month_count, per_order):
+        rng = random.Random(42)
+        category = Category.objects.create(name='GST benchmark', slug='bench-gst-report')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'GST bench {i}', slug=f'bench-gst-{i}', description='Benchmark',
+                    price=Decimal(100 + i), image='products/bench.jpg', hsn_code=hsn, gst_rate=Decimal(rate))
+            for i, (hsn, rate) in enumerate(HSN_RATES * 5)
+        ])
+        # The last month_count months, ending with the current (still open) one
+        periods = [current_month()]
+        while len(periods) < month_count:
+            periods.insert(0, previous_month(periods[0]))
+
+        order_count = count // per_order
+        orders_per_period = order_count // len(periods)
+        for period in periods:
+            start = timezone.make_aware(datetime(period.year, period.month, 1))
+            orders = Order.objects.bulk_create([
+                Order(order_id=f'BENCHGST{period:%Y%m}{i}', full_name='Bench', email='bench@example.com',
+                      phone='9876543210', address='1 Bench Street', city='Bangalore', state=rng.choice(STATES),
+                      pincode='560001', subtotal=0, gst_amount=0, total_amount=0,
+                      payment_status=rng.random() < 0.9, status=rng.choice(['processing', 'delivered', 'cancelled']))
+                for i in range(orders_per_period)
+            ], batch_size=2000)
+            # created_at is auto_now_add, so spread the month's orders over its days afterwards
+            for day in range(28):
+                ids = [order.pk for order in orders[day::28]]
+                for batch_start in range(0, len(ids), 900):
+                    Order.objects.filter(pk__in=ids[batch_start:batch_start + 900]).update(
+                        created_at=start + timedelta(days=day, hours=rng.randint(0, 23)),
+                    )
+            items = []
+            for order in orders:
+                for product in rng.sample(products, per_order):
+                    items.append(OrderItem(
+                        order=order, product=product, quantity=rng.randint(1, 5),
+                        price=Decimal(rng.randint(100, 999999)) / 100,
+                        hsn_code=product.hsn_code, gst_rate=product.gst_rate,
+                    ))
+                if len(items) >= 20000:
+                    OrderItem.objects.bulk_create(items, batch_size=2000)
+                    items = []
+            OrderItem.objects.bulk_create(items, batch_size=2000)
+        return periods[0], periods[-1]
+
+    def reference(self, start, end):
+        """
+        Per-line Python maths over every line, grouped in a dict.
+        """
+        since = timezone.make_aware(datetime(start.year, start.month, 1))
+        lines = OrderItem.objects.filter(
+            order__payment_status=True, order__created_at__gte=since,
+        ).exclude(order__status='cancelled').values_list(
+            'order__created_at', 'order__state', 'hsn_code', 'gst_rate', 'price', 'quantity',
+        )
+        groups = defaultdict(list)
+        for created_at, state, hsn_code, gst_rate, price, quantity in lines.iterator(chunk_size=10000):
+            period = timezone.localtime(created_at).date().replace(day=1)
+            groups[(period, state, hsn_code, gst_rate)].append((price, quantity, gst_rate))
+        result = {}
+        for key, group in groups.items():
+            priced = price_lines(group)
+            result[key] = (priced.subtotal, priced.gst_amount, sum(quantity for _, quantity, _ in group), len(group))
+        return result
+
+    def timed(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        self.stdout.write(f"{label:<34} {(time.perf_counter() - started) * 1000:>10.1f} ms")
+        return result
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            start, end = self.seed(options['lines'], options['months'], options['lines_per_order'])
+            self.stdout.write(f"Seeded {OrderItem.objects.count()} lines over {start:%Y-%m}..{end:%Y-%m} "
+                              f"in {time.perf_counter() - started:.1f}s")
+
+            expected = self.timed('Python reference', lambda: self.reference(start, end))
+            self.timed('Live SQL (no summaries)', lambda: list(live_rows(start, end)))
+            first = self.timed('Report, materializing closed months', lambda: report(start, end))
+            again = self.timed('Report, from summaries', lambda: report(start, end))
+
+            actual = {
+                tuple(row[key] for key in GROUP_KEYS): (row['taxable_value'], row['gst_amount'], row['quantity'], row['lines'])
+                for row in first['rows']
+            }
+            mismatches = [key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)]
+            transaction.set_rollback(True)
+
+        if mismatches or first != again:
+            for key in sorted(mismatches, key=str)[:10]:
+                self.stderr.write(f"{key}: expected {expected.get(key)}, got {actual.get(key)}")
+            raise CommandError(f"{len(mismatches)} group(s) differ from the Python reference")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(actual)} groups match the Python reference to the paisa"
+        ))
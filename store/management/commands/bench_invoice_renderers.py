@@ -0,0 +1,58 @@
+import time
+import tracemalloc
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from store.invoice_renderers import INVOICE_RENDERERS
+from store.models import Category, Product, Order, OrderItem
+
+
+def build_order(lines):
+    """
+    Builds an unsaved order with `lines` items so renderers can be timed without
+    touching the database.
+    """
+    category = Category(name='Benchmark')
+    order = Order(
+        order_id='ORDBENCH0001', full_name='Benchmark Customer', email='bench@example.com',
+        phone='9876543210', address='1 Benchmark Road', city='Bangalore', state='Karnataka',
+        pincode='560001',
+    )
+    items = []
+    for i in range(lines):
+        product = Product(category=category, name=f'Benchmark product {i}', price=Decimal('499.00'))
+        items.append(OrderItem(
+            order=order, product=product, quantity=(i % 5) + 1, price=Decimal('499.00'),
+            hsn_code='61091000', gst_rate=Decimal('18.00'),
+        ))
+    return order, items
+
+
+class Command(BaseCommand):
+    help = 'Compares per-invoice latency and peak memory of the invoice renderers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 50, 500])
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--renderers', nargs='+', default=list(INVOICE_RENDERERS))
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'renderer':<12}{'lines':>8}{'avg ms':>12}{'peak KiB':>12}{'pdf KiB':>10}")
+        for lines in options['lines']:
+            order, items = build_order(lines)
+            for name in options['renderers']:
+                renderer = INVOICE_RENDERERS[name]()
+                renderer.render(order, items)  # warm up templates and fonts
+
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    pdf = renderer.render(order, items)
+                elapsed = (time.perf_counter() - start) / options['repeat']
+
+                tracemalloc.start()
+                renderer.render(order, items)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                self.stdout.write(
+                    f"{name:<12}{lines:>8}{elapsed * 1000:>12.1f}{peak / 1024:>12.0f}{len(pdf) / 1024:>10.1f}"
+                )
@@ -0,0 +1,102 @@
+import gc
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from store.exports import csv_chunks, gzip_chunks, ndjson_chunks
+from store.models import Category, Product
+from store.orders import ACCOUNTING_HEADER, accounting_csv_rows, accounting_documents, filter_orders, iter_orders_with_lines
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (Linux), or None.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds order lines, streams the accounting export over them and reports the '
+        'growth of resident memory while exporting. Fails if it exceeds --max-rss-mb. '
+        'The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1000000)
+        parser.add_argument('--lines-per-order', type=int, default=4)
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--max-rss-mb', type=float, default=64)
+
+    def seed(self, lines, per_order):
+        category = Category.objects.create(name='Export benchmark', slug='bench-order-export')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'Export bench {i}', slug=f'bench-export-{i}', description='Benchmark',
+                    price=100 + i, image='products/bench.jpg')
+            for i in range(per_order)
+        ])
+        orders = lines // per_order
+        with connection.cursor() as cursor:
+            # Generated in SQL, so seeding a million lines takes seconds
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM store_order")
+            first_id = cursor.fetchone()[0] + 1
+            cursor.execute("""
+                WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < %s)
+                INSERT INTO store_order (
+                    id, order_id, full_name, email, phone, address, city, state, pincode, subtotal, gst_amount,
+                    total_amount, payment_method, payment_status, status, invoice_generated, invoice_file,
+                    created_at, updated_at
+                )
+                SELECT %s + i, 'BENCHEXP' || i, 'Bench Customer', 'bench@example.com', '9876543210',
+                       '1 Bench Street', 'Bangalore', 'Karnataka', '560001', 1000, 180, 1180, 'razorpay',
+                       i %% 10 != 0, 'processing', 0, '', datetime('now', '-' || (i %% 365) || ' days'),
+                       datetime('now')
+                FROM n
+            """, [orders, first_id])
+            for position, product in enumerate(products):
+                cursor.execute("""
+                    INSERT INTO store_orderitem (order_id, product_id, quantity, price, hsn_code, gst_rate)
+                    SELECT id, %s, 1 + id %% 5, 100 + (id %% 900) + 0.99, '6109', 18
+                    FROM store_order WHERE id >= %s
+                """, [product.pk, first_id])
+        return orders * len(products)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            lines = self.seed(options['lines'], options['lines_per_order'])
+            self.stdout.write(f"Seeded {lines} lines in {time.perf_counter() - started:.1f}s")
+
+            rows = iter_orders_with_lines(filter_orders({}))
+            if options['format'] == 'ndjson':
+                chunks = ndjson_chunks(accounting_documents(rows))
+            else:
+                chunks = csv_chunks(ACCOUNTING_HEADER, accounting_csv_rows(rows))
+            if options['gzip']:
+                chunks = gzip_chunks(chunks)
+
+            gc.collect()
+            baseline = current_rss()
+            peak = baseline
+            size = 0
+            started = time.perf_counter()
+            for count, chunk in enumerate(chunks):
+                size += len(chunk)
+                if baseline is not None and count % 50 == 0:
+                    peak = max(peak, current_rss())
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Exported {size / 1e6:.1f} MB in {elapsed:.1f}s")
+        if baseline is None:
+            self.stdout.write("Resident memory is not available on this platform")
+            return
+        growth = (peak - baseline) / 2 ** 20
+        self.stdout.write(f"Resident memory grew by {growth:.1f} MB while exporting")
+        if growth > options['max_rss_mb']:
+            raise CommandError(f"Memory grew by {growth:.1f} MB, over the {options['max_rss_mb']} MB ceiling")
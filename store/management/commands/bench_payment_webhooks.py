@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.urls import reverse
+from store.models import Category, InvoiceJob, Order, OrderItem, PaymentEvent, Product
+from store.payments import process_events, webhook_request
+
+TEST_SECRET = 'whsec_local_test_only'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests /webhooks/razorpay/ with payloads signed locally with a test secret '
+        '(no network access), including retried deliveries, then times process_payment_events '
+        'and checks every order was fulfilled exactly once. The data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--retries', type=float, default=0.5,
+                            help='Share of deliveries Razorpay sends again.')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def seed(self, count):
+        category = Category.objects.create(name='Webhook benchmark', slug='bench-payment-webhooks')
+        product = Product.objects.create(category=category, name='Webhook bench', slug='bench-payment-webhooks',
+                                         description='Benchmark', price=Decimal('499.00'),
+                                         image='products/bench.jpg', stock=count * 2)
+        orders = Order.objects.bulk_create([
+            Order(order_id=f'BENCHPAY{i}', full_name='Bench', email='bench@example.com', phone='9876543210',
+                  address='1 Bench Street', city='Bangalore', state='Karnataka', pincode='560001',
+                  subtotal=Decimal('499.00'), gst_amount=Decimal('89.82'), total_amount=Decimal('588.82'),
+                  razorpay_order_id=f'order_bench{i:08d}')
+            for i in range(count)
+        ], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=product.price, hsn_code='6109',
+                      gst_rate=Decimal('18.00'))
+            for order in orders
+        ], batch_size=1000)
+        return product, orders
+
+    def handle(self, *args, **options):
+        count = options['orders']
+        rng = random.Random(42)
+        with override_settings(RAZORPAY_WEBHOOK_SECRET=TEST_SECRET), transaction.atomic():
+            product, orders = self.seed(count)
+            deliveries = []
+            for order in orders:
+                captured = webhook_request('payment.captured', order.razorpay_order_id, amount=58882)
+                deliveries.append(captured)
+                if rng.random() < options['retries']:
+                    deliveries.append(captured)
+                deliveries.append(webhook_request('order.paid', order.razorpay_order_id, amount=58882))
+            rng.shuffle(deliveries)
+            forged, headers = webhook_request('payment.captured', orders[0].razorpay_order_id, secret='wrong')
+
+            client = Client()
+            url = reverse('razorpay_webhook')
+            if client.post(url, forged, content_type='application/json', **headers).status_code != 400:
+                raise CommandError("A payload signed with the wrong secret was accepted")
+
+            latencies = []
+            started = time.perf_counter()
+            for body, headers in deliveries:
+                request_started = time.perf_counter()
+                response = client.post(url, body, content_type='application/json', **headers)
+                latencies.append((time.perf_counter() - request_started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f"Webhook answered {response.status_code}: {response.content[:200]}")
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            self.stdout.write(
+                f"Acknowledged {len(deliveries)} deliveries in {elapsed:.1f}s ({len(deliveries) / elapsed:,.0f}/s): "
+                f"p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms; "
+                f"{PaymentEvent.objects.count()} events stored"
+            )
+
+            started = time.perf_counter()
+            totals = {}
+            while True:
+                counts = process_events(options['batch_size'])
+                if not counts:
+                    break
+                for status, n in counts.items():
+                    totals[status] = totals.get(status, 0) + n
+            elapsed = time.perf_counter() - started
+            events = sum(totals.values())
+            self.stdout.write(f"Processed {events} events in {elapsed:.1f}s ({events / elapsed:,.0f}/s): {totals}")
+
+            product.refresh_from_db()
+            paid = Order.objects.filter(pk__in=[order.pk for order in orders], payment_status=True).count()
+            sold = OrderItem.objects.filter(order__in=orders).aggregate(units=Sum('quantity'))['units']
+            jobs = InvoiceJob.objects.filter(order__in=orders).count()
+            transaction.set_rollback(True)
+
+        if paid != count or product.stock != count * 2 - sold or jobs != count:
+            raise CommandError(f"{paid}/{count} orders paid, stock {product.stock}, {jobs} invoice jobs")
+        self.stdout.write(self.style.SUCCESS(
+            f"All {count} orders fulfilled exactly once (stock and invoice jobs match)"
+        ))
@@ -0,0 +1,35 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from store.pricing import price_lines
+
+
+def legacy_totals(lines):
+    # The two generator passes checkout used before store.pricing existed.
+    subtotal = sum(price * quantity for price, quantity, rate in lines)
+    gst_amount = sum((price * quantity * rate) / 100 for price, quantity, rate in lines)
+    return subtotal, gst_amount, subtotal + gst_amount
+
+
+class Command(BaseCommand):
+    help = 'Times store.pricing.price_lines against the previous two-pass sums.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        rates = [Decimal('0.00'), Decimal('5.00'), Decimal('12.00'), Decimal('18.00'), Decimal('28.00')]
+        lines = [
+            (Decimal(rng.randint(100, 999999)) / 100, rng.randint(1, 10), rng.choice(rates))
+            for _ in range(options['lines'])
+        ]
+
+        for name, func in [('legacy', legacy_totals), ('price_lines', price_lines)]:
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                func(lines)
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write(f"{name:<12} {options['lines']} lines: {elapsed * 1000:.1f} ms")
@@ -0,0 +1,87 @@
+import random
+from itertools import accumulate
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from store.models import Category, Product
+from store.search import match_queryset, rebuild_index, search_products
+
+WORDS = (
+    'cotton silk linen denim leather wool classic slim regular printed solid striped checked '
+    'casual formal party ethnic kurta saree shirt tshirt jeans trousers jacket sneakers sandals '
+    'boots watch wallet backpack handbag bottle lamp mug cushion bedsheet curtain speaker charger '
+    'earphones keyboard mouse stand organic herbal premium handmade vintage wireless waterproof'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Times full-text search against the LIKE queries the admin used to run, on '
+        'a seeded catalog. The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--query', action='append', dest='queries',
+                            help='Search text to time (can be repeated).')
+
+    def seed(self, count, rng):
+        categories = [Category.objects.create(name=f'Search bench {i}', slug=f'search-bench-{i}') for i in range(20)]
+        # Descriptions draw from a large, skewed vocabulary like real copy does
+        vocabulary = WORDS + [f'w{n}' for n in range(20000)]
+        cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        for start in range(0, count, 5000):
+            Product.objects.bulk_create([
+                Product(
+                    category=rng.choice(categories),
+                    name=' '.join(rng.sample(WORDS, 3)).title(),
+                    slug=f'search-bench-{i}',
+                    description=' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=30)),
+                    price=Decimal(rng.randint(100, 99999)),
+                    image='products/bench.jpg',
+                    hsn_code=str(rng.randint(10000000, 99999999)),
+                )
+                for i in range(start, min(start + 5000, count))
+            ])
+
+    def like_search(self, query):
+        # What ProductAdmin.search_fields = ['name', 'description'] generated;
+        # the changelist counts the matches as well as fetching a page.
+        products = Product.objects.filter(is_active=True)
+        for term in query.split():
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return products.count(), list(products[:20])
+
+    def fts_search(self, query, products):
+        return match_queryset(products, query).count(), search_products(query, products, limit=20)
+
+    def time_call(self, func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        queries = options['queries'] or ['leather', 'wireless speaker', 'handmade silk saree', 'waterpr', 'w1234']
+        active = Product.objects.filter(is_active=True)
+
+        with transaction.atomic():
+            started = time.monotonic()
+            self.seed(options['products'], rng)
+            self.stdout.write(f"Seeded {options['products']} products in {time.monotonic() - started:.1f}s")
+            started = time.monotonic()
+            rebuild_index()
+            self.stdout.write(f"Rebuilt the index in {time.monotonic() - started:.1f}s")
+
+            self.stdout.write(f"{'query':<24} {'matches':>8} {'LIKE ms':>10} {'FTS5 ms':>10}")
+            for query in queries:
+                matches = self.fts_search(query, active)[0]
+                like_ms = self.time_call(lambda: self.like_search(query), options['repeat'])
+                fts_ms = self.time_call(lambda: self.fts_search(query, active), options['repeat'])
+                self.stdout.write(f"{query:<24} {matches:>8} {like_ms:>10.1f} {fts_ms:>10.1f}")
+
+            transaction.set_rollback(True)
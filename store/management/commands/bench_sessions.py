@@ -0,0 +1,75 @@
+import time
+from decimal import Decimal
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from store.models import Category, Product
+from store.sessions import anonymous_cookie_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Times repeated requests for the home page by a returning visitor with the old '
+        'session setup (a database session saved on every request) and with store.sessions, '
+        'and counts the session writes. The seed data is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def seed(self):
+        category = Category.objects.create(name='Session benchmark', slug='bench-sessions')
+        Product.objects.bulk_create([
+            Product(category=category, name=f'Session bench {i}', slug=f'bench-sessions-{i}', description='Benchmark',
+                    price=Decimal(100 + i), image='products/bench.jpg', stock=10, featured=i < 8)
+            for i in range(24)
+        ])
+
+    def visitor(self, engine, cookie_name):
+        store = import_module(engine).SessionStore()
+        store['recently_viewed'] = [1, 2, 3]
+        store.save()
+        client = Client()
+        client.cookies[cookie_name] = store.session_key
+        return client
+
+    def run(self, label, client, count):
+        writes = 0
+
+        def count_writes(execute, sql, params, many, context):
+            nonlocal writes
+            writes += 'django_session' in sql and sql.startswith(('INSERT', 'UPDATE'))
+            return execute(sql, params, many, context)
+
+        url = reverse('home')
+        client.get(url)
+        with connection.execute_wrapper(count_writes):
+            started = time.perf_counter()
+            for _ in range(count):
+                client.get(url)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<40} {count / elapsed:>8,.0f} reads/s {writes:>7} session writes")
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        old_middleware = [
+            'django.contrib.sessions.middleware.SessionMiddleware' if name == 'store.sessions.SessionMiddleware'
+            else name for name in settings.MIDDLEWARE
+        ]
+        with transaction.atomic():
+            self.seed()
+            self.stdout.write(f"{count} requests for {reverse('home')} per visitor")
+            with override_settings(MIDDLEWARE=old_middleware, SESSION_SAVE_EVERY_REQUEST=True):
+                client = self.visitor(settings.SESSION_ENGINE, settings.SESSION_COOKIE_NAME)
+                self.run('before: database session, saved always', client, count)
+            client = self.visitor(settings.ANONYMOUS_SESSION_ENGINE, anonymous_cookie_name())
+            self.run('after: anonymous signed-cookie session', client, count)
+            with override_settings(ANONYMOUS_SESSION_ENGINE='django.contrib.sessions.backends.cache'):
+                client = self.visitor(settings.ANONYMOUS_SESSION_ENGINE, anonymous_cookie_name())
+                self.run('after: anonymous cache session', client, count)
+            client = self.visitor(settings.SESSION_ENGINE, settings.SESSION_COOKIE_NAME)
+            self.run('after: database session (has a cart)', client, count)
+            transaction.set_rollback(True)
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from store.recommendations import build
+
+
+class Command(BaseCommand):
+    help = (
+        'Adds paid orders placed since the last run to the "frequently bought together" '
+        'pairing counts and re-ranks the products they contain.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Discard the existing counts and process every order again.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Orders counted per statement.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run = build(rebuild=options['rebuild'], batch_size=options['batch_size'])
+        if run is None:
+            self.stdout.write("No new orders to process")
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {run.orders} order(s) up to #{run.last_order_id}, re-ranked {run.products} "
+            f"product(s) in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.inventory import expire_reservations
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired stock reservations in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = expire_reservations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {deleted} reservation(s)"))
@@ -0,0 +1,46 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from store.exports import csv_chunks, gzip_chunks, ndjson_chunks
+from store.orders import (
+    ACCOUNTING_HEADER, accounting_csv_rows, accounting_documents, filter_orders, iter_orders_with_lines,
+)
+
+
+class Command(BaseCommand):
+    help = 'Streams orders and their lines as CSV (one row per line) or NDJSON (one order per line).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--from', dest='from', help='First order date, YYYY-MM-DD.')
+        parser.add_argument('--to', dest='to', help='Last order date, YYYY-MM-DD.')
+        parser.add_argument('--status')
+        parser.add_argument('--paid', choices=['yes', 'no'])
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', help='File to write (default: standard output).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        try:
+            orders = filter_orders(options)
+        except ValueError as e:
+            raise CommandError(e)
+        rows = iter_orders_with_lines(orders, chunk_size=options['chunk_size'])
+        if options['format'] == 'ndjson':
+            chunks = ndjson_chunks(accounting_documents(rows))
+        else:
+            chunks = csv_chunks(ACCOUNTING_HEADER, accounting_csv_rows(rows))
+        if options['gzip']:
+            chunks = gzip_chunks(chunks)
+
+        if options['output']:
+            # csv_chunks already writes \r\n line endings
+            mode, newline = ('wb', None) if options['gzip'] else ('w', '')
+            with open(options['output'], mode, newline=newline) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        elif options['gzip']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
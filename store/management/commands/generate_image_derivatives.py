@@ -0,0 +1,82 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from store.images import generate_derivatives
+from store.models import Category, Product
+
+DIRECTORIES = {'products': Product, 'categories': Category}
+
+
+def _init_worker():
+    connections.close_all()
+
+
+def make_derivatives(payload):
+    """
+    Runs in a worker process: resizes one stored image and returns
+    (name, content hash, error).
+    """
+    name, force = payload
+    try:
+        return name, generate_derivatives(name, force=force), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = (
+        'Makes the resized WebP/JPEG copies of every image in media/products and '
+        'media/categories in parallel worker processes, and records their hashes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of resizing processes (0 resizes in this process).')
+        parser.add_argument('--force', action='store_true',
+                            help='Rewrite derivatives that already exist.')
+
+    def list_images(self):
+        for directory, model in DIRECTORIES.items():
+            if not default_storage.exists(directory):
+                continue
+            for file_name in sorted(default_storage.listdir(directory)[1]):
+                yield model, f"{directory}/{file_name}"
+
+    def handle(self, *args, **options):
+        images = list(self.list_images())
+        self.stdout.write(f"{len(images)} image(s) to process")
+        payloads = [(name, options['force']) for _, name in images]
+
+        started = time.monotonic()
+        if options['workers'] > 0:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                results = list(pool.map(make_derivatives, payloads, chunksize=max(len(payloads) // options['workers'], 1)))
+        else:
+            results = [make_derivatives(payload) for payload in payloads]
+
+        hashes = {}
+        failed = 0
+        for (model, _), (name, digest, error) in zip(images, results):
+            if error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+            else:
+                hashes.setdefault(model, {})[name] = digest
+
+        updated = 0
+        with transaction.atomic():
+            for model, digests in hashes.items():
+                rows = list(model.objects.filter(image__in=digests).only('pk', 'image', 'image_hash'))
+                for row in rows:
+                    row.image_hash = digests[row.image.name]
+                model.objects.bulk_update(rows, ['image_hash'], batch_size=500)
+                updated += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(images) - failed} image(s), {failed} failed, {updated} row(s) updated "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,59 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from store.gst_reports import GROUPINGS, current_month, parse_month, previous_month, report
+
+COLUMN_TITLES = {
+    'period': 'Month', 'state': 'State', 'hsn_code': 'HSN code', 'gst_rate': 'GST rate (%)',
+    'taxable_value': 'Taxable value', 'gst_amount': 'GST', 'total': 'Total', 'quantity': 'Quantity', 'lines': 'Lines',
+}
+AMOUNT_COLUMNS = ['taxable_value', 'gst_amount', 'total', 'quantity', 'lines']
+
+
+class Command(BaseCommand):
+    help = (
+        'Prints taxable value and GST of paid orders by month, state, HSN code and rate. '
+        'Closed months are materialized on first use and read from the summary table afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First month, YYYY-MM (default: last month).')
+        parser.add_argument('--to', dest='end', help='Last month, YYYY-MM (default: --from).')
+        parser.add_argument('--by', choices=list(GROUPINGS), default='hsn')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Recompute closed months, e.g. after a late cancellation.')
+        parser.add_argument('--csv', action='store_true', help='Write CSV instead of a table.')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_month(options['start']) if options['start'] else None
+            end = parse_month(options['end']) if options['end'] else start
+        except ValueError:
+            raise CommandError('Months must be given as YYYY-MM')
+        if start is None:
+            start = end = previous_month(current_month())
+        if end < start:
+            raise CommandError('--to is before --from')
+
+        result = report(start, end, by=options['by'], refresh=options['refresh'])
+        columns = result['columns'] + AMOUNT_COLUMNS
+        rows = [[self.format(column, row[column]) for column in columns] for row in result['rows']]
+        totals = ['Total'] + [''] * (len(result['columns']) - 1)
+        totals += [self.format(column, result['totals'][column]) for column in AMOUNT_COLUMNS]
+
+        if options['csv']:
+            writer = csv.writer(self.stdout)
+            writer.writerow([COLUMN_TITLES[column] for column in columns])
+            writer.writerows(rows + [totals])
+            return
+        table = [[COLUMN_TITLES[column] for column in columns]] + rows + [totals]
+        widths = [max(len(row[i]) for row in table) for i in range(len(columns))]
+        for row in table:
+            self.stdout.write('  '.join(
+                value.rjust(width) if columns[i] in AMOUNT_COLUMNS else value.ljust(width)
+                for i, (value, width) in enumerate(zip(row, widths))
+            ))
+
+    def format(self, column, value):
+        if column == 'period':
+            return value.strftime('%Y-%m')
+        return str(value)
@@ -0,0 +1,48 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from store.catalog_import import FIELDS, KEYS, CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates or updates products from a CSV (with a header row) or NDJSON file. '
+        f"Recognised columns: {', '.join(FIELDS)}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the file extension.')
+        parser.add_argument('--key', choices=KEYS, default='slug',
+                            help='Match existing products by slug, or by HSN code and name.')
+        parser.add_argument('--images', help='Directory holding the files named in the image column.')
+        parser.add_argument('--image-workers', type=int, default=8)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Skip rows whose category does not exist instead of creating it.')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f"{options['path']} does not exist")
+        if options['images'] and not os.path.isdir(options['images']):
+            raise CommandError(f"{options['images']} is not a directory")
+
+        started = time.monotonic()
+        importer = CatalogImporter(
+            key=options['key'], images_dir=options['images'], chunk_size=options['chunk_size'],
+            image_workers=options['image_workers'], create_categories=not options['no_create_categories'],
+        )
+        stats = importer.run(read_rows(options['path'], options['format']))
+        elapsed = time.monotonic() - started
+
+        for line_number, message in importer.errors[:20]:
+            self.stderr.write(f"line {line_number}: {message}" if line_number else message)
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... and {len(importer.errors) - 20} more")
+        rows = stats['created'] + stats['updated'] + stats['skipped']
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['created']} created, {stats['updated']} updated, {stats['skipped']} skipped, "
+            f"{stats['images']} image(s) stored in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):,.0f} rows/s)"
+        ))
+        if stats['images']:
+            self.stdout.write("Run generate_image_derivatives to make the resized copies of new images.")
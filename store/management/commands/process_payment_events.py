@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from store.payments import process_events, requeue_stale_events
+
+
+class Command(BaseCommand):
+    help = 'Fulfils the Razorpay webhook events stored by /webhooks/razorpay/, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Events claimed and fulfilled per batch.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when there are no pending events.')
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help='Seconds after which a running event is considered abandoned.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once there are no pending events left.')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                requeue_stale_events(options['stale_after'])
+                started = time.monotonic()
+                counts = process_events(options['batch_size'])
+                if not counts:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+                self.stdout.write(f"{sum(counts.values())} event(s) in {(time.monotonic() - started) * 1000:.0f} ms: {summary}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping payment event processor")
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from store.maintenance import abandoned_carts, delete_in_batches, expired_sessions, purge_orphaned_invoices
+
+TASKS = ['sessions', 'carts', 'invoices']
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired sessions, abandoned anonymous carts and invoice files no order '
+        'refers to, in small batches. Safe to run from cron while the site is live.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=TASKS,
+                            help='Run only this task (can be repeated). Default: all, in the order listed.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows (or files) deleted per batch and transaction.')
+        parser.add_argument('--pause', type=float, default=0.2,
+                            help='Seconds to sleep between batches, leaving the database to live traffic.')
+        parser.add_argument('--invoice-min-age', type=int,
+                            help='Only delete invoice files older than this many seconds '
+                                 '(default: settings.INVOICE_ORPHAN_MIN_AGE).')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted.')
+
+    def handle(self, *args, **options):
+        batching = {'batch_size': options['batch_size'], 'pause': options['pause'], 'dry_run': options['dry_run']}
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        # Sessions first: carts whose session has just expired go in the same run
+        for task in [task for task in TASKS if task in (options['only'] or TASKS)]:
+            if task == 'sessions':
+                stats = delete_in_batches(expired_sessions(), **batching)
+                detail = 'expired session(s)'
+            elif task == 'carts':
+                stats = delete_in_batches(abandoned_carts(), **batching)
+                detail = 'abandoned cart(s)'
+                if stats['related']:
+                    detail += f" with {stats['related']} line(s) and reservation(s)"
+            else:
+                stats = purge_orphaned_invoices(min_age=options['invoice_min_age'], **batching)
+                detail = f"orphaned invoice file(s), {stats['bytes'] / 1024 / 1024:.1f} MB"
+            self.stdout.write(
+                f"{verb} {stats['deleted']} {detail} in {stats['batches']} batch(es), {stats['seconds']:.1f}s"
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
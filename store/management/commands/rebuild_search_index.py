@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product full-text search index from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Products inserted into the index per statement.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # One transaction, so searches keep using the old index until the new one is complete
+        with transaction.atomic():
+            indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} product(s) in {time.monotonic() - started:.1f}s"
+        ))
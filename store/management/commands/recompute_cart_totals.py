@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.utils import recompute_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored item count, quantity and subtotal of every cart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = recompute_cart_totals(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {updated} cart(s)"))
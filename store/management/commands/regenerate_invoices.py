@@ -0,0 +1,152 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from store.invoice_renderers import get_invoice_renderer
+from store.models import InvoiceJob, Order
+
+
+def _init_worker():
+    connections.close_all()
+
+
+def render_invoice(payload):
+    """
+    Runs in a worker process: renders one order and returns (order pk, pdf, error).
+    """
+    order, order_items = payload
+    try:
+        return order.pk, get_invoice_renderer().render(order, order_items), None
+    except Exception as e:
+        return order.pk, None, str(e)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Regenerates GST invoices in bulk, rendering them in parallel worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only orders created on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Only orders created on or before this date (YYYY-MM-DD).')
+        parser.add_argument('--status', action='append', choices=[c[0] for c in Order.STATUS_CHOICES],
+                            help='Only orders with this status (can be repeated).')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Only orders whose invoice has not been generated.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of rendering processes (0 renders in this process).')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Orders loaded, rendered and written back per batch.')
+        parser.add_argument('--checkpoint',
+                            help='File recording the last finished order id; a rerun resumes after it.')
+
+    def parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+    def get_queryset(self, options):
+        orders = Order.objects.all()
+        if options['since']:
+            orders = orders.filter(created_at__date__gte=self.parse_date(options['since']))
+        if options['until']:
+            orders = orders.filter(created_at__date__lte=self.parse_date(options['until']))
+        if options['status']:
+            orders = orders.filter(status__in=options['status'])
+        if options['missing_only']:
+            orders = orders.filter(invoice_generated=False)
+        return orders
+
+    def read_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        return 0
+
+    def write_checkpoint(self, path, last_pk):
+        if path:
+            with open(path, 'w') as f:
+                f.write(str(last_pk))
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checkpoint = options['checkpoint']
+        start_after = self.read_checkpoint(checkpoint)
+
+        orders = self.get_queryset(options).filter(pk__gt=start_after).order_by('pk')
+        total = orders.count()
+        if start_after:
+            self.stdout.write(f"Resuming after order id {start_after}")
+        self.stdout.write(f"{total} order(s) to process")
+
+        pool = None
+        if options['workers'] > 0:
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+
+        done = failed = 0
+        started = time.monotonic()
+        try:
+            stream = orders.prefetch_related('items__product').iterator(chunk_size=chunk_size)
+            for chunk in chunked(stream, chunk_size):
+                payloads = [(order, list(order.items.all())) for order in chunk]
+                if pool:
+                    per_worker = max(len(payloads) // options['workers'], 1)
+                    results = list(pool.map(render_invoice, payloads, chunksize=per_worker))
+                else:
+                    results = [render_invoice(payload) for payload in payloads]
+
+                succeeded, errors = self.write_back(chunk, results)
+                done += succeeded
+                failed += len(errors)
+                for pk, error in errors:
+                    self.stderr.write(f"Order id {pk}: {error}")
+
+                self.write_checkpoint(checkpoint, chunk[-1].pk)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{done + failed}/{total} processed, {failed} failed, "
+                    f"{(done + failed) / elapsed if elapsed else 0:.1f} orders/s"
+                )
+        finally:
+            if pool:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Regenerated {done} invoice(s), {failed} failed in {time.monotonic() - started:.1f}s"
+        ))
+
+    def write_back(self, chunk, results):
+        orders = {order.pk: order for order in chunk}
+        updated = []
+        errors = []
+        for pk, pdf, error in results:
+            if error:
+                errors.append((pk, error))
+                continue
+            order = orders[pk]
+            if order.invoice_file:
+                order.invoice_file.delete(save=False)
+            order.invoice_file.save(f"invoice_{order.order_id}.pdf", ContentFile(pdf), save=False)
+            order.invoice_generated = True
+            updated.append(order)
+
+        with transaction.atomic():
+            Order.objects.bulk_update(updated, ['invoice_file', 'invoice_generated'])
+            InvoiceJob.objects.filter(
+                order__in=updated, status__in=['pending', 'failed']
+            ).update(status='done', last_error='', updated_at=timezone.now())
+        return len(updated), errors
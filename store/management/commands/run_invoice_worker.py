@@ -0,0 +1,70 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from store.jobs import claim_jobs, requeue_stale_jobs, run_invoice_job
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Processes queued GST invoice jobs with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (0 renders in this process).')
+        parser.add_argument('--batch-size', type=int, default=0,
+                            help='Jobs claimed per poll (defaults to twice the worker count).')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds after which a running job is considered abandoned.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue has no due jobs left.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size'] or max(workers, 1) * 2
+
+        pool = None
+        if workers > 0:
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+        self.stdout.write(f"Invoice worker started with {workers} process(es)")
+        try:
+            while True:
+                requeue_stale_jobs(options['stale_after'])
+                job_ids = claim_jobs(batch_size)
+
+                if not job_ids:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if pool:
+                    futures = [(job_id, pool.submit(run_invoice_job, job_id)) for job_id in job_ids]
+                    for job_id, future in futures:
+                        self.report(job_id, future.result)
+                else:
+                    for job_id in job_ids:
+                        self.report(job_id, lambda: run_invoice_job(job_id))
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping invoice worker")
+        finally:
+            if pool:
+                pool.shutdown()
+
+    def report(self, job_id, get_status):
+        # A crash here leaves the job 'running'; requeue_stale_jobs picks it up later.
+        try:
+            status = get_status()
+        except Exception as e:
+            self.stderr.write(f"Job {job_id}: worker error: {e}")
+            return
+        self.stdout.write(f"Job {job_id}: {status}")
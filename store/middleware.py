@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+from .utils import load_cart
+
+
+class CartMiddleware:
+    """
+    Attaches a lazy request.cart. The cart is looked up at most once per request,
+    on first use, and is shared by the views and the cart_count context processor.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: load_cart(request))
+        return self.get_response(request)
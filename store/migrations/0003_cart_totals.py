@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 16:03
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, NullIf
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    selling_price = Coalesce(NullIf('product__discounted_price', 0), 'product__price')
+    totals = CartItem.objects.values('cart_id').annotate(
+        line_count=Count('id'),
+        quantity_sum=Sum('quantity'),
+        amount=Sum(F('quantity') * selling_price, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by()
+    carts = [
+        Cart(pk=row['cart_id'], item_count=row['line_count'],
+             total_quantity=row['quantity_sum'], subtotal=row['amount'])
+        for row in totals
+    ]
+    Cart.objects.bulk_update(carts, ['item_count', 'total_quantity', 'subtotal'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0002_invoicejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
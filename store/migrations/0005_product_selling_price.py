@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 16:09
+
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.lookups import GreaterThan
+
+
+def backfill_pricing(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    selling_price = Coalesce(
+        NullIf(F('discounted_price'), Value(0)), F('price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    discount_pct = Case(
+        When(
+            # Only a real discount; discount_pct is unsigned
+            Q(GreaterThan(F('discounted_price'), 0)) & Q(GreaterThan(F('price'), F('discounted_price'))),
+            then=Cast(Round(
+                Cast(F('price') - F('discounted_price'), FloatField()) * 100 / Cast(F('price'), FloatField())
+            ), IntegerField()),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    # Chunked by primary key so large catalogs are not rewritten in one statement
+    ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), 1000):
+        Product.objects.filter(pk__in=ids[start:start + 1000]).update(
+            selling_price=selling_price, discount_pct=discount_pct,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='discount_pct',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='selling_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_pricing, migrations.RunPython.noop),
+    ]
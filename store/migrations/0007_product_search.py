@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE store_product_search USING fts5(
+                    name, description, category, hsn_code,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+                """,
+                """
+                INSERT INTO store_product_search (rowid, name, description, category, hsn_code)
+                SELECT p.id, p.name, p.description, c.name, p.hsn_code
+                FROM store_product p INNER JOIN store_category c ON c.id = p.category_id
+                """,
+            ],
+            reverse_sql='DROP TABLE store_product_search',
+        ),
+    ]
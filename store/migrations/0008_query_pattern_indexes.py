@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:08
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    duplicates = CartItem.objects.values('cart_id', 'product_id').annotate(
+        lines=Count('id'), first_id=Min('id'), quantity_sum=Sum('quantity'),
+    ).filter(lines__gt=1).order_by()
+    # Quantities move onto the oldest line; the cart's quantity and subtotal
+    # are unchanged, only its line count drops.
+    for row in duplicates:
+        CartItem.objects.filter(pk=row['first_id']).update(quantity=row['quantity_sum'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(
+            pk=row['first_id']
+        ).delete()
+        Cart.objects.filter(pk=row['cart_id']).update(item_count=F('item_count') - (row['lines'] - 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('session_key__isnull', False)), fields=['session_key'], name='store_cart_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at'], name='store_order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['razorpay_order_id'], name='store_order_razorpay_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('featured', True), ('is_active', True)), fields=['created_at', 'id'], name='store_product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='store_product_latest_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='store_cartitem_unique_product'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GstPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month', unique=True)),
+                ('materialized_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GstSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('state', models.CharField(max_length=100)),
+                ('hsn_code', models.CharField(max_length=20)),
+                ('gst_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('taxable_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('gst_amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('quantity', models.PositiveIntegerField()),
+                ('lines', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name_plural': 'GST summaries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_status', True)), fields=['created_at'], name='store_order_paid_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='gstsummary',
+            constraint=models.UniqueConstraint(fields=('period', 'state', 'hsn_code', 'gst_rate'), name='store_gstsummary_unique_group'),
+        ),
+    ]
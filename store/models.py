@@ -1,14 +1,33 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 import uuid
+from . import fragments, pricing, search
+
+class CategoryQuerySet(models.QuerySet):
+
+    def touch(self):
+        """
+        Bumps updated_at, the Last-Modified of the category pages
+        (store.conditional), when a product leaves them: deleted, deactivated
+        or moved. The products' own updated_at can't show that once they are
+        no longer counted.
+        """
+        return self.update(updated_at=timezone.now())
 
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    # Content hash in the names of the resized copies (store.images)
+    image_hash = models.CharField(max_length=12, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -17,11 +36,144 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.image and not self.image._committed:
+            # A new upload; its derivatives are made once it is saved
+            self.image_hash = ''
         super().save(*args, **kwargs)
     
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps updated_at, the stored selling_price/discount_pct columns, the search
+    index and the fragment cache versions in step when products are changed
+    through update(), bulk_update() or bulk_create(), which bypass save() and
+    its signals.
+    """
+    price_fields = {'price', 'discounted_price'}
+    derived_fields = ['selling_price', 'discount_pct']
+    search_fields = {'name', 'description', 'hsn_code', 'category', 'category_id'}
+    # Not shown in cached fragments, so changing only these keeps them
+    uncached_fields = {'stock', 'updated_at'}
+    # store.conditional watches stock on its own, so changing only these
+    # leaves updated_at (and every other column) alone
+    untimestamped_fields = {'stock'}
+    # Changing these can take a product off a category page
+    membership_fields = {'is_active', 'category', 'category_id'}
+
+    def update(self, **kwargs):
+        # As auto_now does on save(); catalog pages revalidate against it
+        if set(kwargs) - self.untimestamped_fields:
+            kwargs.setdefault('updated_at', timezone.now())
+        if self.price_fields & set(kwargs):
+            # SET expressions see the old row, so feed the new values in directly
+            prices = {field: kwargs[field] for field in self.price_fields if field in kwargs}
+            kwargs['selling_price'] = pricing.selling_price_expression(**prices)
+            kwargs['discount_pct'] = pricing.discount_percentage_expression(**prices)
+        reindex = bool(self.search_fields & set(kwargs))
+        invalidate = bool(set(kwargs) - self.uncached_fields)
+        reprice = bool(self.price_fields & set(kwargs))
+        if not reindex and not invalidate and not reprice:
+            return super().update(**kwargs)
+
+        # The filter may not match once the row has changed
+        rows = list(self.values_list('pk', 'category_id'))
+        updated = super().update(**kwargs)
+        if reindex:
+            search.index_products(pk for pk, _ in rows)
+        if invalidate:
+            category_ids = {category_id for _, category_id in rows}
+            new_category = kwargs.get('category_id', kwargs.get('category'))
+            if new_category is not None:
+                category_ids.add(getattr(new_category, 'pk', new_category))
+            fragments.invalidate_products(category_ids)
+            if self.membership_fields & set(kwargs):
+                Category.objects.filter(pk__in=category_ids).touch()
+        if reprice:
+            Cart.objects.holding(pk for pk, _ in rows).recompute_totals()
+        return updated
+
+    def _prepare_update(self, objs, fields):
+        if 'updated_at' not in fields and set(fields) - self.untimestamped_fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            fields = list(fields) + ['updated_at']
+        if self.price_fields & set(fields):
+            for obj in objs:
+                obj.set_pricing_fields()
+            fields = list(fields) + [f for f in self.derived_fields if f not in fields]
+        return fields
+
+    def _after_update(self, objs, fields):
+        if self.search_fields & set(fields):
+            search.index_products(obj.pk for obj in objs)
+        if self.price_fields & set(fields):
+            Cart.objects.holding(obj.pk for obj in objs).recompute_totals()
+        if set(fields) - self.uncached_fields:
+            # Read from __dict__, so objects loaded with only() don't fetch
+            # their deferred category one query at a time
+            category_ids = {obj.__dict__.get('category_id') for obj in objs}
+            category_ids |= {getattr(obj, '_loaded_category_id', None) for obj in objs}
+            deferred = [obj.pk for obj in objs if obj.__dict__.get('category_id') is None]
+            if deferred:
+                category_ids.update(
+                    models.QuerySet(self.model, using=self.db).filter(pk__in=deferred).values_list('category_id', flat=True)
+                )
+            fragments.invalidate_products(category_ids)
+            if self.membership_fields & set(fields):
+                Category.objects.filter(pk__in=category_ids).touch()
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = self._prepare_update(objs, fields)
+        # Django writes each batch with queryset.update(); on a plain QuerySet
+        # so the CASE expressions skip the bookkeeping done here once for all
+        plain = models.QuerySet(self.model, query=self.query.chain(), using=self._db)
+        rows = plain.bulk_update(objs, fields, *args, **kwargs)
+        self._after_update(objs, fields)
+        return rows
+
+    def update_rows(self, objs, fields):
+        """
+        bulk_update() for many rows: one parameterised UPDATE per object run
+        with executemany(), instead of a CASE per field with a WHEN per object,
+        which Django is slow to build for thousands of rows.
+        """
+        objs = list(objs)
+        fields = self._prepare_update(objs, fields)
+        connection = connections[self.db]
+        model_fields = [self.model._meta.get_field(name) for name in fields]
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            connection.ops.quote_name(self.model._meta.db_table),
+            ', '.join(f'{connection.ops.quote_name(field.column)} = %s' for field in model_fields),
+            connection.ops.quote_name(self.model._meta.pk.column),
+        )
+        params = [
+            [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in model_fields] + [obj.pk]
+            for obj in objs
+        ]
+        with transaction.atomic(using=self.db, savepoint=False), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+        self._after_update(objs, fields)
+        return len(objs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_pricing_fields()
+        created = super().bulk_create(objs, *args, **kwargs)
+        search.index_products(obj.pk for obj in created if obj.pk is not None)
+        fragments.invalidate_products({obj.category_id for obj in created})
+        return created
+
+    def refresh_pricing(self):
+        return super().update(
+            selling_price=pricing.selling_price_expression(),
+            discount_pct=pricing.discount_percentage_expression(),
+        )
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=300)
@@ -29,7 +181,11 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discounted_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Derived from price/discounted_price so listings can sort and filter in SQL
+    selling_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    discount_pct = models.PositiveSmallIntegerField(default=0, editable=False)
     image = models.ImageField(upload_to='products/')
+    image_hash = models.CharField(max_length=12, blank=True, editable=False)
     stock = models.IntegerField(default=0)
     hsn_code = models.CharField(max_length=20, default='00000000')
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=18.00)
@@ -38,37 +194,151 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # One per catalog.SORT_OPTIONS, so category pages seek by keyset
+            # instead of scanning and sorting the whole category. Partial on
+            # is_active, which SQLite compares as a bare column, not "= 1".
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_active=True), name='store_product_newest_idx'),
+            models.Index(fields=['category', 'selling_price', 'id'], condition=models.Q(is_active=True), name='store_product_price_idx'),
+            models.Index(fields=['category', 'discount_pct', 'id'], condition=models.Q(is_active=True), name='store_product_discount_idx'),
+            models.Index(fields=['category', 'name', 'id'], condition=models.Q(is_active=True), name='store_product_name_idx'),
+            # The home page's featured and latest rows across all categories.
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True, featured=True), name='store_product_featured_idx'),
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True), name='store_product_latest_idx'),
+            # Covers the per-category MAX(updated_at)/COUNT()s of store.conditional
+            models.Index(fields=['category', 'is_active', 'updated_at', 'stock'], name='store_product_updated_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets a move to another category invalidate the old one's fragments too
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        # Lets a deactivation bump the category's updated_at
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+        # Lets a price change reprice the carts holding the product
+        instance._loaded_selling_price = instance.__dict__.get('selling_price')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        if self.image and not self.image._committed:
+            self.image_hash = ''
+        self.set_pricing_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and ProductQuerySet.price_fields & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(ProductQuerySet.derived_fields)
         super().save(*args, **kwargs)
     
+    def set_pricing_fields(self):
+        self.selling_price = self.get_selling_price()
+        self.discount_pct = self.get_discount_percentage()
+    
     def get_selling_price(self):
-        if self.discounted_price:
-            return self.discounted_price
-        return self.price
+        return pricing.selling_price(self.price, self.discounted_price)
     
     def get_discount_percentage(self):
-        if self.discounted_price:
-            discount = ((self.price - self.discounted_price) / self.price) * 100
-            return round(discount)
-        return 0
+        return pricing.discount_percentage(self.price, self.discounted_price)
     
     def __str__(self):
         return self.name
 
+class CartQuerySet(models.QuerySet):
+
+    def holding(self, product_ids):
+        """
+        Carts with a line for any of `product_ids`.
+        """
+        return self.filter(pk__in=CartItem.objects.filter(product_id__in=list(product_ids)).values('cart_id'))
+
+    def recompute_totals(self, batch_size=500):
+        """
+        Rebuilds the denormalized totals of these carts from one grouped
+        aggregate over their lines at current prices and writes them back with
+        bulk_update. Returns the carts updated.
+        """
+        lines = CartItem.objects.all()
+        if self.query.has_filters():
+            lines = lines.filter(cart__in=self.values('pk'))
+        totals = lines.values('cart_id').annotate(
+            line_count=models.Count('id'),
+            quantity_sum=models.Sum('quantity'),
+            amount=models.Sum(pricing.line_subtotal_expression(pricing.selling_price_expression('product__'))),
+        ).order_by()
+
+        updated = 0
+        batch = []
+        for row in totals.iterator():
+            batch.append(Cart(
+                pk=row['cart_id'],
+                item_count=row['line_count'],
+                total_quantity=row['quantity_sum'],
+                subtotal=row['amount'],
+            ))
+            if len(batch) >= batch_size:
+                updated += Cart.objects.bulk_update(batch, ['item_count', 'total_quantity', 'subtotal'])
+                batch = []
+        if batch:
+            updated += Cart.objects.bulk_update(batch, ['item_count', 'total_quantity', 'subtotal'])
+
+        updated += self.filter(items__isnull=True).exclude(
+            item_count=0, total_quantity=0, subtotal=0
+        ).update(item_count=0, total_quantity=0, subtotal=0)
+        return updated
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_key = models.CharField(max_length=100, blank=True, null=True)
+    # Running totals kept in step by CartItem.save()/delete() and Cart.clear(),
+    # and recomputed for the carts affected when a product's price changes or
+    # it is deleted; `manage.py recompute_cart_totals` rebuilds them all.
+    item_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CartQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Anonymous carts are looked up by session on every request.
+            models.Index(fields=['session_key'], condition=models.Q(session_key__isnull=False), name='store_cart_session_idx'),
+        ]
+    
+    def get_items(self):
+        if self.pk is None:
+            return CartItem.objects.none()
+        return self.items.all()
+    
     def get_total(self):
-        total = sum(item.get_subtotal() for item in self.items.all())
-        return total
+        return self.subtotal
     
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.total_quantity
+    
+    def apply_delta(self, items=0, quantity=0, amount=0):
+        Cart.objects.filter(pk=self.pk).update(
+            item_count=F('item_count') + items,
+            total_quantity=F('total_quantity') + quantity,
+            subtotal=F('subtotal') + amount,
+            updated_at=timezone.now(),
+        )
+        self.refresh_from_db(fields=['item_count', 'total_quantity', 'subtotal', 'updated_at'])
+    
+    def clear(self):
+        with transaction.atomic():
+            self.items.all().delete()
+            Cart.objects.filter(pk=self.pk).update(
+                item_count=0, total_quantity=0, subtotal=0, updated_at=timezone.now()
+            )
+        self.item_count = 0
+        self.total_quantity = 0
+        self.subtotal = 0
     
     def __str__(self):
         return f"Cart {self.id} - {self.user or self.session_key}"
@@ -79,8 +349,46 @@ class CartItem(models.Model):
     quantity = models.IntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            # One line per product, so concurrent get_or_create calls cannot
+            # both insert; the loser re-reads the winner's row.
+            models.UniqueConstraint(fields=['cart', 'product'], name='store_cartitem_unique_product'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_quantity = instance.quantity
+        return instance
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        previous = 0 if adding else getattr(self, '_saved_quantity', self.quantity)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            delta = self.quantity - previous
+            if adding or delta:
+                self.cart.apply_delta(
+                    items=1 if adding else 0,
+                    quantity=delta,
+                    amount=pricing.line_subtotal(self.product.get_selling_price(), delta),
+                )
+        self._saved_quantity = self.quantity
+    
+    def delete(self, *args, **kwargs):
+        quantity = getattr(self, '_saved_quantity', self.quantity)
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.cart.apply_delta(
+                items=-1,
+                quantity=-quantity,
+                amount=-pricing.line_subtotal(self.product.get_selling_price(), quantity),
+            )
+        return result
+    
     def get_subtotal(self):
-        return self.product.get_selling_price() * self.quantity
+        return pricing.line_subtotal(self.product.get_selling_price(), self.quantity)
     
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
@@ -121,6 +429,14 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='store_order_user_created_idx'),
+            models.Index(fields=['razorpay_order_id'], name='store_order_razorpay_idx'),
+            # Monthly GST reports (store.gst_reports) read paid orders by date.
+            models.Index(fields=['created_at'], condition=models.Q(payment_status=True), name='store_order_paid_created_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.order_id:
             self.order_id = f"ORD{uuid.uuid4().hex[:10].upper()}"
@@ -137,14 +453,182 @@ class OrderItem(models.Model):
     hsn_code = models.CharField(max_length=20)
     gst_rate = models.DecimalField(max_digits=5, decimal_places=2)
     
+    def get_price_line(self):
+        return pricing.price_line(self.price, self.quantity, self.gst_rate)
+    
     def get_subtotal(self):
-        return self.price * self.quantity
+        return self.get_price_line().subtotal
     
     def get_gst_amount(self):
-        return (self.get_subtotal() * self.gst_rate) / 100
+        return self.get_price_line().gst_amount
     
     def get_total(self):
-        return self.get_subtotal() + self.get_gst_amount()
+        return self.get_price_line().total
     
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+class InvoiceJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='invoice_job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Invoice job for {self.order.order_id} ({self.status})"
+
+
+class StockReservation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Covers the live-reservation SUM(quantity) for one product.
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='store_reservation_live_idx'),
+            models.Index(fields=['expires_at'], name='store_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product} until {self.expires_at}"
+
+
+class ProductPairing(models.Model):
+    """
+    Number of paid orders that contained both products, kept for each ordered
+    pair. Accumulated by `manage.py build_recommendations`.
+    """
+    # Indexed by the unique constraint, which leads with product
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='store_pairing_unique_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id}: {self.orders}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    The top pairings of each product, ranked from 1, as read by product_detail.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='store_recommendation_unique_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} #{self.rank}: {self.recommended_id}"
+
+
+class RecommendationRun(models.Model):
+    """
+    One build_recommendations run; the latest one's last_order_id is the
+    watermark the next run continues from.
+    """
+    last_order_id = models.PositiveIntegerField()
+    orders = models.PositiveIntegerField(default=0)
+    products = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Recommendations up to order {self.last_order_id}"
+
+
+class GstPeriod(models.Model):
+    """
+    A closed month whose GST figures have been materialized into GstSummary.
+    """
+    period = models.DateField(unique=True, help_text='First day of the month')
+    materialized_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.period.strftime('%b %Y')
+
+
+class GstSummary(models.Model):
+    """
+    Taxable value and GST of paid orders for one month, customer state, HSN
+    code and GST rate. Written by store.gst_reports.materialize().
+    """
+    period = models.DateField()
+    state = models.CharField(max_length=100)
+    hsn_code = models.CharField(max_length=20)
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    taxable_value = models.DecimalField(max_digits=14, decimal_places=2)
+    gst_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    lines = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name_plural = 'GST summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'state', 'hsn_code', 'gst_rate'], name='store_gstsummary_unique_group'),
+        ]
+
+    def __str__(self):
+        return f"{self.period:%b %Y} {self.state} {self.hsn_code} @ {self.gst_rate}%"
+
+
+class PaymentEvent(models.Model):
+    """
+    A verified Razorpay webhook delivery, stored once per event id by the
+    webhook view and fulfilled later by `manage.py process_payment_events`.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+
+    # x-razorpay-event-id, which stays the same when Razorpay retries a delivery
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    payment_id = models.CharField(max_length=100, blank=True)
+    razorpay_order_id = models.CharField(max_length=100, blank=True)
+    payload = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='store_paymentevent_status_idx'),
+            models.Index(fields=['payment_id'], name='store_paymentevent_payment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.payment_id} ({self.status})"
@@ -0,0 +1,152 @@
+"""
+Order history exports: a customer's paginated my_orders list and CSV
+download, and the accounting export of all orders and their lines.
+"""
+from datetime import datetime, timedelta
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Sum
+from django.utils import timezone
+from .models import Order, OrderItem
+from .pricing import (
+    annotate_line_prices, from_paise, line_gst_paise_expression, line_subtotal_paise_expression, quantize,
+)
+
+# Newest first; matches store_order_user_created_idx, with the rowid as tiebreaker
+ORDER_HISTORY_ORDERING = ('-created_at', '-id')
+
+EXPORT_HEADER = [
+    'Order ID', 'Date', 'Status', 'Paid', 'Product', 'HSN code', 'Quantity', 'Unit price',
+    'GST rate (%)', 'Subtotal', 'GST', 'Total',
+]
+
+
+def order_history(user):
+    """
+    The user's orders with only the columns my_orders shows, the number of
+    lines and units per order computed in the same query, and the lines with
+    their product names prefetched.
+    """
+    # Correlated subqueries rather than a GROUP BY join, so the rows still come
+    # off store_order_user_created_idx in order and LIMIT stops the scan
+    lines = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    items = OrderItem.objects.select_related('product').only(
+        'order_id', 'quantity', 'product__name', 'product__slug',
+    ).order_by('id')
+    return Order.objects.filter(user=user).only(
+        'order_id', 'created_at', 'total_amount', 'status', 'invoice_generated',
+    ).annotate(
+        item_count=Subquery(lines.annotate(count=Count('pk')).values('count')),
+        total_quantity=Subquery(lines.annotate(quantity=Sum('quantity')).values('quantity')),
+    ).prefetch_related(Prefetch('items', queryset=items))
+
+
+def export_rows(user, chunk_size=2000):
+    """
+    One row per order line for EXPORT_HEADER, newest order first, read from
+    the database in chunks.
+    """
+    lines = annotate_line_prices(OrderItem.objects.filter(order__user=user)).order_by(
+        '-order__created_at', '-order_id', 'id',
+    ).values_list(
+        'order__order_id', 'order__created_at', 'order__status', 'order__payment_status', 'product__name',
+        'hsn_code', 'quantity', 'price', 'gst_rate', 'line_subtotal', 'line_gst', 'line_total',
+    )
+    for order_id, created_at, status, paid, *line, subtotal, gst, total in lines.iterator(chunk_size=chunk_size):
+        yield [
+            order_id, timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M'), status, 'yes' if paid else 'no',
+            *line, quantize(subtotal), quantize(gst), quantize(total),
+        ]
+
+
+ACCOUNTING_ORDER_FIELDS = [
+    ('order_id', 'Order ID'), ('created_at', 'Date'), ('status', 'Status'), ('payment_status', 'Paid'),
+    ('payment_method', 'Payment method'), ('razorpay_payment_id', 'Payment ID'), ('full_name', 'Customer'),
+    ('email', 'Email'), ('phone', 'Phone'), ('city', 'City'), ('state', 'State'), ('pincode', 'Pincode'),
+    ('subtotal', 'Order subtotal'), ('gst_amount', 'Order GST'), ('total_amount', 'Order total'),
+]
+ACCOUNTING_LINE_FIELDS = [
+    ('product_id', 'Product ID'), ('product_name', 'Product'), ('hsn_code', 'HSN code'), ('quantity', 'Quantity'),
+    ('price', 'Unit price'), ('gst_rate', 'GST rate (%)'), ('subtotal', 'Line subtotal'), ('gst_amount', 'Line GST'),
+    ('total', 'Line total'),
+]
+ACCOUNTING_HEADER = [title for _, title in ACCOUNTING_ORDER_FIELDS + ACCOUNTING_LINE_FIELDS]
+
+
+def filter_orders(params):
+    """
+    Orders matching the from/to (YYYY-MM-DD, inclusive), status and paid
+    (yes/no) parameters of an export. Raises ValueError for bad values.
+    """
+    orders = Order.objects.all()
+    tz = timezone.get_current_timezone()
+    for name, lookup, days in (('from', 'created_at__gte', 0), ('to', 'created_at__lt', 1)):
+        if params.get(name):
+            try:
+                day = datetime.strptime(params[name], '%Y-%m-%d') + timedelta(days=days)
+            except ValueError:
+                raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+            orders = orders.filter(**{lookup: timezone.make_aware(day, tz)})
+    if params.get('status'):
+        if params['status'] not in dict(Order.STATUS_CHOICES):
+            raise ValueError(f"status must be one of: {', '.join(dict(Order.STATUS_CHOICES))}")
+        orders = orders.filter(status=params['status'])
+    if params.get('paid'):
+        if params['paid'] not in ('yes', 'no'):
+            raise ValueError("paid must be yes or no")
+        orders = orders.filter(payment_status=params['paid'] == 'yes')
+    return orders
+
+
+def iter_orders_with_lines(orders, chunk_size=2000):
+    """
+    Yields (order, lines) dicts for `orders` in id order. Orders and their
+    lines are read by two streamed queries, both in order id order, and merged
+    here, so memory use does not grow with the number of orders and there is
+    no query per order.
+    """
+    order_rows = orders.order_by('pk').values('pk', *(name for name, _ in ACCOUNTING_ORDER_FIELDS))
+    line_rows = OrderItem.objects.filter(order__in=orders.values('pk')).annotate(
+        subtotal_paise=line_subtotal_paise_expression(), gst_paise=line_gst_paise_expression(),
+    ).order_by('order_id', 'pk').values_list(
+        'order_id', 'product_id', 'product__name', 'hsn_code', 'quantity', 'price', 'gst_rate',
+        'subtotal_paise', 'gst_paise',
+    ).iterator(chunk_size=chunk_size)
+
+    pending = next(line_rows, None)
+    for order in order_rows.iterator(chunk_size=chunk_size):
+        order_pk = order.pop('pk')
+        order['created_at'] = timezone.localtime(order['created_at'])
+        lines = []
+        # Both queries share the filter and the ordering, so this order's lines come next
+        while pending is not None and pending[0] == order_pk:
+            _, product_id, name, hsn_code, quantity, price, gst_rate, subtotal, gst = pending
+            subtotal, gst = from_paise(subtotal), from_paise(gst)
+            lines.append({
+                'product_id': product_id, 'product_name': name, 'hsn_code': hsn_code, 'quantity': quantity,
+                'price': price, 'gst_rate': gst_rate, 'subtotal': subtotal, 'gst_amount': gst, 'total': subtotal + gst,
+            })
+            pending = next(line_rows, None)
+        yield order, lines
+
+
+def accounting_csv_rows(orders_with_lines):
+    """
+    One CSV row per order line, with the order's columns repeated; an order
+    without lines gets one row with the line columns empty.
+    """
+    blank = [''] * len(ACCOUNTING_LINE_FIELDS)
+    for order, lines in orders_with_lines:
+        order_values = [order[name] for name, _ in ACCOUNTING_ORDER_FIELDS]
+        order_values[1] = order_values[1].strftime('%Y-%m-%d %H:%M:%S')
+        order_values[3] = 'yes' if order_values[3] else 'no'
+        if not lines:
+            yield order_values + blank
+        for line in lines:
+            yield order_values + [line[name] for name, _ in ACCOUNTING_LINE_FIELDS]
+
+
+def accounting_documents(orders_with_lines):
+    """
+    One JSON object per order, its lines nested under "items".
+    """
+    for order, lines in orders_with_lines:
+        yield {**order, 'items': lines}
@@ -0,0 +1,194 @@
+"""
+Razorpay payment confirmation, from the checkout callback (payment_success)
+and from webhooks (razorpay_webhook).
+
+Signatures are HMAC-SHA256, checked here with hmac.compare_digest; no SDK
+or network call is involved. The webhook view only verifies a delivery and
+stores it as a PaymentEvent, one INSERT OR IGNORE on the event id so retried
+deliveries are kept once, before acknowledging it. `manage.py
+process_payment_events` fulfils the stored events in batches.
+
+fulfil() marks an order paid with a conditional UPDATE, so whichever of the
+callback and the webhooks arrives first takes the stock and queues the
+invoice, and the others change nothing. The checkout callback also turns
+the cart's holds on the order's lines into the sale in the same transaction,
+as checkout does, or drops them if the order was paid already. Webhooks
+carry no session, so they leave reservations alone: the cart may be a new
+one by the time they are processed.
+
+webhook_request() signs payloads the way Razorpay does, for tests and for
+load testing with `manage.py bench_payment_webhooks`.
+"""
+import hashlib
+import hmac
+import json
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .inventory import InsufficientStock, commit_order_stock, convert_reservations, release_reservations
+from .jobs import enqueue_invoice
+from .models import Order, PaymentEvent
+
+# Events that mean the money has been taken; the rest are stored and ignored
+FULFIL_EVENTS = {'payment.captured', 'order.paid'}
+
+
+def sign(message, secret):
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify(message, signature, secret):
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(message, secret).encode(), signature.encode())
+
+
+def verify_payment(razorpay_order_id, payment_id, signature):
+    """
+    The checkout callback's razorpay_signature, made with the key secret.
+    """
+    return verify(f"{razorpay_order_id}|{payment_id}".encode(), signature, settings.RAZORPAY_KEY_SECRET)
+
+
+def verify_webhook(body, signature):
+    """
+    The X-Razorpay-Signature of a webhook body, made with the webhook secret.
+    """
+    return verify(body, signature, getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', ''))
+
+
+def record_event(body, event_id=None):
+    """
+    Stores a verified webhook body as a pending PaymentEvent unless one with
+    the same event id exists. Raises ValueError for a malformed body.
+    """
+    try:
+        data = json.loads(body)
+        payload = data['payload']
+        payment = payload.get('payment', {}).get('entity', {})
+        order = payload.get('order', {}).get('entity', {})
+        event = data['event']
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("not a Razorpay webhook payload")
+    payment_id = payment.get('id') or ''
+    PaymentEvent.objects.bulk_create([PaymentEvent(
+        # Without the header, one event per type and payment
+        event_id=event_id or f"{event}:{payment_id}",
+        event=event,
+        payment_id=payment_id,
+        razorpay_order_id=payment.get('order_id') or order.get('id') or '',
+        payload=body.decode(),
+    )], ignore_conflicts=True)
+
+
+def fulfil(order, payment_id, signature=None, cart=None):
+    """
+    Marks `order` paid, takes its stock and queues its invoice, unless it is
+    paid already. Returns whether it did. The holds `cart`, the buyer's, has
+    on the order's lines become the order's and go with the sale; if the order
+    was paid already they are released. On InsufficientStock nothing changes.
+    """
+    paid = {'payment_status': True, 'status': 'processing', 'razorpay_payment_id': payment_id,
+            'updated_at': timezone.now()}
+    if signature:
+        paid['razorpay_signature'] = signature
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, payment_status=False).update(**paid):
+            if cart is not None:
+                release_reservations(cart, order)
+            return False
+        if cart is not None:
+            convert_reservations(cart, order)
+        commit_order_stock(order)
+    enqueue_invoice(order)
+    return True
+
+
+def requeue_stale_events(stale_after):
+    """
+    Puts back events left in 'running' by a processor that died; fulfil()
+    makes processing them again harmless.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return PaymentEvent.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='pending', updated_at=timezone.now(),
+    )
+
+
+def claim_events(limit):
+    """
+    Marks up to `limit` pending events as running, oldest first, and returns
+    their ids. As with claim_jobs(), each claim is a conditional UPDATE.
+    """
+    candidates = list(PaymentEvent.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:limit])
+    claimed = []
+    now = timezone.now()
+    # One transaction, so the batch costs one commit
+    with transaction.atomic():
+        for event_id in candidates:
+            if PaymentEvent.objects.filter(id=event_id, status='pending').update(status='running', updated_at=now):
+                claimed.append(event_id)
+    return claimed
+
+
+def process_events(batch_size=100):
+    """
+    Claims and fulfils a batch of events. Returns {status: count}.
+    """
+    ids = claim_events(batch_size)
+    if not ids:
+        return {}
+    events = list(PaymentEvent.objects.filter(id__in=ids).defer('payload').order_by('id'))
+    orders = {
+        order.razorpay_order_id: order
+        for order in Order.objects.filter(razorpay_order_id__in={event.razorpay_order_id for event in events})
+    }
+    counts = {}
+    for event in events:
+        order = orders.get(event.razorpay_order_id)
+        event.last_error = ''
+        if event.event not in FULFIL_EVENTS:
+            event.status = 'ignored'
+        elif order is None:
+            event.status = 'failed'
+            event.last_error = f"No order with Razorpay order id {event.razorpay_order_id!r}"
+        else:
+            try:
+                fulfil(order, event.payment_id)
+                event.status = 'done'
+            except InsufficientStock as e:
+                event.status = 'failed'
+                event.last_error = str(e)
+        event.updated_at = timezone.now()
+        counts[event.status] = counts.get(event.status, 0) + 1
+    PaymentEvent.objects.bulk_update(events, ['status', 'last_error', 'updated_at'])
+    return counts
+
+
+def webhook_request(event, razorpay_order_id, payment_id=None, amount=0, secret=None, event_id=None):
+    """
+    (body, headers) of a webhook delivery as Razorpay would send it, signed
+    with `secret` (default: settings.RAZORPAY_WEBHOOK_SECRET). Pass the
+    headers to the test client as extra keyword arguments.
+    """
+    payment_id = payment_id or f"pay_{uuid.uuid4().hex[:14]}"
+    body = json.dumps({
+        'entity': 'event',
+        'account_id': 'acc_local',
+        'event': event,
+        'contains': ['payment'],
+        'payload': {'payment': {'entity': {
+            'id': payment_id, 'entity': 'payment', 'amount': amount, 'currency': 'INR',
+            'status': 'captured' if event in FULFIL_EVENTS else 'failed',
+            'order_id': razorpay_order_id, 'method': 'upi',
+        }}},
+        'created_at': int(timezone.now().timestamp()),
+    }, separators=(',', ':')).encode()
+    secret = secret if secret is not None else getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
+    headers = {
+        'HTTP_X_RAZORPAY_SIGNATURE': sign(body, secret),
+        'HTTP_X_RAZORPAY_EVENT_ID': event_id or f"evt_{uuid.uuid4().hex[:14]}",
+    }
+    return body, headers
@@ -0,0 +1,191 @@
+"""
+Price, GST and total calculations shared by the cart, checkout, orders and
+invoices. Amounts are Decimals rounded half-up to paise; GST is rounded per
+line, as printed on the invoice, and totals are sums of the rounded lines.
+The *_expression helpers do the same maths in SQL for annotate()/aggregate().
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.lookups import GreaterThan
+
+TWO_PLACES = Decimal('0.01')
+ZERO = Decimal('0.00')
+ONE_PERCENT = Decimal('0.01')
+
+PricedLine = namedtuple('PricedLine', ['unit_price', 'quantity', 'gst_rate', 'subtotal', 'gst_amount', 'total'])
+PriceSummary = namedtuple('PriceSummary', ['lines', 'subtotal', 'gst_amount', 'total'])
+
+
+def to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def quantize(amount):
+    return to_decimal(amount).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def selling_price(price, discounted_price):
+    if discounted_price:
+        return discounted_price
+    return price
+
+
+def discount_percentage(price, discounted_price):
+    # A "discounted" price above the price is no discount: 0, never negative
+    if discounted_price and price and to_decimal(discounted_price) < to_decimal(price):
+        discount = ((to_decimal(price) - to_decimal(discounted_price)) / to_decimal(price)) * 100
+        return int(discount.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    return 0
+
+
+def line_subtotal(unit_price, quantity):
+    return quantize(to_decimal(unit_price) * quantity)
+
+
+def price_line(unit_price, quantity, gst_rate):
+    return price_lines([(unit_price, quantity, gst_rate)]).lines[0]
+
+
+def price_lines(lines):
+    """
+    Prices (unit_price, quantity, gst_rate) triples in a single pass and returns
+    a PriceSummary with the per-line results and the totals.
+    """
+    priced = []
+    append = priced.append
+    make_line = PricedLine._make
+    subtotal = ZERO
+    gst_amount = ZERO
+    for unit_price, quantity, gst_rate in lines:
+        if type(unit_price) is not Decimal:
+            unit_price = to_decimal(unit_price)
+        if type(gst_rate) is not Decimal:
+            gst_rate = to_decimal(gst_rate)
+        line_amount = (unit_price * quantity).quantize(TWO_PLACES, ROUND_HALF_UP)
+        line_gst = (line_amount * gst_rate * ONE_PERCENT).quantize(TWO_PLACES, ROUND_HALF_UP)
+        append(make_line((unit_price, quantity, gst_rate, line_amount, line_gst, line_amount + line_gst)))
+        subtotal += line_amount
+        gst_amount += line_gst
+    return PriceSummary(priced, subtotal, gst_amount, subtotal + gst_amount)
+
+
+def price_cart_items(cart_items):
+    return price_lines(
+        (item.product.get_selling_price(), item.quantity, item.product.gst_rate) for item in cart_items
+    )
+
+
+def price_order_items(order_items):
+    return price_lines((item.price, item.quantity, item.gst_rate) for item in order_items)
+
+
+def money_field():
+    return DecimalField(max_digits=14, decimal_places=2)
+
+
+def as_expression(value):
+    if hasattr(value, 'resolve_expression'):
+        return value
+    return Value(value, output_field=money_field())
+
+
+def selling_price_expression(prefix='', price=None, discounted_price=None):
+    """
+    SQL equivalent of selling_price() for Product columns, e.g. prefix='product__'.
+    price/discounted_price override the columns with values or expressions.
+    """
+    price = as_expression(price) if price is not None else F(f'{prefix}price')
+    discounted_price = as_expression(discounted_price) if discounted_price is not None else F(f'{prefix}discounted_price')
+    return Coalesce(NullIf(discounted_price, Value(0)), price, output_field=money_field())
+
+
+def discount_percentage_expression(prefix='', price=None, discounted_price=None):
+    """
+    SQL equivalent of discount_percentage(), rounded half-up to a whole percent
+    and 0 unless discounted_price is below price.
+    """
+    price = as_expression(price) if price is not None else F(f'{prefix}price')
+    discounted_price = as_expression(discounted_price) if discounted_price is not None else F(f'{prefix}discounted_price')
+    return Case(
+        When(
+            Q(GreaterThan(discounted_price, 0)) & Q(GreaterThan(price, discounted_price)),
+            then=Cast(Round(Cast(price - discounted_price, FloatField()) * 100 / Cast(price, FloatField())), IntegerField()),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def line_subtotal_expression(unit_price, quantity='quantity'):
+    return ExpressionWrapper(F(quantity) * unit_price, output_field=money_field())
+
+
+def line_gst_expression(unit_price, quantity='quantity', gst_rate='gst_rate'):
+    return Round(
+        # A real divisor, so SQLite does not truncate when every operand is a whole number
+        ExpressionWrapper(
+            line_subtotal_expression(unit_price, quantity) * F(gst_rate) / Value(100.0, output_field=FloatField()),
+            output_field=money_field(),
+        ),
+        2,
+        output_field=money_field(),
+    )
+
+
+def paise_expression(amount):
+    """
+    A Decimal column or expression in rupees as a whole number of paise.
+    """
+    return Cast(Round(ExpressionWrapper(amount * 100, output_field=money_field())), IntegerField())
+
+
+def line_subtotal_paise_expression(unit_price=None, quantity='quantity'):
+    unit_price = unit_price if unit_price is not None else F('price')
+    return ExpressionWrapper(paise_expression(unit_price) * F(quantity), output_field=IntegerField())
+
+
+def line_gst_paise_expression(unit_price=None, quantity='quantity', gst_rate='gst_rate'):
+    """
+    Line GST in paise, rounded half-up with integer arithmetic, so sums over
+    any number of lines match price_lines() exactly: subtotal (paise) x rate
+    (hundredths of a percent) is in units of 1/10000 paise.
+    """
+    return ExpressionWrapper(
+        (line_subtotal_paise_expression(unit_price, quantity) * paise_expression(F(gst_rate)) + 5000) / 10000,
+        output_field=IntegerField(),
+    )
+
+
+def from_paise(paise):
+    return (Decimal(paise or 0) / 100).quantize(TWO_PLACES)
+
+
+def annotate_line_prices(queryset, unit_price=None, quantity='quantity', gst_rate='gst_rate'):
+    """
+    Adds line_subtotal, line_gst and line_total to each row of a queryset of
+    lines (OrderItem by default; pass unit_price=selling_price_expression(
+    'product__') and gst_rate='product__gst_rate' for CartItem).
+    """
+    unit_price = unit_price if unit_price is not None else F('price')
+    return queryset.annotate(
+        line_subtotal=line_subtotal_expression(unit_price, quantity),
+        line_gst=line_gst_expression(unit_price, quantity, gst_rate),
+    ).annotate(
+        line_total=ExpressionWrapper(F('line_subtotal') + F('line_gst'), output_field=money_field()),
+    )
+
+
+def aggregate_line_prices(queryset, **kwargs):
+    """
+    Totals of annotate_line_prices() computed by the database in one query.
+    """
+    totals = annotate_line_prices(queryset, **kwargs).aggregate(
+        subtotal=Sum('line_subtotal'), gst_amount=Sum('line_gst'),
+    )
+    subtotal = quantize(totals['subtotal'] or 0)
+    gst_amount = quantize(totals['gst_amount'] or 0)
+    return {'subtotal': subtotal, 'gst_amount': gst_amount, 'total': subtotal + gst_amount}
@@ -0,0 +1,111 @@
+"""
+"Frequently bought together" recommendations mined from order lines.
+
+build() counts, for every pair of products, the paid orders that contained
+both, adding only orders past the watermark of the last RecommendationRun into
+ProductPairing. The counting is one self-join of store_orderitem grouped by
+product pair per batch of orders, upserted into the pairing table, so no order
+is looped over in Python. The products those orders touched then have their
+top RECOMMENDATIONS_PER_PRODUCT pairings re-ranked into ProductRecommendation,
+which product_detail reads with one query on its (product, rank) index.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import Order, Product, ProductPairing, ProductRecommendation, RecommendationRun
+
+PAIR_SQL = """
+    INSERT INTO store_productpairing (product_id, related_id, orders)
+    SELECT a.product_id, b.product_id, COUNT(DISTINCT a.order_id)
+    FROM store_orderitem a
+    INNER JOIN store_orderitem b ON b.order_id = a.order_id AND b.product_id != a.product_id
+    INNER JOIN store_order o ON o.id = a.order_id
+    WHERE o.id > %s AND o.id <= %s AND o.payment_status
+    GROUP BY a.product_id, b.product_id
+    ON CONFLICT (product_id, related_id) DO UPDATE SET orders = store_productpairing.orders + excluded.orders
+"""
+
+TOUCHED_SQL = """
+    SELECT DISTINCT i.product_id
+    FROM store_orderitem i INNER JOIN store_order o ON o.id = i.order_id
+    WHERE o.id > %s AND o.id <= %s AND o.payment_status
+"""
+
+
+def get_watermark():
+    run = RecommendationRun.objects.order_by('-pk').first()
+    return run.last_order_id if run else 0
+
+
+def _batches(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def rerank(product_ids, top_k=None):
+    """
+    Replaces the ProductRecommendation rows of the given products with their
+    top_k pairings to active products, most shared orders first.
+    """
+    top_k = top_k or getattr(settings, 'RECOMMENDATIONS_PER_PRODUCT', 8)
+    for batch in _batches(product_ids):
+        ranked = ProductPairing.objects.filter(product_id__in=batch, related__is_active=True).annotate(
+            rank=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('orders').desc(), F('related_id')]),
+        ).filter(rank__lte=top_k).values_list('product_id', 'related_id', 'orders', 'rank')
+        rows = [
+            ProductRecommendation(product_id=product_id, recommended_id=related_id, orders=orders, rank=rank)
+            for product_id, related_id, orders, rank in ranked
+        ]
+        ProductRecommendation.objects.filter(product_id__in=batch).delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+
+
+def build(rebuild=False, batch_size=5000):
+    """
+    Folds paid orders placed since the last run (or all of them, with
+    rebuild=True) into the pairing counts and re-ranks the products they
+    contain. Returns the RecommendationRun, or None if there was nothing new.
+    """
+    settle = timedelta(minutes=getattr(settings, 'RECOMMENDATION_SETTLE_MINUTES', 60))
+    with transaction.atomic():
+        if rebuild:
+            ProductRecommendation.objects.all().delete()
+            ProductPairing.objects.all().delete()
+            RecommendationRun.objects.all().delete()
+        watermark = get_watermark()
+        last_order_id = Order.objects.filter(
+            pk__gt=watermark, created_at__lte=timezone.now() - settle,
+        ).aggregate(last=Max('pk'))['last']
+        if last_order_id is None:
+            return None
+
+        touched = set()
+        with connection.cursor() as cursor:
+            for start in range(watermark, last_order_id, batch_size):
+                end = min(start + batch_size, last_order_id)
+                cursor.execute(PAIR_SQL, [start, end])
+                cursor.execute(TOUCHED_SQL, [start, end])
+                touched.update(row[0] for row in cursor.fetchall())
+        orders = Order.objects.filter(pk__gt=watermark, pk__lte=last_order_id, payment_status=True).count()
+        rerank(touched)
+        return RecommendationRun.objects.create(last_order_id=last_order_id, orders=orders, products=len(touched))
+
+
+def recommended_products(product, limit=4):
+    """
+    Up to `limit` active products bought together with `product`, topped up
+    with other products from its category when there are too few.
+    """
+    products = list(
+        Product.objects.filter(recommended_for__product=product, is_active=True)
+        .order_by('recommended_for__rank')[:limit]
+    )
+    if len(products) < limit:
+        products += Product.objects.filter(category_id=product.category_id, is_active=True).exclude(
+            pk__in=[product.pk, *(p.pk for p in products)],
+        )[:limit - len(products)]
+    return products
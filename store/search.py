@@ -0,0 +1,151 @@
+"""
+Product search on the SQLite FTS5 table store_product_search (created in
+migration 0007). Each row's rowid is the product id; the indexed columns are the
+product name, description, category name and HSN code. Rows are kept current by
+the Product/Category signals in store.signals and by ProductQuerySet's bulk
+methods; `manage.py rebuild_search_index` rebuilds the whole table.
+"""
+import re
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'store_product_search'
+# bm25() column weights: name, description, category, hsn_code
+RANK = f'bm25({FTS_TABLE}, 10.0, 1.0, 4.0, 2.0)'
+
+INDEX_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, description, category, hsn_code)
+    SELECT p.id, p.name, p.description, c.name, p.hsn_code
+    FROM store_product p INNER JOIN store_category c ON c.id = p.category_id
+"""
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match(query, column=None):
+    """
+    Turns free text into an FTS5 MATCH expression: every word must appear, the
+    last one as a prefix so partly typed words still match. Words are quoted so
+    FTS5 operators in user input are treated as text. Returns '' if the query
+    has no words.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ''
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    match = ' '.join(terms)
+    if column:
+        match = f'{column} : ({match})'
+    return match
+
+
+def _reindex(where, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT p.id FROM store_product p WHERE {where})", params
+        )
+        cursor.execute(f"{INDEX_SQL} WHERE {where}", params)
+
+
+def _batches(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def index_products(product_ids):
+    """
+    Adds or refreshes the index rows for the given product ids.
+    """
+    for batch in _batches(product_ids):
+        placeholders = ', '.join(['%s'] * len(batch))
+        _reindex(f'p.id IN ({placeholders})', batch)
+
+
+def index_category(category_id):
+    """
+    Refreshes the rows of every product in a category, e.g. after a rename.
+    """
+    _reindex('p.category_id = %s', [category_id])
+
+
+def remove_products(product_ids):
+    with connection.cursor() as cursor:
+        for batch in _batches(product_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+
+
+def rebuild_index(batch_size=5000):
+    """
+    Empties the index and re-inserts every product in id order, `batch_size`
+    rows per statement. Returns the number of products indexed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        indexed = 0
+        last_id = 0
+        while True:
+            cursor.execute(
+                "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM store_product WHERE id > %s ORDER BY id LIMIT %s)",
+                [last_id, batch_size],
+            )
+            max_id, count = cursor.fetchone()
+            if not count:
+                break
+            cursor.execute(f"{INDEX_SQL} WHERE p.id > %s AND p.id <= %s", [last_id, max_id])
+            indexed += count
+            last_id = max_id
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def ranked_ids(query, queryset, limit=20, offset=0, column=None):
+    """
+    Ids of the products in `queryset` matching `query`, best bm25 rank first.
+    """
+    match = build_match(query, column)
+    if not match:
+        return []
+    # Correlated on the primary key, so the queryset's filters are checked for
+    # each match only rather than materialising every product id.
+    matched = queryset.order_by().filter(pk=RawSQL(f'{FTS_TABLE}.rowid', ())).values('id')
+    subquery, params = matched.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND EXISTS ({subquery}) "
+            f"ORDER BY {RANK} LIMIT %s OFFSET %s",
+            [match, *params, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_products(query, queryset, limit=20, offset=0):
+    """
+    Matching products from `queryset` as a list in rank order.
+    """
+    ids = ranked_ids(query, queryset, limit, offset)
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def autocomplete(query, queryset, limit=8):
+    """
+    Products whose name starts with (or contains a word starting with) the
+    typed text, for suggestions as the user types.
+    """
+    ids = ranked_ids(query, queryset, limit, column='name')
+    names = {row['id']: row for row in queryset.filter(id__in=ids).values('id', 'name', 'slug')}
+    return [names[pk] for pk in ids if pk in names]
+
+
+def match_queryset(queryset, query):
+    """
+    Restricts a queryset to products matching `query`, keeping its ordering.
+    Used by the admin changelist search.
+    """
+    match = build_match(query)
+    if not match:
+        return queryset
+    return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
@@ -0,0 +1,142 @@
+"""
+Sessions that only write to the database once there is something to keep.
+
+SessionMiddleware gives a visitor without a database session cookie an
+ANONYMOUS_SESSION_ENGINE session (signed cookies by default, or the cache)
+under ANONYMOUS_SESSION_COOKIE_NAME. promote() moves it into a SESSION_ENGINE
+session when a cart is created or the visitor logs in; anonymous carts are
+only looked up for promoted sessions.
+
+Instead of SESSION_SAVE_EVERY_REQUEST, a session that was read but not
+changed is saved again (sliding its expiry) only once less than
+SESSION_REFRESH_WINDOW seconds of its SESSION_COOKIE_AGE are left.
+"""
+import time
+from importlib import import_module
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.exceptions import SessionInterrupted
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+# Session key holding when the session was last saved (Unix time)
+SAVED_AT_KEY = '_saved_at'
+
+
+def anonymous_cookie_name():
+    return getattr(settings, 'ANONYMOUS_SESSION_COOKIE_NAME', 'anonsessionid')
+
+
+def is_persistent(session):
+    # Sessions not made by SessionMiddleware below are the SESSION_ENGINE's
+    return getattr(session, 'persistent', True)
+
+
+def persistent_key(request):
+    """
+    The database session key of the request, or None for anonymous sessions.
+    """
+    return request.session.session_key if is_persistent(request.session) else None
+
+
+def promote(request):
+    """
+    Returns the request's SESSION_ENGINE session, first moving an anonymous
+    session's data into a new one. The session is saved, so its key can be
+    stored straight away.
+    """
+    session = request.session
+    if is_persistent(session):
+        session[SAVED_AT_KEY] = int(time.time())
+        if not session.session_key:
+            session.create()
+        return session
+    store = import_module(settings.SESSION_ENGINE).SessionStore()
+    store.update(session.items())
+    store[SAVED_AT_KEY] = int(time.time())
+    store.create()
+    store.persistent = True
+    # Removes a cache-backed session; the cookie is deleted with the response
+    session.delete()
+    request.session = store
+    return store
+
+
+def refresh_due(session, now):
+    if session.get_expire_at_browser_close() or not session.keys():
+        return False
+    saved_at = session.get(SAVED_AT_KEY)
+    window = getattr(settings, 'SESSION_REFRESH_WINDOW', settings.SESSION_COOKIE_AGE // 4)
+    return saved_at is None or now - saved_at > settings.SESSION_COOKIE_AGE - window
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """
+    Drop-in replacement for django.contrib.sessions' middleware, see above.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        engine = getattr(settings, 'ANONYMOUS_SESSION_ENGINE', 'django.contrib.sessions.backends.signed_cookies')
+        self.AnonymousSessionStore = import_module(engine).SessionStore
+
+    def process_request(self, request):
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            request.session = self.SessionStore(session_key)
+            request.session.persistent = True
+        else:
+            request.session = self.AnonymousSessionStore(request.COOKIES.get(anonymous_cookie_name()))
+            request.session.persistent = False
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is None or not hasattr(session, 'accessed'):
+            return response
+        if is_persistent(session):
+            cookie_name = settings.SESSION_COOKIE_NAME
+            if anonymous_cookie_name() in request.COOKIES:
+                # Promoted during this request
+                self.delete_cookie(response, anonymous_cookie_name())
+        else:
+            cookie_name = anonymous_cookie_name()
+
+        if cookie_name in request.COOKIES and session.is_empty():
+            self.delete_cookie(response, cookie_name)
+            return response
+        if not session.accessed:
+            return response
+        patch_vary_headers(response, ('Cookie',))
+
+        now = int(time.time())
+        if session.modified or refresh_due(session, now):
+            session[SAVED_AT_KEY] = now
+        if not session.modified or session.is_empty() or response.status_code >= 500:
+            return response
+        try:
+            session.save()
+        except UpdateError:
+            raise SessionInterrupted(
+                "The request's session was deleted before the request completed. "
+                "The user may have logged out in a concurrent request, for example."
+            )
+        if session.get_expire_at_browser_close():
+            max_age = expires = None
+        else:
+            max_age = session.get_expiry_age()
+            expires = http_date(time.time() + max_age)
+        response.set_cookie(
+            cookie_name, session.session_key, max_age=max_age, expires=expires,
+            domain=settings.SESSION_COOKIE_DOMAIN, path=settings.SESSION_COOKIE_PATH,
+            secure=settings.SESSION_COOKIE_SECURE or None, httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+        return response
+
+    def delete_cookie(self, response, name):
+        response.delete_cookie(
+            name, path=settings.SESSION_COOKIE_PATH, domain=settings.SESSION_COOKIE_DOMAIN,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+        patch_vary_headers(response, ('Cookie',))
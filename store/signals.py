@@ -0,0 +1,77 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from . import fragments, images, search, sessions
+from .models import Cart, CartItem, Category, Product
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, raw=False, **kwargs):
+    # A new category has no products; a saved one may have been renamed.
+    if not created and not raw:
+        search.index_category(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    # image_hash is cleared when a new image is uploaded
+    if not raw and instance.image and not instance.image_hash:
+        images.ensure_derivatives(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_fragments(sender, instance, raw=False, signal=None, **kwargs):
+    if not raw:
+        category_ids = {instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None}
+        fragments.invalidate_products(category_ids)
+        deactivated = getattr(instance, '_loaded_is_active', None) and not instance.is_active
+        if signal is post_delete or deactivated or len(category_ids) > 1:
+            Category.objects.filter(pk__in=category_ids).touch()
+        instance._loaded_category_id = instance.category_id
+        instance._loaded_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=Product)
+def reprice_carts(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw and instance.selling_price != getattr(instance, '_loaded_selling_price', None):
+        Cart.objects.holding([instance.pk]).recompute_totals()
+    instance._loaded_selling_price = instance.selling_price
+
+
+@receiver(pre_delete, sender=Product)
+def remember_carts(sender, instance, **kwargs):
+    # The cascade removes the cart lines before post_delete runs
+    instance._cart_ids = list(CartItem.objects.filter(product=instance).values_list('cart_id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def recompute_emptied_carts(sender, instance, **kwargs):
+    if getattr(instance, '_cart_ids', None):
+        Cart.objects.filter(pk__in=instance._cart_ids).recompute_totals()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fragments.invalidate_category(instance.pk)
+
+
+@receiver(user_logged_in)
+def promote_session(sender, request, user, **kwargs):
+    # Logged-in sessions are kept in the database, so they can be ended server-side
+    if request is not None and hasattr(request, 'session'):
+        sessions.promote(request)
@@ -0,0 +1,64 @@
+from django import template
+from store import fragments
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+
+    def __init__(self, nodelist, name, vary_on, scope, category, cache):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.scope = scope
+        self.category = category
+        self.cache = cache
+
+    def render(self, context):
+        if self.cache is not None and not self.cache.resolve(context):
+            return self.nodelist.render(context)
+        scopes = []
+        if self.scope is not None:
+            scopes.append(self.scope.resolve(context))
+        if self.category is not None:
+            scopes.append(fragments.category_scope(self.category.resolve(context)))
+        return fragments.get_or_render(
+            self.name.resolve(context),
+            scopes,
+            [value.resolve(context) for value in self.vary_on],
+            lambda: self.nodelist.render(context),
+        )
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    Caches the enclosed markup under the version counters of store.fragments:
+
+        {% fragment "home-latest" sort filters scope="catalog" %}...{% endfragment %}
+        {% fragment "product-card" product.pk category=product.category_id %}...{% endfragment %}
+
+    Positional arguments after the name are the values the markup varies on.
+    With cache=<value>, the markup is rendered uncached while the value is false.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+
+    vary_on = []
+    options = {'scope': None, 'category': None, 'cache': None}
+    for bit in bits[2:]:
+        key, sep, value = bit.partition('=')
+        if sep:
+            if key not in options:
+                raise template.TemplateSyntaxError(f"'{bits[0]}' tag received unknown option '{key}'.")
+            options[key] = parser.compile_filter(value)
+        else:
+            vary_on.append(parser.compile_filter(bit))
+    if options['scope'] is None and options['category'] is None:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires scope= or category=.")
+    return FragmentNode(
+        nodelist, parser.compile_filter(bits[1]), vary_on, options['scope'], options['category'], options['cache'],
+    )
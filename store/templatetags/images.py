@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from store.images import srcsets
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(instance, sizes='100vw', **attrs):
+    """
+    <picture> with WebP and JPEG srcsets for a product or category image,
+    e.g. {% responsive_image product sizes="(min-width: 768px) 25vw, 50vw" class="card-img-top" %}.
+    Extra keyword arguments become <img> attributes. Falls back to the original
+    upload if the derivatives cannot be made.
+    """
+    image = instance.image
+    if not image:
+        return ''
+    attrs.setdefault('alt', str(instance))
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    img_attrs = format_html_join(' ', '{}="{}"', attrs.items())
+
+    result = srcsets(instance)
+    if result is None:
+        return format_html('<img src="{}" {}>', image.url, img_attrs)
+    sets, fallback = result
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime_type, srcset, sizes) for mime_type, srcset in list(sets.items())[:-1]),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" {}></picture>',
+        sources, fallback, list(sets.values())[-1], sizes, img_attrs,
+    )
@@ -1,7 +1,12 @@
+from decimal import InvalidOperation
 from django import template
+from store.pricing import quantize, to_decimal
 
 register = template.Library()
 
 @register.filter
 def mul(value, arg):
-    return float(value) * float(arg)
+    try:
+        return quantize(to_decimal(value) * to_decimal(arg))
+    except (TypeError, ValueError, InvalidOperation):
+        return ''
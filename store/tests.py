@@ -1,3 +1,1770 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from base64 import urlsafe_b64encode
+from importlib import import_module
+from io import BytesIO, StringIO
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Sum
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from .models import (
+    Category, Product, Cart, CartItem, Order, OrderItem, InvoiceJob, StockReservation, GstSummary, PaymentEvent,
+)
+from .jobs import enqueue_invoice, claim_jobs, run_invoice_job
+from .invoice_renderers import ReportLabInvoiceRenderer, get_invoice_renderer
+from .utils import generate_gst_invoice, recompute_cart_totals
+from .pricing import aggregate_line_prices, annotate_line_prices, price_lines, selling_price_expression
+from .catalog import decode_cursor, get_facets, SORT_OPTIONS
+from .search import search_products
+from .gst_reports import current_month, previous_month, report
+from .orders import filter_orders, iter_orders_with_lines
+from . import fragments, images, payments, sessions
+from .inventory import (
+    InsufficientStock, cancel_order, decrement_order_stock, decrement_stock, expire_reservations,
+    get_available_stock, reserve_cart,
+)
 
-# Create your tests here.
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_product(category, name='Test Product', price='100.00', stock=10, description='A product',
+                 image='products/test.jpg', **kwargs):
+    return Product.objects.create(
+        category=category,
+        name=name,
+        description=description,
+        price=Decimal(price),
+        image=image,
+        stock=stock,
+        hsn_code='6109',
+        gst_rate=Decimal('18.00'),
+        **kwargs
+    )
+
+
+CHECKOUT_DATA = {
+    'full_name': 'Test User', 'email': 'test@example.com', 'phone': '9876543210',
+    'address': '1 Test Street', 'city': 'Bangalore', 'state': 'Karnataka', 'pincode': '560001',
+}
+
+
+def make_order(products, **kwargs):
+    fields = {
+        'full_name': 'Test User',
+        'email': 'test@example.com',
+        'phone': '9876543210',
+        'address': '1 Test Street',
+        'city': 'Bangalore',
+        'state': 'Karnataka',
+        'pincode': '560001',
+        'subtotal': Decimal('0'),
+        'gst_amount': Decimal('0'),
+        'total_amount': Decimal('0'),
+    }
+    fields.update(kwargs)
+    order = Order.objects.create(**fields)
+    for product in products:
+        OrderItem.objects.create(
+            order=order, product=product, quantity=1,
+            price=product.get_selling_price(),
+            hsn_code=product.hsn_code, gst_rate=product.gst_rate,
+        )
+    return order
+
+
+def make_cursor(*values):
+    """
+    A cursor carrying arbitrary sort key values, as a client could craft one.
+    """
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+# Sort keys no query can be run with: ids past SQLite's INTEGER, prices that
+# are not numbers or do not fit the column, and a time that overflows when
+# shifted to UTC
+BAD_CURSORS = [
+    ['2024-01-01T00:00:00+00:00', 10 ** 23],
+    ['2024-01-01T00:00:00+00:00', -2 ** 63],
+    ['9999-12-31T23:59:59-23:59', 1],
+]
+BAD_PRICE_CURSORS = [['NaN', 1], ['Infinity', 1], ['1e999999', 1], ['100.00', 10 ** 23]]
+
+
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def full_table_scans(captured_queries):
+    """
+    Runs EXPLAIN QUERY PLAN on each captured SELECT and returns (table, sql)
+    for every step that reads a whole table. Scans of an index, walked in
+    order for ORDER BY ... LIMIT, are not counted.
+    """
+    scans = []
+    with connection.cursor() as cursor:
+        for query in captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+            for row in cursor.fetchall():
+                match = FULL_SCAN_RE.match(row[-1])
+                if match:
+                    scans.append((match.group(1), query['sql']))
+    return scans
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class InvoiceJobTests(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Clothing')
+        self.product = make_product(self.category)
+
+    def test_checkout_enqueues_invoice_instead_of_rendering(self):
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        with mock.patch('store.invoice_renderers.pisa.pisaDocument') as render:
+            response = self.client.post(reverse('checkout'), CHECKOUT_DATA)
+        self.assertEqual(response.status_code, 302)
+        render.assert_not_called()
+
+        order = Order.objects.get()
+        self.assertFalse(order.invoice_generated)
+        self.assertEqual(order.invoice_job.status, 'pending')
+
+    def test_worker_renders_invoice(self):
+        order = make_order([self.product])
+        job = enqueue_invoice(order)
+
+        self.assertEqual(claim_jobs(10), [job.id])
+        self.assertEqual(claim_jobs(10), [])
+        self.assertEqual(run_invoice_job(job.id), 'done')
+
+        order.refresh_from_db()
+        self.assertTrue(order.invoice_generated)
+        self.assertTrue(order.invoice_file.name.startswith('invoices/'))
+
+    def test_worker_keeps_changes_made_while_rendering(self):
+        order = make_order([self.product])
+        job = enqueue_invoice(order)
+        claim_jobs(10)
+
+        def paid_while_rendering(order, **kwargs):
+            # The worker has loaded the order; payment is confirmed before it saves
+            Order.objects.filter(pk=order.pk).update(payment_status=True, status='processing')
+            return generate_gst_invoice(order, **kwargs)
+
+        with mock.patch('store.jobs.generate_gst_invoice', side_effect=paid_while_rendering):
+            self.assertEqual(run_invoice_job(job.id), 'done')
+
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.status, order.invoice_generated), (True, 'processing', True))
+
+    def test_failed_render_is_retried_with_backoff(self):
+        order = make_order([self.product])
+        job = enqueue_invoice(order)
+        job.max_attempts = 2
+        job.save()
+
+        with mock.patch('store.jobs.generate_gst_invoice', side_effect=Exception('boom')):
+            claim_jobs(10)
+            self.assertEqual(run_invoice_job(job.id), 'pending')
+            job.refresh_from_db()
+            self.assertEqual(job.last_error, 'boom')
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertEqual(claim_jobs(10), [])
+
+            InvoiceJob.objects.filter(id=job.id).update(run_after=timezone.now())
+            claim_jobs(10)
+            self.assertEqual(run_invoice_job(job.id), 'failed')
+
+        order.refresh_from_db()
+        self.assertFalse(order.invoice_generated)
+
+    def test_download_reports_generating_until_ready(self):
+        order = make_order([self.product])
+        url = reverse('download_invoice', args=[order.order_id])
+
+        response = self.client.get(url)
+        self.assertRedirects(response, reverse('order_success', args=[order.order_id]))
+        job = InvoiceJob.objects.get(order=order)
+
+        claim_jobs(10)
+        run_invoice_job(job.id)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_download_does_not_restart_failed_jobs(self):
+        order = make_order([self.product])
+        job = enqueue_invoice(order)
+        InvoiceJob.objects.filter(id=job.id).update(status='failed', attempts=job.max_attempts)
+
+        self.client.get(reverse('download_invoice', args=[order.order_id]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', job.max_attempts))
+        self.assertEqual(enqueue_invoice(order).status, 'pending')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class InvoiceRendererTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Clothing')
+        self.order = make_order([make_product(category, name='Shirt & Tie')])
+
+    @override_settings(INVOICE_RENDERER='reportlab', COMPANY_NAME='ShopEase Pvt Ltd')
+    def test_reportlab_backend_selected_by_setting(self):
+        self.assertIsInstance(get_invoice_renderer(), ReportLabInvoiceRenderer)
+        self.assertTrue(generate_gst_invoice(self.order, fail_silently=False))
+
+        with self.order.invoice_file.open('rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+    def test_backends_render_pdf(self):
+        items = list(self.order.items.select_related('product'))
+        for name in ['html', 'reportlab']:
+            pdf = get_invoice_renderer(name).render(self.order, items)
+            self.assertTrue(pdf.startswith(b'%PDF'), name)
+
+    @override_settings(GST_NUMBER='<b>29ABCDE1234F1Z5 &')
+    def test_reportlab_escapes_company_details(self):
+        items = list(self.order.items.select_related('product'))
+        self.assertTrue(get_invoice_renderer('reportlab').render(self.order, items).startswith(b'%PDF'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, INVOICE_RENDERER='reportlab')
+class RegenerateInvoicesCommandTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Clothing')
+        product = make_product(category)
+        self.orders = [make_order([product]) for _ in range(5)]
+        Order.objects.filter(pk=self.orders[0].pk).update(invoice_generated=True, status='cancelled')
+
+    def regenerate(self, *args):
+        call_command('regenerate_invoices', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_missing_only_with_worker_pool(self):
+        self.regenerate('--missing-only', '--workers', '2', '--chunk-size', '2')
+
+        self.assertEqual(Order.objects.filter(invoice_generated=True).count(), 5)
+        self.assertFalse(Order.objects.get(pk=self.orders[0].pk).invoice_file)
+
+    def test_resumes_from_checkpoint(self):
+        checkpoint = os.path.join(MEDIA_ROOT, 'regenerate.checkpoint')
+        with open(checkpoint, 'w') as f:
+            f.write(str(self.orders[2].pk))
+
+        self.regenerate('--workers', '0', '--status', 'pending', '--checkpoint', checkpoint)
+
+        generated = set(Order.objects.filter(invoice_file__startswith='invoices/').values_list('pk', flat=True))
+        self.assertEqual(generated, {self.orders[3].pk, self.orders[4].pk})
+        with open(checkpoint) as f:
+            self.assertEqual(f.read(), str(self.orders[4].pk))
+
+
+class CartTotalsTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Clothing')
+        self.shirt = make_product(category, name='Shirt', price='500.00')
+        self.shoes = make_product(category, name='Shoes', price='1200.00', discounted_price=Decimal('999.00'))
+
+    def test_totals_follow_cart_lines(self):
+        self.client.get(reverse('add_to_cart', args=[self.shirt.id]))
+        self.client.get(reverse('add_to_cart', args=[self.shoes.id]))
+        cart = Cart.objects.get()
+        self.assertEqual((cart.item_count, cart.get_total_items(), cart.get_total()), (2, 2, Decimal('1499.00')))
+
+        item = CartItem.objects.get(product=self.shirt)
+        response = self.client.post(reverse('update_cart', args=[item.id]), {'action': 'increase'})
+        self.assertEqual(response.json()['cart_total'], 1999.0)
+
+        self.client.get(reverse('remove_from_cart', args=[item.id]))
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total_quantity, cart.subtotal), (1, 1, Decimal('999.00')))
+
+        cart.clear()
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.total_quantity, cart.subtotal), (0, 0, Decimal('0')))
+
+    def test_cart_badge_reads_stored_totals(self):
+        cart = Cart.objects.create(session_key='abc')
+        CartItem.objects.create(cart=cart, product=self.shirt, quantity=3)
+        cart.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_total_items(), 3)
+            self.assertEqual(cart.get_total(), Decimal('1500.00'))
+
+    def test_recompute_repairs_drifted_totals(self):
+        full = Cart.objects.create(session_key='full')
+        CartItem.objects.create(cart=full, product=self.shirt, quantity=2)
+        CartItem.objects.create(cart=full, product=self.shoes, quantity=1)
+        empty = Cart.objects.create(session_key='empty')
+        Cart.objects.update(item_count=9, total_quantity=9, subtotal=1)
+
+        # one aggregate, one bulk update, one reset of carts without lines
+        with self.assertNumQueries(3):
+            recompute_cart_totals()
+
+        full.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual((full.item_count, full.total_quantity, full.subtotal), (2, 3, Decimal('1999.00')))
+        self.assertEqual((empty.item_count, empty.total_quantity, empty.subtotal), (0, 0, Decimal('0')))
+
+    def test_price_changes_and_deletes_reprice_carts(self):
+        cart = Cart.objects.create(session_key='abc')
+        CartItem.objects.create(cart=cart, product=self.shirt, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.shoes, quantity=1)
+        other = Cart.objects.create(session_key='other')
+        CartItem.objects.create(cart=other, product=self.shoes, quantity=1)
+
+        def totals(cart):
+            cart.refresh_from_db()
+            return cart.item_count, cart.total_quantity, cart.subtotal
+
+        self.shirt.price = Decimal('450.00')
+        self.shirt.save()
+        self.assertEqual(totals(cart), (2, 3, Decimal('1899.00')))
+
+        Product.objects.filter(pk=self.shoes.pk).update(discounted_price=Decimal('899.00'))
+        self.assertEqual(totals(cart), (2, 3, Decimal('1799.00')))
+        self.assertEqual(totals(other), (1, 1, Decimal('899.00')))
+
+        self.shirt.discounted_price = Decimal('400.00')
+        Product.objects.bulk_update([self.shirt], ['discounted_price'])
+        self.assertEqual(totals(cart), (2, 3, Decimal('1699.00')))
+
+        self.shoes.delete()
+        self.assertEqual(totals(cart), (1, 2, Decimal('800.00')))
+        self.assertEqual(totals(other), (0, 0, Decimal('0')))
+
+
+class CartMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Clothing')
+
+    def fill_cart(self, lines):
+        start = Product.objects.count()
+        for i in range(start, start + lines):
+            product = make_product(self.category, name=f'Product {i}')
+            self.client.get(reverse('add_to_cart', args=[product.id]))
+
+    def test_browsing_creates_no_cart_or_session(self):
+        make_product(self.category)
+        # categories, featured and latest products; no session or cart lookups
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['cart_items_count'], 0)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_cart_page_loads_cart_once_for_view_and_badge(self):
+        self.fill_cart(1)
+        with self.assertNumQueries(3) as small:
+            self.client.get(reverse('cart_view'))
+
+        self.fill_cart(5)
+        # session, cart, cart lines with products and categories; the same
+        # count whatever the cart size, and no session save (store.sessions)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('cart_view'))
+
+        self.assertEqual(response.context['cart_items_count'], 6)
+        self.assertEqual(len(response.context['cart_items']), 6)
+        self.assertEqual(sum('FROM "store_cart" ' in q['sql'] for q in small.captured_queries), 1)
+
+
+class InventoryTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Clothing')
+        self.shirt = make_product(category, name='Shirt', stock=5)
+        self.shoes = make_product(category, name='Shoes', stock=1)
+
+    def test_decrement_is_all_or_nothing(self):
+        order = make_order([self.shirt, self.shoes, self.shoes])
+
+        with self.assertRaises(InsufficientStock) as raised:
+            decrement_order_stock(order)
+        self.assertEqual(raised.exception.shortfall, {
+            self.shoes.id: {'name': 'Shoes', 'requested': 2, 'available': 1},
+        })
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.stock, 5)
+
+    def test_decrement_does_not_rewrite_other_columns(self):
+        updated_at = self.shirt.updated_at
+        decrement_stock([(self.shirt.id, 2)])
+        self.shirt.refresh_from_db()
+        self.assertEqual((self.shirt.stock, self.shirt.updated_at), (3, updated_at))
+
+    def test_cancel_restocks_once(self):
+        order = make_order([self.shirt], payment_status=True)
+        decrement_order_stock(order)
+
+        self.assertTrue(cancel_order(order))
+        self.assertFalse(cancel_order(order))
+        self.shirt.refresh_from_db()
+        self.assertEqual(self.shirt.stock, 5)
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+
+    def test_concurrent_decrements_never_oversell(self):
+        category = Category.objects.create(name='Flash sale')
+        product = make_product(category, stock=25)
+        sold = []
+        errors = []
+
+        def buy():
+            try:
+                attempts = 0
+                while attempts < 5:
+                    try:
+                        decrement_stock([(product.id, 1)])
+                        sold.append(1)
+                    except InsufficientStock:
+                        pass
+                    except OperationalError:
+                        # SQLite's shared in-memory test database refuses
+                        # concurrent writers instead of waiting; try again.
+                        continue
+                    attempts += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        # 10 buyers want 50 units of a product that has 25 in stock
+        threads = [threading.Thread(target=buy) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), 25)
+        self.assertEqual(product.stock, 0)
+
+
+class StockReservationTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Flash sale')
+        self.product = make_product(category, stock=2)
+
+    def test_checkout_reserves_and_payment_converts(self):
+        buyer, other = Client(), Client()
+        buyer.get(reverse('add_to_cart', args=[self.product.id]))
+        buyer.get(reverse('add_to_cart', args=[self.product.id]))
+
+        buyer.get(reverse('checkout'))
+        self.assertEqual(get_available_stock(self.product), 0)
+        response = other.get(reverse('add_to_cart', args=[self.product.id]))
+        self.assertRedirects(response, reverse('product_detail', args=[self.product.slug]))
+
+        buyer.post(reverse('checkout'), CHECKOUT_DATA)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_reservations_are_swept(self):
+        cart = Cart.objects.create(session_key='abc')
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        for _ in range(3):
+            StockReservation.objects.create(product=self.product, cart=cart, quantity=1, expires_at=past)
+
+        self.assertEqual(get_available_stock(self.product), 2)
+        self.assertEqual(expire_reservations(batch_size=2), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_availability_is_one_indexed_aggregate(self):
+        plan = StockReservation.objects.filter(
+            product=self.product, expires_at__gt=timezone.now()
+        ).values('product').annotate(total=Sum('quantity')).explain()
+        self.assertIn('COVERING INDEX store_reservation_live_idx', plan)
+
+
+class CheckoutQueryBudgetTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Clothing')
+
+    def checkout_with(self, lines):
+        client = Client()
+        for i in range(lines):
+            product = make_product(self.category, name=f'Product {lines}-{i}')
+            client.get(reverse('add_to_cart', args=[product.id]))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse('checkout'), CHECKOUT_DATA)
+        self.assertEqual(response.status_code, 302)
+        return [q['sql'] for q in queries.captured_queries]
+
+    def test_only_stock_updates_grow_with_cart_size(self):
+        small = self.checkout_with(1)
+        large = self.checkout_with(25)
+
+        # Each line takes its own conditional stock UPDATE, in product id
+        # order to avoid deadlocks; every other statement is a fixed cost.
+        is_stock_update = lambda sql: sql.startswith('UPDATE "store_product"')
+        other = lambda queries: [sql for sql in queries if 'SAVEPOINT' not in sql and not is_stock_update(sql)]
+        self.assertEqual(sum(map(is_stock_update, small)), 1)
+        self.assertEqual(sum(map(is_stock_update, large)), 25)
+        self.assertEqual(len(other(small)), 15)
+        self.assertEqual(len(other(large)), 15)
+
+        order = Order.objects.latest('id')
+        self.assertEqual(order.items.count(), 25)
+        self.assertEqual(order.subtotal, Decimal('2500.00'))
+        self.assertEqual(order.gst_amount, Decimal('450.00'))
+
+    def test_failed_stock_commit_leaves_no_partial_order(self):
+        client = Client()
+        product = make_product(self.category, stock=1)
+        client.get(reverse('add_to_cart', args=[product.id]))
+        with mock.patch('store.views.commit_order_stock', side_effect=InsufficientStock({})):
+            response = client.post(reverse('checkout'), CHECKOUT_DATA)
+
+        self.assertRedirects(response, reverse('cart_view'))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Cart.objects.get().item_count, 1)
+
+
+class PricingTests(TestCase):
+
+    def test_lines_are_rounded_per_line_and_summed(self):
+        prices = price_lines([
+            (Decimal('99.99'), 3, Decimal('18.00')),
+            (Decimal('12.25'), 1, Decimal('18.00')),
+        ])
+        # 53.9946 and 2.205 round half-up to paise
+        self.assertEqual([line.gst_amount for line in prices.lines], [Decimal('53.99'), Decimal('2.21')])
+        self.assertEqual(
+            (prices.subtotal, prices.gst_amount, prices.total),
+            (Decimal('312.22'), Decimal('56.20'), Decimal('368.42')),
+        )
+
+    def test_database_expressions_match_python(self):
+        category = Category.objects.create(name='Clothing')
+        shirt = make_product(category, name='Shirt', price='99.99')
+        shoes = make_product(category, name='Shoes', price='1200.00', discounted_price=Decimal('999.50'))
+        order = make_order([shirt, shoes])
+        OrderItem.objects.filter(product=shirt).update(quantity=3)
+
+        items = list(annotate_line_prices(order.items.order_by('id')))
+        expected = price_lines((item.price, item.quantity, item.gst_rate) for item in items)
+        self.assertEqual([item.line_gst for item in items], [line.gst_amount for line in expected.lines])
+        self.assertEqual(aggregate_line_prices(order.items.all()), {
+            'subtotal': expected.subtotal, 'gst_amount': expected.gst_amount, 'total': expected.total,
+        })
+
+        cart = Cart.objects.create(session_key='abc')
+        CartItem.objects.create(cart=cart, product=shoes, quantity=2)
+        totals = aggregate_line_prices(
+            cart.items.all(), unit_price=selling_price_expression('product__'), gst_rate='product__gst_rate',
+        )
+        self.assertEqual(totals['subtotal'], Decimal('1999.00'))
+
+    def test_database_gst_is_not_truncated_for_whole_numbers(self):
+        category = Category.objects.create(name='Clothing')
+        order = make_order([make_product(category, name='Cap', price='10.00')])
+        OrderItem.objects.filter(order=order).update(quantity=2)
+        self.assertEqual(aggregate_line_prices(order.items.all())['gst_amount'], Decimal('3.60'))
+
+
+class StoredPricingTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Shoes')
+        self.cheap = make_product(self.category, name='Sandals', price='400.00')
+        self.deal = make_product(self.category, name='Sneakers', price='2000.00', discounted_price=Decimal('1250.00'))
+        self.pricey = make_product(self.category, name='Boots', price='3000.00', discounted_price=Decimal('2800.00'))
+
+    def test_save_and_bulk_paths_keep_columns_in_sync(self):
+        self.assertEqual((self.deal.selling_price, self.deal.discount_pct), (Decimal('1250.00'), 38))
+
+        Product.objects.filter(pk=self.cheap.pk).update(discounted_price=Decimal('300.00'))
+        self.cheap.refresh_from_db()
+        self.assertEqual((self.cheap.selling_price, self.cheap.discount_pct), (Decimal('300.00'), 25))
+
+        self.pricey.discounted_price = None
+        Product.objects.bulk_update([self.pricey], ['discounted_price'])
+        self.pricey.refresh_from_db()
+        self.assertEqual((self.pricey.selling_price, self.pricey.discount_pct), (Decimal('3000.00'), 0))
+
+        self.deal.price = Decimal('2500.00')
+        self.deal.save(update_fields=['price'])
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.discount_pct, 50)
+
+    def test_discounted_price_above_price_stores_no_discount(self):
+        markup = make_product(self.category, name='Clogs', price='100.00', discounted_price=Decimal('120.00'))
+        markup.refresh_from_db()
+        self.assertEqual(markup.discount_pct, 0)
+
+        Product.objects.filter(pk=self.deal.pk).update(discounted_price=Decimal('2400.00'))
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.discount_pct, 0)
+
+    def test_category_sorts_and_filters_in_sql(self):
+        url = reverse('category_view', args=[self.category.slug])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'sort': 'price_desc'})
+        self.assertEqual([p.name for p in response.context['products']], ['Boots', 'Sneakers', 'Sandals'])
+        self.assertTrue(any(
+            'ORDER BY "store_product"."selling_price" DESC' in q['sql'] for q in ctx.captured_queries
+        ))
+
+        response = self.client.get(url, {'min_price': '500', 'max_price': '2000', 'min_discount': '30'})
+        self.assertEqual([p.name for p in response.context['products']], ['Sneakers'])
+
+    def test_non_finite_prices_are_ignored(self):
+        url = reverse('category_view', args=[self.category.slug])
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            response = self.client.get(url, {'min_price': value, 'max_price': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['products']), 3)
+
+    def test_out_of_range_discounts_are_ignored(self):
+        url = reverse('category_view', args=[self.category.slug])
+        for value in ('9' * 30, '101', '²'):
+            response = self.client.get(url, {'min_discount': value})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['products']), 3)
+        response = self.client.get(url, {'min_discount': '100'})
+        self.assertEqual(list(response.context['products']), [])
+
+
+@override_settings(CATALOG_PAGE_SIZE=2)
+class CategoryPaginationTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Books')
+        self.url = reverse('category_view', args=[self.category.slug])
+        prices = ['300.00', '700.00', '700.00', '1200.00', '6000.00']
+        self.products = [
+            make_product(self.category, name=f'Book {i}', price=price, stock=i % 2)
+            for i, price in enumerate(prices)
+        ]
+
+    def names(self, response):
+        return [p.name for p in response.context['products']]
+
+    def test_cursors_walk_forward_and_back(self):
+        response = self.client.get(self.url, {'sort': 'price_asc'})
+        self.assertEqual(self.names(response), ['Book 0', 'Book 1'])
+        self.assertIsNone(response.context['page']['previous_cursor'])
+
+        response = self.client.get(self.url, {'sort': 'price_asc', 'after': response.context['page']['next_cursor']})
+        self.assertEqual(self.names(response), ['Book 2', 'Book 3'])
+        second = response.context['page']
+
+        response = self.client.get(self.url, {'sort': 'price_asc', 'after': second['next_cursor']})
+        self.assertEqual(self.names(response), ['Book 4'])
+        self.assertIsNone(response.context['page']['next_cursor'])
+
+        response = self.client.get(self.url, {'sort': 'price_asc', 'before': response.context['page']['previous_cursor']})
+        self.assertEqual(self.names(response), ['Book 2', 'Book 3'])
+
+        response = self.client.get(self.url, {'sort': 'price_asc', 'before': second['previous_cursor']})
+        self.assertEqual(self.names(response), ['Book 0', 'Book 1'])
+        self.assertIsNone(response.context['page']['previous_cursor'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(self.url, {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 2)
+        self.assertIsNone(decode_cursor('bm9wZQ', SORT_OPTIONS['newest']))
+
+    def test_out_of_range_cursors_fall_back_to_first_page(self):
+        first_page = self.names(self.client.get(self.url))
+        for values in BAD_CURSORS:
+            self.assertIsNone(decode_cursor(make_cursor(*values), SORT_OPTIONS['newest']))
+            for direction in ('after', 'before'):
+                response = self.client.get(self.url, {direction: make_cursor(*values)})
+                self.assertEqual(self.names(response), first_page)
+        for values in BAD_PRICE_CURSORS:
+            self.assertIsNone(decode_cursor(make_cursor(*values), SORT_OPTIONS['price_asc']))
+            response = self.client.get(self.url, {'sort': 'price_asc', 'before': make_cursor(*values)})
+            self.assertEqual(self.names(response), ['Book 0', 'Book 1'])
+        self.assertEqual(decode_cursor(make_cursor('100.00', 2 ** 63 - 1), SORT_OPTIONS['price_asc']),
+                         [Decimal('100.00'), 2 ** 63 - 1])
+
+    def test_facets_are_counted_in_one_query(self):
+        products = Product.objects.filter(category=self.category, is_active=True)
+        with self.assertNumQueries(1):
+            facets = get_facets(products)
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(facets['in_stock'], 2)
+        self.assertEqual([band['count'] for band in facets['price_bands']], [1, 2, 1, 1])
+
+        response = self.client.get(self.url, {'min_price': '500', 'max_price': '999.99'})
+        self.assertEqual(sorted(self.names(response)), ['Book 1', 'Book 2'])
+        self.assertContains(response, 'min_price=500')
+
+
+class ProductSearchTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Home Decor')
+        self.lamp = make_product(self.category, name='Brass Table Lamp', description='Warm light for study desks')
+        self.mug = make_product(self.category, name='Ceramic Mug', description='Pairs well with a table lamp')
+        self.hidden = make_product(self.category, name='Brass Lamp Hidden', is_active=False)
+
+    def test_ranks_name_matches_first_and_hides_inactive(self):
+        response = self.client.get(reverse('search'), {'q': 'lamp'})
+        self.assertEqual([p.name for p in response.context['products']], ['Brass Table Lamp', 'Ceramic Mug'])
+
+        response = self.client.get(reverse('search'), {'q': 'ceram'})
+        self.assertEqual([p.name for p in response.context['products']], ['Ceramic Mug'])
+
+        # FTS5 syntax in user input is searched as text, not parsed
+        response = self.client.get(reverse('search'), {'q': 'lamp" OR NEAR('})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SEARCH_MAX_PAGE=50)
+    def test_page_numbers_out_of_range_fall_back_to_the_first(self):
+        for page in ('9' * 30, '51', '0', '²'):
+            response = self.client.get(reverse('search'), {'q': 'lamp', 'page': page})
+            self.assertEqual(response.context['page'], 1)
+            self.assertEqual(len(response.context['products']), 2)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'lamp', 'page': '50'}).context['page'], 50)
+
+    def test_index_follows_saves_bulk_updates_and_deletes(self):
+        self.mug.name = 'Ceramic Teacup'
+        self.mug.save()
+        Product.objects.filter(pk=self.lamp.pk).update(hsn_code='94052000')
+        self.category.name = 'Lighting'
+        self.category.save()
+
+        active = Product.objects.filter(is_active=True)
+        self.assertEqual(search_products('teacup', active), [self.mug])
+        self.assertEqual(search_products('94052000', active), [self.lamp])
+        self.assertEqual(len(search_products('lighting', active)), 2)
+
+        self.mug.delete()
+        self.assertEqual(search_products('teacup', Product.objects.all()), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM store_product_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertCountEqual(search_products('brass', Product.objects.all()), [self.lamp, self.hidden])
+
+    def test_autocomplete_matches_name_prefixes(self):
+        response = self.client.get(reverse('search_autocomplete'), {'q': 'bra'})
+        self.assertEqual(response.json()['results'], [
+            {'id': self.lamp.pk, 'name': 'Brass Table Lamp', 'slug': self.lamp.slug},
+        ])
+        self.assertEqual(self.client.get(reverse('search_autocomplete'), {'q': 'la'}).json()['results'][0]['name'],
+                         'Brass Table Lamp')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryPlanTests(TestCase):
+    # Read whole by design: the home page lists every category.
+    allowed_scans = {'store_category'}
+
+    def setUp(self):
+        cache.clear()
+        self.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        self.products = [
+            make_product(self.categories[i % 3], name=f'Product {i}', featured=i % 4 == 0, is_active=i % 7 != 0)
+            for i in range(60)
+        ]
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        for i in range(5):
+            make_order(self.products[i:i + 2], user=self.user)
+
+    def assertNoFullScans(self, url, params=None, client=None):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        scans = [(table, sql) for table, sql in full_table_scans(ctx.captured_queries)
+                 if table not in self.allowed_scans]
+        self.assertEqual(scans, [])
+
+    def test_catalog_views_use_indexes(self):
+        category = self.categories[0]
+        self.assertNoFullScans(reverse('home'))
+        self.assertNoFullScans(reverse('category_view', args=[category.slug]))
+        for sort in SORT_OPTIONS:
+            self.assertNoFullScans(reverse('category_view', args=[category.slug]), {'sort': sort, 'in_stock': 1})
+        self.assertNoFullScans(reverse('product_detail', args=[self.products[1].slug]))
+        self.assertNoFullScans(reverse('search'), {'q': 'product'})
+
+    def test_cart_and_order_views_use_indexes(self):
+        self.client.get(reverse('add_to_cart', args=[self.products[1].id]))
+        self.assertNoFullScans(reverse('cart_view'))
+
+        client = Client()
+        client.force_login(self.user)
+        self.assertNoFullScans(reverse('my_orders'), client=client)
+
+    def test_cart_cannot_hold_two_lines_for_one_product(self):
+        cart = Cart.objects.create(session_key='abc')
+        CartItem.objects.create(cart=cart, product=self.products[1])
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(cart=cart, product=self.products[1])
+
+
+def make_image(size=(800, 600), name='photo.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_DERIVATIVE_WIDTHS=[320, 640])
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Photos')
+
+    def render(self, product):
+        return Template('{% load images %}{% responsive_image product sizes="50vw" class="card-img-top" %}').render(
+            Context({'product': product})
+        )
+
+    def test_upload_makes_hashed_derivatives_without_upscaling(self):
+        product = make_product(self.category, image=make_image())
+        product.refresh_from_db()
+        self.assertEqual(len(product.image_hash), 12)
+
+        names = images.derivative_names(product.image.name, product.image_hash)
+        self.assertEqual(len(names), 4)
+        for name in names:
+            with default_storage.open(name) as f, Image.open(f) as derivative:
+                self.assertEqual(derivative.width, 640 if '640w' in name else 320)
+
+        html = self.render(product)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'-{product.image_hash}-640w.webp 640w', html)
+        self.assertIn(f'src="/media/derived/products/', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_missing_derivatives_are_regenerated_on_render(self):
+        product = make_product(self.category, image=make_image(size=(300, 200)))
+        product.refresh_from_db()
+        missing = images.derivative_name(product.image.name, product.image_hash, 320, 'webp')
+        default_storage.delete(missing)
+        cache.clear()
+
+        self.render(product)
+        self.assertTrue(default_storage.exists(missing))
+
+    def test_unreadable_image_falls_back_to_original(self):
+        product = make_product(self.category, image='products/missing.jpg')
+        self.assertEqual(product.image_hash, '')
+        self.assertIn('src="/media/products/missing.jpg"', self.render(product))
+
+    def test_command_processes_existing_images(self):
+        product = make_product(self.category, image=make_image(name='bulk.jpg'))
+        Product.objects.filter(pk=product.pk).update(image_hash='')
+        shutil.rmtree(os.path.join(MEDIA_ROOT, 'derived'))
+
+        call_command('generate_image_derivatives', workers=0, stdout=StringIO())
+        product.refresh_from_db()
+        self.assertTrue(product.image_hash)
+        for name in images.derivative_names(product.image.name, product.image_hash):
+            self.assertTrue(default_storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shoes = Category.objects.create(name='Shoes')
+        self.bags = Category.objects.create(name='Bags')
+        self.sneaker = make_product(self.shoes, name='Sneaker', featured=True)
+        self.tote = make_product(self.bags, name='Tote')
+
+    def catalog_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if 'store_product' in q['sql'] or 'store_category' in q['sql']]
+
+    def test_home_is_served_from_fragments(self):
+        self.client.get(reverse('home'))
+        response, queries = self.catalog_queries(reverse('home'))
+
+        self.assertContains(response, 'Sneaker')
+        self.assertEqual(queries, [])
+        stats = fragments.get_stats()
+        for name in ('home-categories', 'home-featured', 'home-latest'):
+            self.assertEqual(stats[name], {'hits': 1, 'misses': 1})
+
+    def test_writes_invalidate_only_affected_fragments(self):
+        for cache_settings in (
+            {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+        ):
+            with self.subTest(backend=cache_settings['BACKEND']), override_settings(CACHES={'default': cache_settings}):
+                cache.clear()
+                bags_url = reverse('category_view', args=[self.bags.slug])
+                self.client.get(reverse('home'))
+                self.client.get(bags_url)
+
+                self.sneaker.name = f"Runner {cache_settings['BACKEND'][-12:]}"
+                self.sneaker.save()
+                self.assertContains(self.client.get(reverse('home')), self.sneaker.name)
+                self.assertEqual(fragments.get_stats()['home-categories']['hits'], 1)
+
+                # Another category's cards are untouched
+                self.client.get(bags_url)
+                self.assertEqual(fragments.get_stats()['category-card'], {'hits': 1, 'misses': 1})
+
+                Product.objects.filter(pk=self.tote.pk).update(name='Satchel')
+                self.assertContains(self.client.get(bags_url), 'Satchel')
+
+                self.bags.name = 'Luggage'
+                self.bags.save()
+                self.assertContains(self.client.get(reverse('home')), 'Luggage')
+
+                # Stock changes are not shown in cached fragments
+                versions = fragments.get_versions(['catalog'])
+                Product.objects.filter(pk=self.tote.pk).update(stock=3)
+                self.assertEqual(fragments.get_versions(['catalog']), versions)
+
+    def test_stock_filtered_and_arbitrary_listings_are_not_cached(self):
+        url = reverse('home')
+        self.assertContains(self.client.get(url, {'in_stock': '1'}), 'Sneaker')
+        Product.objects.filter(pk=self.sneaker.pk).update(stock=0)
+        self.assertNotContains(self.client.get(url, {'in_stock': '1'}), 'Sneaker')
+
+        for params in ({'min_price': '123.45'}, {'min_discount': '7'}, {'sort': 'x' * 50}):
+            self.client.get(url, params)
+            self.client.get(url, params)
+        # Only the sort falls back to a known value, so only it was cached
+        self.assertEqual(fragments.get_stats()['home-latest'], {'hits': 1, 'misses': 1})
+
+        # A facet's price band is cached like an unfiltered page
+        self.client.get(url, {'min_price': '500', 'max_price': '999.99'})
+        self.client.get(url, {'min_price': '500.00', 'max_price': '999.99'})
+        self.assertEqual(fragments.get_stats()['home-latest'], {'hits': 2, 'misses': 2})
+
+    def test_bulk_update_of_deferred_rows_looks_up_categories_once(self):
+        for i in range(20):
+            make_product(self.bags, name=f'Bag {i}')
+        rows = list(Product.objects.only('pk', 'image_hash'))
+        for row in rows:
+            row.image_hash = 'abc'
+        versions = fragments.get_versions([fragments.category_scope(self.shoes.pk)])
+        # The UPDATE and one query for the deferred category ids
+        with CaptureQueriesContext(connection) as ctx:
+            Product.objects.bulk_update(rows, ['image_hash'])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]), 2)
+        self.assertNotEqual(fragments.get_versions([fragments.category_scope(self.shoes.pk)]), versions)
+
+    def test_stats_view_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('fragment_cache_stats')).status_code, 302)
+        staff = User.objects.create_user(username='staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('fragment_cache_stats'))
+        self.assertIn('home-featured', response.json()['fragments'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Watches')
+        self.watch = make_product(self.category, name='Steel Watch')
+        make_product(self.category, name='Leather Watch')
+        self.url = reverse('product_detail', args=[self.watch.slug])
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_revalidation_skips_rendering(self):
+        for url in (self.url, reverse('category_view', args=[self.category.slug])):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('public', first['Cache-Control'])
+            self.assertIn('Cookie', first['Vary'])
+            self.assertTrue(first.has_header('Last-Modified'))
+
+            with self.assertTemplateNotUsed('store/base.html'):
+                second = self.revalidate(url, first)
+            self.assertEqual(second.status_code, 304)
+            self.assertEqual(second['ETag'], first['ETag'])
+            # The whole page body is saved on every revalidation
+            self.assertEqual(second.content, b'')
+            self.assertGreater(len(first.content), 5000)
+
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+            # Only the validator query runs, however much the full page needs
+            with CaptureQueriesContext(connection) as full:
+                self.client.get(url)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.revalidate(url, first).status_code, 304)
+            self.assertGreater(len(full.captured_queries), 1)
+
+    def test_catalog_changes_change_the_etag(self):
+        first = self.client.get(self.url)
+        Product.objects.filter(pk=self.watch.pk).update(stock=1)
+        second = self.revalidate(self.url, first)
+        self.assertEqual(second.status_code, 200)
+
+        # Stock leaves updated_at alone; category pages only show what is in stock
+        category_url = reverse('category_view', args=[self.category.slug])
+        listing = self.client.get(category_url)
+        Product.objects.filter(pk=self.watch.pk).update(stock=2)
+        self.assertEqual(self.revalidate(category_url, listing).status_code, 304)
+        Product.objects.filter(pk=self.watch.pk).update(stock=0)
+        self.assertEqual(self.revalidate(category_url, listing).status_code, 200)
+        second = self.client.get(self.url)
+
+        make_product(self.category, name='Gold Watch', is_active=False)
+        self.assertEqual(self.revalidate(self.url, second).status_code, 304)
+        Product.objects.filter(name='Gold Watch').update(is_active=True)
+        third = self.revalidate(self.url, second)
+        self.assertEqual(third.status_code, 200)
+
+        self.category.name = 'Clocks'
+        self.category.save()
+        self.assertEqual(self.revalidate(self.url, third).status_code, 200)
+
+    def test_removing_a_product_advances_last_modified(self):
+        url = reverse('category_view', args=[self.category.slug])
+        other = Category.objects.create(name='Clocks')
+
+        def deactivate(product):
+            Product.objects.filter(pk=product.pk).update(is_active=False)
+
+        def move(product):
+            product.category = other
+            Product.objects.bulk_update([product], ['category'])
+
+        for i, remove in enumerate([deactivate, move, Product.delete]):
+            newest = make_product(self.category, name=f'Gold Watch {i}')
+            # Whole seconds apart, as If-Modified-Since compares
+            an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+            Product.objects.filter(pk=newest.pk).update(updated_at=an_hour_ago)
+            Product.objects.exclude(pk=newest.pk).update(updated_at=an_hour_ago - datetime.timedelta(hours=1))
+            Category.objects.update(updated_at=an_hour_ago - datetime.timedelta(hours=1))
+
+            first = self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+            remove(newest)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, newest.name)
+        self.watch.is_active = False
+        self.watch.save()
+        self.assertGreater(Category.objects.get(pk=self.category.pk).updated_at, an_hour_ago)
+
+    def test_visitor_state_is_private_and_part_of_the_etag(self):
+        self.client.get(reverse('add_to_cart', args=[self.watch.id]))
+        # The redirect's message is shown once, so that page is rendered in full
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        first = self.client.get(self.url)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertFalse(first.has_header('Last-Modified'))
+        self.assertEqual(self.revalidate(self.url, first).status_code, 304)
+
+        self.client.get(reverse('add_to_cart', args=[self.watch.id]))
+        self.client.get(reverse('cart_view'))
+        self.assertEqual(self.revalidate(self.url, first).status_code, 200)
+
+    def test_cart_and_order_pages_are_not_stored(self):
+        for url in (reverse('cart_view'), reverse('checkout')):
+            self.assertIn('no-store', self.client.get(url)['Cache-Control'])
+
+
+class CatalogApiTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Audio')
+        self.products = [
+            make_product(self.category, name=f'Speaker {i}', price=f'{(i + 1) * 100}.00') for i in range(5)
+        ]
+        make_product(self.category, name='Retired Speaker', is_active=False)
+
+    def test_lists_only_requested_fields_page_by_page(self):
+        url = reverse('api_product_list')
+        response = self.client.get(url, {'fields': 'id,name,category_slug', 'sort': 'price_asc', 'limit': 2})
+        data = response.json()
+        self.assertEqual(data['results'], [
+            {'id': self.products[0].pk, 'name': 'Speaker 0', 'category_slug': 'audio'},
+            {'id': self.products[1].pk, 'name': 'Speaker 1', 'category_slug': 'audio'},
+        ])
+
+        names = [row['name'] for row in data['results']]
+        while data['next_cursor']:
+            data = self.client.get(url, {'fields': 'name', 'sort': 'price_asc', 'limit': 2, 'after': data['next_cursor']}).json()
+            names += [row['name'] for row in data['results']]
+        self.assertEqual(names, [f'Speaker {i}' for i in range(5)])
+
+        self.assertEqual(self.client.get(url, {'fields': 'name,password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_category_list')).json()['results'], [
+            {'id': self.category.pk, 'name': 'Audio', 'slug': 'audio'},
+        ])
+
+    def test_batch_lookup_uses_one_query_and_strong_etags(self):
+        url = reverse('api_product_batch')
+        params = {
+            'ids': f'{self.products[3].pk},999',
+            'slugs': f'{self.products[1].slug},retired-speaker,{self.products[3].slug}',
+            'fields': 'id,selling_price',
+        }
+        with self.assertNumQueries(1):
+            response = self.client.get(url, params)
+        self.assertEqual(response.json(), {
+            'results': [
+                {'id': self.products[3].pk, 'selling_price': '400.00'},
+                {'id': self.products[1].pk, 'selling_price': '200.00'},
+            ],
+            'missing': [999, 'retired-speaker'],
+        })
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Product.objects.filter(pk=self.products[1].pk).update(price=Decimal('250.00'))
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_out_of_range_cursors_fall_back_to_first_page(self):
+        url = reverse('api_product_list')
+        for values in BAD_CURSORS:
+            response = self.client.get(url, {'fields': 'name', 'limit': 1, 'after': make_cursor(*values)})
+            self.assertEqual(response.json()['results'], [{'name': 'Speaker 4'}])
+        response = self.client.get(reverse('api_category_list'), {'after': make_cursor('Audio', 10 ** 23)})
+        self.assertEqual(response.json()['results'], [{'id': self.category.pk, 'name': 'Audio', 'slug': 'audio'}])
+
+    def test_batch_rejects_ids_out_of_range(self):
+        url = reverse('api_product_batch')
+        for ids in ('9' * 30, f'1,{2 ** 63}', '²'):
+            self.assertEqual(self.client.get(url, {'ids': ids}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': str(2 ** 63 - 1)}).json()['missing'], [2 ** 63 - 1])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RECOMMENDATION_SETTLE_MINUTES=0)
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        kitchen = Category.objects.create(name='Kitchen')
+        garden = Category.objects.create(name='Garden')
+        self.kettle = make_product(kitchen, name='Kettle')
+        self.mugs = make_product(kitchen, name='Mugs')
+        self.toaster = make_product(kitchen, name='Toaster')
+        self.tea = make_product(garden, name='Tea Plant')
+
+    def related(self, product):
+        return list(self.client.get(reverse('product_detail', args=[product.slug])).context['related_products'])
+
+    def test_falls_back_to_the_category(self):
+        self.assertEqual(self.related(self.kettle), [self.mugs, self.toaster])
+
+    def test_incremental_build_ranks_co_purchases(self):
+        make_order([self.kettle, self.tea], payment_status=True)
+        make_order([self.kettle, self.tea, self.toaster], payment_status=True)
+        make_order([self.kettle, self.mugs], payment_status=False)
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(
+            list(self.kettle.recommendations.values_list('recommended__name', 'orders', 'rank')),
+            [('Tea Plant', 2, 1), ('Toaster', 1, 2)],
+        )
+        self.assertEqual(self.related(self.kettle), [self.tea, self.toaster, self.mugs])
+
+        # Only orders past the watermark are counted on the next run
+        make_order([self.kettle, self.toaster], payment_status=True)
+        make_order([self.kettle, self.toaster], payment_status=True)
+        with CaptureQueriesContext(connection) as queries:
+            call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(sum('store_orderitem' in query['sql'] for query in queries), 2)
+        self.assertEqual(
+            list(self.kettle.recommendations.values_list('recommended__name', 'orders')),
+            [('Toaster', 3), ('Tea Plant', 2)],
+        )
+        self.assertEqual(list(self.tea.recommendations.values_list('recommended__name', flat=True)), ['Kettle', 'Toaster'])
+
+        call_command('build_recommendations', '--rebuild', stdout=StringIO())
+        self.assertEqual(
+            list(self.kettle.recommendations.values_list('recommended__name', 'orders')),
+            [('Toaster', 3), ('Tea Plant', 2)],
+        )
+
+    def test_product_page_reads_recommendations_with_an_index(self):
+        make_order([self.kettle, self.tea], payment_status=True)
+        call_command('build_recommendations', stdout=StringIO())
+        url = reverse('product_detail', args=[self.kettle.slug])
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual([table for table, sql in full_table_scans(queries.captured_queries)
+                          if table != 'store_category'], [])
+
+        # A new ranking changes the page's ETag
+        make_order([self.kettle, self.mugs], payment_status=True)
+        make_order([self.kettle, self.mugs], payment_status=True)
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class OrderHistoryTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Stationery')
+        self.pens = make_product(category, name='Pens', price='10.00')
+        self.paper = make_product(category, name='Paper', price='250.00')
+        self.user = User.objects.create_user(username='buyer', password='secret')
+        self.client.force_login(self.user)
+        self.orders = [make_order([self.pens, self.paper], user=self.user) for _ in range(23)]
+        OrderItem.objects.filter(product=self.pens).update(quantity=4)
+        make_order([self.paper], user=User.objects.create_user(username='other'))
+
+    def get_page(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('my_orders'), params)
+        return response, len(queries)
+
+    @override_settings(ORDERS_PAGE_SIZE=20)
+    def test_orders_are_paged_with_counts_and_lines(self):
+        response, first_queries = self.get_page()
+        orders = response.context['orders']
+        self.assertEqual([order.pk for order in orders], [order.pk for order in self.orders[::-1][:20]])
+        self.assertEqual((orders[0].item_count, orders[0].total_quantity), (2, 5))
+        self.assertContains(response, 'Pens</a> &times; 4')
+
+        response, last_queries = self.get_page(after=response.context['page']['next_cursor'])
+        self.assertEqual([order.pk for order in response.context['orders']], [order.pk for order in self.orders[2::-1]])
+        self.assertIsNone(response.context['page']['next_cursor'])
+        # Lines are prefetched, so a full page costs no more queries than a short one
+        self.assertEqual(first_queries, last_queries)
+
+    @override_settings(ORDERS_PAGE_SIZE=20)
+    def test_out_of_range_cursors_fall_back_to_first_page(self):
+        for values in BAD_CURSORS:
+            response, _ = self.get_page(after=make_cursor(*values))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['orders'][0].pk, self.orders[-1].pk)
+
+    def test_export_streams_every_line(self):
+        response = self.client.get(reverse('export_my_orders'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0].split(',')[:2], ['Order ID', 'Date'])
+        self.assertEqual(len(rows), 1 + 23 * 2)
+        newest = self.orders[-1].order_id
+        self.assertEqual(rows[1].split(',')[0], newest)
+        self.assertIn('Pens,6109,4,10.00,18.00,40.00,7.20,47.20', rows[1])
+
+        self.client.logout()
+        self.assertRedirects(self.client.get(reverse('export_my_orders')), reverse('home'))
+
+
+class GstReportTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Apparel')
+        self.shirt = make_product(category, name='Shirt', price='99.99')
+        self.shoes = make_product(category, name='Shoes', price='1200.00')
+        self.shoes.hsn_code = '6403'
+        self.shoes.save()
+        self.this_month = current_month()
+        self.last_month = previous_month(self.this_month)
+        last_month_start = timezone.make_aware(datetime.datetime.combine(self.last_month, datetime.time(12)))
+
+        self.paid = [
+            make_order([self.shirt, self.shoes], payment_status=True, state='Karnataka'),
+            make_order([self.shirt], payment_status=True, state='Kerala'),
+            make_order([self.shoes], payment_status=True, state='Karnataka'),
+        ]
+        OrderItem.objects.filter(product=self.shirt).update(quantity=3)
+        make_order([self.shirt], payment_status=False, state='Karnataka')
+        make_order([self.shoes], payment_status=True, status='cancelled', state='Karnataka')
+        Order.objects.filter(pk__in=[self.paid[0].pk, self.paid[1].pk]).update(created_at=last_month_start)
+
+    def expected(self, orders):
+        lines = OrderItem.objects.filter(order__in=orders)
+        return price_lines((line.price, line.quantity, line.gst_rate) for line in lines)
+
+    def test_report_matches_python_and_materializes_closed_months(self):
+        result = report(self.last_month, self.this_month, by='detail')
+        expected = self.expected(self.paid)
+        self.assertEqual(
+            (result['totals']['taxable_value'], result['totals']['gst_amount'], result['totals']['lines']),
+            (expected.subtotal, expected.gst_amount, 4),
+        )
+        self.assertEqual(
+            [(row['period'], row['state'], row['hsn_code'], row['lines']) for row in result['rows']],
+            [
+                (self.last_month, 'Karnataka', '6109', 1),
+                (self.last_month, 'Karnataka', '6403', 1),
+                (self.last_month, 'Kerala', '6109', 1),
+                (self.this_month, 'Karnataka', '6403', 1),
+            ],
+        )
+        # Only last month was materialized; this month is still open
+        self.assertEqual(set(GstSummary.objects.values_list('period', flat=True)), {self.last_month})
+
+        by_hsn = report(self.last_month, self.this_month, by='hsn')['rows']
+        self.assertEqual([(row['hsn_code'], row['quantity']) for row in by_hsn], [('6109', 6), ('6403', 2)])
+
+        # Closed months come from the summary rows, without re-reading order lines
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(report(self.last_month, self.last_month)['totals'], report(self.last_month, self.last_month)['totals'])
+        self.assertFalse(any('store_orderitem' in query['sql'] for query in queries))
+
+        # A late cancellation shows up once the month is refreshed
+        Order.objects.filter(pk=self.paid[1].pk).update(status='cancelled')
+        self.assertEqual(report(self.last_month, self.last_month)['totals']['lines'], 3)
+        self.assertEqual(report(self.last_month, self.last_month, refresh=True)['totals']['lines'], 2)
+
+    def test_command_prints_hsn_summary(self):
+        out = StringIO()
+        call_command('gst_report', '--from', self.last_month.strftime('%Y-%m'), '--by', 'rate', '--csv', stdout=out)
+        expected = self.expected(self.paid[:2])
+        rows = out.getvalue().splitlines()
+        self.assertEqual(rows[0], 'GST rate (%),Taxable value,GST,Total,Quantity,Lines')
+        self.assertEqual(rows[-1], f'Total,{expected.subtotal},{expected.gst_amount},{expected.total},7,3')
+
+
+class AccountingExportTests(TestCase):
+
+    def setUp(self):
+        category = Category.objects.create(name='Books')
+        self.novel = make_product(category, name='Novel', price='10.00')
+        self.atlas = make_product(category, name='Atlas', price='499.50')
+        self.orders = [
+            make_order([self.novel, self.atlas], payment_status=True, status='delivered'),
+            make_order([], payment_status=False),
+            make_order([self.atlas], payment_status=True, status='processing'),
+        ]
+        OrderItem.objects.filter(order=self.orders[0], product=self.novel).update(quantity=2)
+        self.staff = User.objects.create_user(username='accounts', password='secret', is_staff=True, is_superuser=True)
+        self.client.force_login(self.staff)
+
+    def test_lines_are_merged_from_two_streamed_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            exported = [(order['order_id'], [line['product_name'] for line in lines])
+                        for order, lines in iter_orders_with_lines(filter_orders({}), chunk_size=1)]
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(exported, [
+            (self.orders[0].order_id, ['Novel', 'Atlas']),
+            (self.orders[1].order_id, []),
+            (self.orders[2].order_id, ['Atlas']),
+        ])
+        paid = filter_orders({'paid': 'yes', 'status': 'processing'})
+        self.assertEqual([order['order_id'] for order, _ in iter_orders_with_lines(paid)], [self.orders[2].order_id])
+        with self.assertRaises(ValueError):
+            filter_orders({'from': '2024-13-01'})
+
+    def test_admin_streams_csv_and_gzipped_ndjson(self):
+        url = reverse('admin:store_order_export')
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 1 + 4)
+        self.assertIn('Novel,6109,2,10.00,18.00,20.00,3.60,23.60', rows[1])
+
+        response = self.client.get(url, {'format': 'ndjson', 'gzip': '1', 'paid': 'yes'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('orders.ndjson.gz', response['Content-Disposition'])
+        documents = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([len(document['items']) for document in documents], [2, 1])
+        self.assertEqual(documents[0]['items'][1]['total'], '589.41')
+
+        self.assertEqual(self.client.get(url, {'status': 'lost'}).status_code, 400)
+
+    def test_export_memory_stays_flat(self):
+        out = StringIO()
+        call_command('bench_order_export', '--lines', '200000', '--max-rss-mb', '32', stdout=out)
+        self.assertIn('Resident memory grew', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImportCatalogTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.shirts = Category.objects.create(name='Shirts', slug='shirts')
+        self.existing = make_product(self.shirts, name='Linen Shirt', price='900.00', slug='linen-shirt')
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def run_import(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_creates_updates_and_skips_bad_rows(self):
+        path = self.write('catalog.csv', (
+            'slug,name,category,price,discounted_price,stock\n'
+            'linen-shirt,Linen Shirt,Shirts,1000.00,800.00,5\n'
+            ',Linen Shirt,shirts,500.00,,3\n'
+            ',Desk Lamp,Lighting,1200.00,,7\n'
+            ',Broken,Shirts,lots,,1\n'
+        ))
+        out, err = self.run_import(path)
+        self.assertIn('2 created, 1 updated, 1 skipped', out)
+        self.assertIn('line 5: price is not a number', err)
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.selling_price, self.existing.stock),
+                         (Decimal('1000.00'), Decimal('800.00'), 5))
+        self.assertEqual(Product.objects.get(slug='linen-shirt-2').category, self.shirts)
+        lamp = Product.objects.get(slug='desk-lamp')
+        self.assertEqual(lamp.category.name, 'Lighting')
+        self.assertEqual(list(search_products('lamp', Product.objects.all())), [lamp])
+
+    def test_ndjson_matched_by_hsn_and_name(self):
+        path = self.write('catalog.ndjson', (
+            '{"name": "Linen Shirt", "hsn_code": "6109", "category": "Shirts", "price": "950.00", "featured": true}\n'
+            '{"name": "Linen Shirt", "hsn_code": "6205", "category": "Shirts", "price": "700.00"}\n'
+        ))
+        out, _ = self.run_import(path, '--key', 'hsn_name')
+        self.assertIn('1 created, 1 updated, 0 skipped', out)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.price, Decimal('950.00'))
+        self.assertTrue(self.existing.featured)
+        self.assertEqual(Product.objects.filter(name='Linen Shirt').count(), 2)
+
+    def test_rows_the_write_would_fail_on_are_skipped_alone(self):
+        bad_rows = [
+            ('{"name": "Markup", "category": "Shirts", "price": "100.00", "discounted_price": "120.00"}',
+             'discounted_price is more than price'),
+            ('{"name": "Unpriced", "category": "Shirts", "price": "NaN"}', 'price is not a number'),
+            ('{"name": "Unpriced", "category": "Shirts", "price": NaN}', 'price is not a number'),
+            ('{"name": "Priceless", "category": "Shirts", "price": "1e20"}', 'price is out of range'),
+            ('{"name": "Priceless", "category": "Shirts", "price": "99999999.999"}', 'price is out of range'),
+            ('{"name": "Hoard", "category": "Shirts", "price": "1.00", "stock": 99999999999999999999999}',
+             'stock is out of range'),
+            ('{"name": "Owed", "category": "Shirts", "price": "1.00", "stock": -1}', 'stock is out of range'),
+            ('{"name": "Hoard", "category": "Shirts", "price": "1.00", "stock": Infinity}', 'stock is not a whole number'),
+            ('{"name": "Truncated", "category": "Shirts", "pri', 'not valid JSON'),
+            ('["Listed", "Shirts", "1.00"]', 'not a JSON object'),
+        ]
+        for i, (bad_row, message) in enumerate(bad_rows):
+            with self.subTest(bad_row=bad_row):
+                path = self.write('catalog.ndjson', (
+                    f'{{"name": "Before {i}", "category": "Shirts", "price": "10.00"}}\n'
+                    f'{bad_row}\n'
+                    f'{{"name": "After {i}", "category": "Shirts", "price": "20.00", "stock": 3}}\n'
+                ))
+                out, err = self.run_import(path)
+                self.assertIn('2 created, 0 updated, 1 skipped', out)
+                self.assertIn(f'line 2: {message}', err)
+                self.assertTrue(Product.objects.filter(name=f'Before {i}').exists())
+                self.assertEqual(Product.objects.get(name=f'After {i}').stock, 3)
+
+    def test_unknown_category_is_skipped_when_not_created(self):
+        path = self.write('catalog.csv', 'name,category,price\nDesk Lamp,Lighting,1200.00\n')
+        out, err = self.run_import(path, '--no-create-categories')
+        self.assertIn('0 created, 0 updated, 1 skipped', out)
+        self.assertIn("unknown category 'Lighting'", err)
+        self.assertFalse(Category.objects.filter(name='Lighting').exists())
+
+    def test_images_are_copied_into_storage(self):
+        images_dir = os.path.join(self.directory, 'images')
+        os.mkdir(images_dir)
+        Image.new('RGB', (10, 10)).save(os.path.join(images_dir, 'lamp.jpg'))
+        path = self.write('catalog.csv', 'name,category,price,image\nDesk Lamp,Lighting,1200.00,lamp.jpg\n')
+        out, _ = self.run_import(path, '--images', images_dir)
+        self.assertIn('1 image(s) stored', out)
+        lamp = Product.objects.get(slug='desk-lamp')
+        self.assertTrue(lamp.image.name.startswith('products/lamp'))
+        self.assertTrue(default_storage.exists(lamp.image.name))
+
+
+class SessionTests(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Clothing')
+        self.product = make_product(self.category)
+
+    def anonymous_session(self, **data):
+        store = import_module(settings.ANONYMOUS_SESSION_ENGINE).SessionStore()
+        store.update(data)
+        store.save()
+        self.client.cookies[sessions.anonymous_cookie_name()] = store.session_key
+        return store
+
+    def session_writes(self, path, count=3):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(count):
+                response = self.client.get(path)
+        return response, sum(
+            'django_session' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE')) for q in queries.captured_queries
+        )
+
+    def test_anonymous_session_lives_in_a_signed_cookie(self):
+        self.anonymous_session(recently_viewed=[self.product.pk])
+
+        response, writes = self.session_writes(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes, 0)
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn(sessions.anonymous_cookie_name(), response.cookies)
+
+    def test_cart_promotes_the_session_to_the_database(self):
+        self.anonymous_session(recently_viewed=[self.product.pk])
+
+        response = self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.assertEqual(response.cookies[sessions.anonymous_cookie_name()].value, '')
+        session = Session.objects.get()
+        self.assertEqual(response.cookies[settings.SESSION_COOKIE_NAME].value, session.session_key)
+        self.assertEqual(session.get_decoded()['recently_viewed'], [self.product.pk])
+        self.assertEqual(Cart.objects.get().session_key, session.session_key)
+
+        # Browsing with the cart reads the session without saving it again
+        response, writes = self.session_writes(reverse('cart_view'))
+        self.assertEqual(response.context['cart_items_count'], 1)
+        self.assertEqual(writes, 0)
+
+    @override_settings(SESSION_COOKIE_AGE=3600, SESSION_REFRESH_WINDOW=600)
+    def test_expiry_slides_only_near_the_end(self):
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        expire_date = Session.objects.get().expire_date
+
+        saved_at = int(time.time())
+        with mock.patch('store.sessions.time.time', return_value=saved_at + 2000):
+            _, writes = self.session_writes(reverse('cart_view'), count=1)
+        self.assertEqual(writes, 0)
+        with mock.patch('store.sessions.time.time', return_value=saved_at + 3100):
+            response, writes = self.session_writes(reverse('cart_view'), count=1)
+        self.assertEqual(writes, 1)
+        self.assertEqual(response.cookies[settings.SESSION_COOKIE_NAME].value, session_key)
+        self.assertGreater(Session.objects.get().expire_date, expire_date)
+
+    def test_login_promotes_the_session(self):
+        User.objects.create_user(username='shopper', password='secret')
+        response = self.client.post(reverse('login'), {'username': 'shopper', 'password': 'secret'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        session = Session.objects.get()
+        self.assertEqual(response.cookies[settings.SESSION_COOKIE_NAME].value, session.session_key)
+        self.assertIn('_auth_user_id', session.get_decoded())
+
+        self.client.get(reverse('logout'))
+        self.assertFalse(Session.objects.exists())
+
+    @override_settings(ANONYMOUS_SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cache_backed_anonymous_sessions(self):
+        store = self.anonymous_session(recently_viewed=[self.product.pk])
+        self.assertTrue(store.exists(store.session_key))
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.assertFalse(store.exists(store.session_key))
+        self.assertEqual(Session.objects.get().get_decoded()['recently_viewed'], [self.product.pk])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ABANDONED_CART_DAYS=30)
+class PurgeStaleDataTests(TestCase):
+
+    def setUp(self):
+        product = make_product(Category.objects.create(name='Clothing'))
+        now = timezone.now()
+        Session.objects.bulk_create([
+            Session(session_key='live', session_data='', expire_date=now + datetime.timedelta(days=1)),
+            Session(session_key='expired', session_data='', expire_date=now - datetime.timedelta(minutes=1)),
+        ])
+        self.user = User.objects.create_user(username='shopper')
+        self.kept = [Cart.objects.create(session_key='live'), Cart.objects.create(user=self.user)]
+        self.stale = [Cart.objects.create(session_key='expired'), Cart.objects.create(session_key='gone'),
+                      Cart.objects.create(session_key='live')]
+        for cart in self.kept + self.stale:
+            CartItem.objects.create(cart=cart, product=product)
+        # Untouched for too long, whoever owns them; only the anonymous one goes
+        Cart.objects.filter(pk__in=[self.kept[1].pk, self.stale[2].pk]).update(
+            updated_at=now - datetime.timedelta(days=31),
+        )
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_stale_data', '--pause', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_expired_sessions_and_abandoned_carts_in_batches(self):
+        out = self.purge('--only', 'sessions', '--only', 'carts', '--dry-run')
+        self.assertIn('Would delete 1 expired session(s)', out)
+        self.assertIn('Would delete 3 abandoned cart(s)', out)
+        self.assertEqual(Cart.objects.count(), 5)
+
+        out = self.purge('--only', 'sessions', '--only', 'carts', '--batch-size', '2')
+        self.assertIn('Deleted 1 expired session(s) in 1 batch(es)', out)
+        self.assertIn('Deleted 3 abandoned cart(s) with 3 line(s) and reservation(s) in 2 batch(es)', out)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertEqual(set(Cart.objects.all()), set(self.kept))
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_removes_invoice_files_no_order_refers_to(self):
+        order = make_order([])
+        order.invoice_file.save('invoice_kept.pdf', ContentFile(b'%PDF kept'))
+        old = default_storage.save('invoices/invoice_old.pdf', ContentFile(b'%PDF old'))
+        new = default_storage.save('invoices/invoice_new.pdf', ContentFile(b'%PDF new'))
+        two_hours_ago = time.time() - 2 * 60 * 60
+        for name in (order.invoice_file.name, old):
+            os.utime(default_storage.path(name), (two_hours_ago, two_hours_ago))
+        self.addCleanup(lambda: [default_storage.delete(name) for name in (order.invoice_file.name, old, new)])
+
+        self.assertIn('Would delete 1 orphaned invoice file(s)', self.purge('--only', 'invoices', '--dry-run'))
+        self.assertTrue(default_storage.exists(old))
+        self.assertIn('Deleted 1 orphaned invoice file(s)', self.purge('--only', 'invoices'))
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
+        self.assertTrue(default_storage.exists(order.invoice_file.name))
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='whsec_test', RAZORPAY_KEY_SECRET='key_secret_test')
+class PaymentWebhookTests(TestCase):
+
+    def setUp(self):
+        self.product = make_product(Category.objects.create(name='Clothing'), stock=5)
+        self.order = make_order([self.product], razorpay_order_id='order_test1')
+        OrderItem.objects.filter(order=self.order).update(quantity=2)
+
+    def deliver(self, body, headers):
+        return self.client.post(reverse('razorpay_webhook'), body, content_type='application/json', **headers)
+
+    def process(self):
+        out = StringIO()
+        call_command('process_payment_events', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_rejects_bad_signatures_and_payloads(self):
+        body, headers = payments.webhook_request('payment.captured', 'order_test1', secret='wrong')
+        self.assertEqual(self.deliver(body, headers).status_code, 400)
+        headers['HTTP_X_RAZORPAY_SIGNATURE'] = payments.sign(b'[]', 'whsec_test')
+        self.assertEqual(self.deliver(b'[]', headers).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_retried_deliveries_are_stored_and_fulfilled_once(self):
+        captured = payments.webhook_request('payment.captured', 'order_test1', payment_id='pay_test1')
+        # Acknowledged with a single INSERT, before any fulfilment
+        with self.assertNumQueries(1):
+            self.assertEqual(self.deliver(*captured).status_code, 200)
+        self.assertEqual(self.deliver(*captured).status_code, 200)
+        self.deliver(*payments.webhook_request('order.paid', 'order_test1', payment_id='pay_test1'))
+        self.deliver(*payments.webhook_request('payment.captured', 'order_missing'))
+        self.assertEqual(PaymentEvent.objects.count(), 3)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).payment_status)
+
+        self.assertIn('3 event(s)', self.process())
+        self.order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.order.payment_status, self.order.razorpay_payment_id), (True, 'pay_test1'))
+        self.assertEqual(self.product.stock, 3)
+        self.assertTrue(InvoiceJob.objects.filter(order=self.order).exists())
+        self.assertEqual(
+            dict(PaymentEvent.objects.values_list('razorpay_order_id', 'status').order_by('id')[1:]),
+            {'order_test1': 'done', 'order_missing': 'failed'},
+        )
+        self.assertEqual(self.process(), '')
+
+    def test_checkout_callback_after_the_webhook_only_clears_the_cart(self):
+        self.deliver(*payments.webhook_request('payment.captured', 'order_test1', payment_id='pay_test1'))
+        self.process()
+        callback = {
+            'razorpay_order_id': 'order_test1', 'razorpay_payment_id': 'pay_test1',
+            'razorpay_signature': payments.sign(b'order_test1|pay_test1', 'key_secret_test'),
+        }
+        response = self.client.post(reverse('payment_success'), callback)
+        self.assertRedirects(response, reverse('order_success', args=[self.order.order_id]), fetch_redirect_response=False)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+        callback['razorpay_signature'] = 'forged'
+        self.assertRedirects(self.client.post(reverse('payment_success'), callback), reverse('home'),
+                             fetch_redirect_response=False)
+
+    def callback(self, client):
+        return client.post(reverse('payment_success'), {
+            'razorpay_order_id': 'order_test1', 'razorpay_payment_id': 'pay_test1',
+            'razorpay_signature': payments.sign(b'order_test1|pay_test1', 'key_secret_test'),
+        })
+
+    def test_payment_turns_the_cart_reservation_into_the_sale(self):
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('checkout'))
+        self.assertEqual(get_available_stock(self.product), 4)
+
+        self.callback(self.client)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+        # Paid already (here by the callback): the new hold is only dropped
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('checkout'))
+        self.callback(self.client)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, StockReservation.objects.count()), (3, 0))
+
+    def test_late_webhook_leaves_a_new_carts_reservations_alone(self):
+        user = User.objects.create_user('buyer', password='secret')
+        Order.objects.filter(pk=self.order.pk).update(user=user)
+        self.client.force_login(user)
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('checkout'))
+        self.callback(self.client)
+
+        # Shopping again before Razorpay's webhook for the first order lands
+        self.client.get(reverse('add_to_cart', args=[self.product.id]))
+        self.client.get(reverse('checkout'))
+        self.deliver(*payments.webhook_request('payment.captured', 'order_test1', payment_id='pay_test1'))
+        self.process()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertEqual(get_available_stock(self.product), 2)
+
+    def test_payment_takes_only_the_orders_units_from_the_cart(self):
+        scarf = make_product(self.product.category, name='Scarf', stock=5)
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        CartItem.objects.create(cart=cart, product=scarf, quantity=1)
+        reserve_cart(cart)
+
+        payments.fulfil(self.order, 'pay_test1', cart=cart)
+        self.assertEqual(
+            set(StockReservation.objects.filter(cart=cart).values_list('product_id', 'quantity')),
+            {(self.product.pk, 1), (scarf.pk, 1)},
+        )
+        self.assertFalse(StockReservation.objects.filter(order=self.order).exists())
+
+        # Paid already: only the units the order covers are let go
+        reserve_cart(cart)
+        payments.fulfil(self.order, 'pay_test1', cart=cart)
+        self.assertEqual(
+            set(StockReservation.objects.filter(cart=cart).values_list('product_id', 'quantity')),
+            {(self.product.pk, 1), (scarf.pk, 1)},
+        )
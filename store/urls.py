@@ -1,20 +1,28 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('category/<slug:slug>/', views.category_view, name='category_view'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
+    path('fragment-cache-stats/', views.fragment_cache_stats, name='fragment_cache_stats'),
     path('add-to-cart/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/', views.cart_view, name='cart_view'),
     path('update-cart/<int:item_id>/', views.update_cart, name='update_cart'),
     path('remove-from-cart/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('payment-success/', views.payment_success, name='payment_success'),
+    path('webhooks/razorpay/', views.razorpay_webhook, name='razorpay_webhook'),
     path('order-success/<str:order_id>/', views.order_success, name='order_success'),
     path('download-invoice/<str:order_id>/', views.download_invoice, name='download_invoice'),
     path('my-orders/', views.my_orders, name='my_orders'),
+    path('my-orders/export/', views.export_my_orders, name='export_my_orders'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('register/', views.register_view, name='register'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('api/products/', api.product_list, name='api_product_list'),
+    path('api/products/batch/', api.product_batch, name='api_product_batch'),
 ]
\ No newline at end of file
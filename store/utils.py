@@ -1,59 +1,74 @@
-import os
-from io import BytesIO
-from django.conf import settings
-from django.template.loader import get_template
-from xhtml2pdf import pisa
+import logging
 from django.core.files.base import ContentFile
-from .models import Order, Cart
+from django.db.models import Prefetch
+from .models import Order, Cart, CartItem
+from .invoice_renderers import InvoiceGenerationError, get_invoice_renderer
+from .sessions import persistent_key, promote
 
+logger = logging.getLogger(__name__)
 
-def generate_gst_invoice(order):
+
+def generate_gst_invoice(order, fail_silently=True):
     """
     Generates a GST invoice PDF for a given order and saves it to order.invoice_file.
+    The backend is chosen by settings.INVOICE_RENDERER.
+    With fail_silently=False errors are raised instead of returning False.
     """
     try:
-        template_path = 'store/invoice.html'
-        template = get_template(template_path)
-
-        order_items = order.items.all()
-        subtotal = sum(item.price * item.quantity for item in order_items)
-        gst_amount = sum((item.price * item.quantity * item.gst_rate) / 100 for item in order_items)
-        grand_total = subtotal + gst_amount
-
-        context = {
-            'order': order,
-            'order_items': order_items,
-            'subtotal': subtotal,
-            'gst_amount': gst_amount,
-            'grand_total': grand_total,
-        }
-
-        html = template.render(context)
-        result = BytesIO()
-        pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result)
-
-        if not pdf.err:
-            file_name = f"invoice_{order.order_id}.pdf"
-            order.invoice_file.save(file_name, ContentFile(result.getvalue()))
-            order.invoice_generated = True
-            order.save()
-            return True
-        else:
-            print("Error generating PDF:", pdf.err)
-            return False
-    except Exception as e:
-        print("Exception in generate_gst_invoice:", str(e))
+        order_items = list(order.items.select_related('product'))
+        pdf = get_invoice_renderer().render(order, order_items)
+
+        file_name = f"invoice_{order.order_id}.pdf"
+        order.invoice_file.save(file_name, ContentFile(pdf), save=False)
+        order.invoice_generated = True
+        # Only the invoice columns: payment or status changes made while the
+        # PDF was rendering must not be overwritten with this stale copy
+        order.save(update_fields=['invoice_file', 'invoice_generated', 'updated_at'])
+        return True
+    except Exception:
+        if not fail_silently:
+            raise
+        logger.exception("Could not generate the invoice for order %s", order.order_id)
         return False
 
 
-def get_or_create_cart(request):
+def load_cart(request):
+    """
+    Returns the visitor's cart with its items and products prefetched, or an
+    unsaved Cart if there is none yet. Nothing is written to the database.
+    """
+    carts = Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product__category'))
+    )
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
-        cart, created = Cart.objects.get_or_create(session_key=session_key)
+        return carts.filter(user=request.user).first() or Cart(user=request.user)
+
+    # Anonymous carts belong to database sessions only (store.sessions)
+    session_key = persistent_key(request)
+    if session_key:
+        cart = carts.filter(session_key=session_key).first()
+        if cart:
+            return cart
+    return Cart(session_key=session_key)
+
+
+def get_or_create_cart(request):
+    """
+    Returns the request's cart, saving it (and moving an anonymous visitor's
+    session into the database) only when it does not exist yet. Call this when
+    adding to the cart.
+    """
+    cart = request.cart if hasattr(request, 'cart') else load_cart(request)
+    if cart.pk is None:
+        if not request.user.is_authenticated:
+            cart.session_key = promote(request).session_key
+        cart.save()
     return cart
 
 
+def recompute_cart_totals(batch_size=500):
+    """
+    Rebuilds the denormalized totals of every cart (CartQuerySet.recompute_totals).
+    Returns the carts updated.
+    """
+    return Cart.objects.recompute_totals(batch_size=batch_size)
@@ -10,6 +10,20 @@ from django.http import JsonResponse, HttpResponse, FileResponse
 from .models import Cart, CartItem, Order, OrderItem
 from .forms import CheckoutForm
 from .utils import get_or_create_cart, generate_gst_invoice
+from .inventory import get_available_stock
+from .catalog import (
+    SORT_OPTIONS, build_query, filter_products, get_facets, keyset_page, listing_cache_key, sort_products,
+)
+from .search import autocomplete, search_products
+from .recommendations import recommended_products
+from .orders import EXPORT_HEADER, ORDER_HISTORY_ORDERING, export_rows, order_history
+from .exports import stream_csv
+from . import payments
+from .fragments import get_stats
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_POST
+from .conditional import category_state, conditional_page, is_personal, patch_catalog_headers, product_state
 
 
 # Initialize Razorpay client (Test keys)
@@ -18,43 +32,107 @@ razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZOR
 
 def home(request):
     categories = Category.objects.all()
-    featured_products = Product.objects.filter(is_active=True, featured=True)[:8]
-    latest_products = Product.objects.filter(is_active=True).order_by('-created_at')[:8]
+    featured_products, filters = filter_products(Product.objects.filter(is_active=True, featured=True), request.GET)
+    latest_products, filters = filter_products(Product.objects.filter(is_active=True), request.GET)
+    featured_sort = None
+    if 'sort' in request.GET:
+        featured_products, featured_sort = sort_products(featured_products, request.GET['sort'])
+    latest_products, sort = sort_products(latest_products, request.GET.get('sort'))
     
     context = {
         'categories': categories,
-        'featured_products': featured_products,
-        'latest_products': latest_products,
+        'featured_products': featured_products[:8],
+        'latest_products': latest_products[:8],
+        'filters': filters,
+        'sort': sort,
+        'featured_sort': featured_sort,
+        # None renders the product rows uncached (see catalog.listing_cache_key)
+        'listing_key': listing_cache_key(filters),
     }
-    return render(request, 'store/home.html', context)
+    # No validator: the fragment cache already makes a repeat render cheap
+    return patch_catalog_headers(render(request, 'store/home.html', context), is_personal(request))
 
+@conditional_page(category_state)
 def category_view(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category, is_active=True)
+    category_products = Product.objects.filter(category=category, is_active=True)
+    products, filters = filter_products(category_products, request.GET)
+    sort = request.GET.get('sort') if request.GET.get('sort') in SORT_OPTIONS else 'newest'
+    page = keyset_page(
+        products, sort,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=settings.CATALOG_PAGE_SIZE,
+    )
+    facets = get_facets(category_products)
+    for band in facets['price_bands']:
+        band['query'] = build_query(request.GET, min_price=band['min_price'], max_price=band['max_price'])
+    for discount in facets['discounts']:
+        discount['query'] = build_query(request.GET, min_discount=discount['min_discount'])
+    facets['in_stock_query'] = build_query(request.GET, in_stock=None if filters.get('in_stock') else 1)
     
     context = {
         'category': category,
-        'products': products,
+        'products': page['items'],
+        'page': page,
+        'page_query': build_query(request.GET),
+        'facets': facets,
+        'clear_query': build_query(request.GET, min_price=None, max_price=None, min_discount=None, in_stock=None),
+        'filters': filters,
+        'sort': sort,
     }
     return render(request, 'store/category.html', context)
 
+@conditional_page(product_state)
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, is_active=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_active=True
-    ).exclude(id=product.id)[:4]
-    
+    related_products = recommended_products(product, limit=4)
+
     context = {
         'product': product,
         'related_products': related_products,
     }
     return render(request, 'store/product_detail.html', context)
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page = request.GET.get('page', '1')
+    max_page = getattr(settings, 'SEARCH_MAX_PAGE', 1000)
+    page = int(page) if page.isdecimal() and 0 < int(page) <= max_page else 1
+    per_page = settings.CATALOG_PAGE_SIZE
+
+    products = []
+    if query:
+        products = search_products(
+            query,
+            Product.objects.filter(is_active=True).select_related('category'),
+            limit=per_page + 1,
+            offset=(page - 1) * per_page,
+        )
+
+    context = {
+        'query': query,
+        'products': products[:per_page],
+        'page': page,
+        'has_next': len(products) > per_page,
+    }
+    return render(request, 'store/search.html', context)
+
+def search_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    suggestions = autocomplete(query, Product.objects.filter(is_active=True)) if len(query) >= 2 else []
+    return JsonResponse({'results': suggestions})
+
+@staff_member_required
+def fragment_cache_stats(request):
+    # Counts are per cache: per process with the local-memory backend
+    return JsonResponse({'fragments': get_stats()})
+
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
+    available = get_available_stock(product, request.cart)
     
-    if product.stock <= 0:
+    if available <= 0:
         messages.error(request, 'Product is out of stock!')
         return redirect('product_detail', slug=product.slug)
     
@@ -62,7 +140,7 @@ def add_to_cart(request, product_id):
     cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
     
     if not created:
-        if cart_item.quantity < product.stock:
+        if cart_item.quantity < available:
             cart_item.quantity += 1
             cart_item.save()
         else:
@@ -72,9 +150,10 @@ def add_to_cart(request, product_id):
     messages.success(request, f'{product.name} added to cart!')
     return redirect('cart_view')
 
+@never_cache
 def cart_view(request):
-    cart = get_or_create_cart(request)
-    cart_items = cart.items.all()
+    cart = request.cart
+    cart_items = cart.get_items()
     
     context = {
         'cart': cart,
@@ -88,7 +167,7 @@ def update_cart(request, item_id):
         action = request.POST.get('action')
         
         if action == 'increase':
-            if cart_item.quantity < cart_item.product.stock:
+            if cart_item.quantity < get_available_stock(cart_item.product, cart_item.cart):
                 cart_item.quantity += 1
                 cart_item.save()
             else:
@@ -115,40 +194,67 @@ def remove_from_cart(request, item_id):
     messages.success(request, 'Item removed from cart!')
     return redirect('cart_view')
 
+@never_cache
 def my_orders(request):
     if not request.user.is_authenticated:
         messages.warning(request, 'Please login to view your orders.')
         return redirect('home')
 
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    context = {'orders': orders}
+    page = keyset_page(
+        order_history(request.user), ORDER_HISTORY_ORDERING,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=getattr(settings, 'ORDERS_PAGE_SIZE', 20),
+    )
+    context = {'orders': page['items'], 'page': page}
     return render(request, 'store/my_orders.html', context)
 
 
+@never_cache
+def export_my_orders(request):
+    if not request.user.is_authenticated:
+        messages.warning(request, 'Please login to view your orders.')
+        return redirect('home')
+    return stream_csv('my-orders.csv', EXPORT_HEADER, export_rows(request.user))
+
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from decimal import Decimal
 from .models import Cart, Order, OrderItem
 from .forms import CheckoutForm
-from .utils import get_or_create_cart, generate_gst_invoice
+from django.db import transaction
+from .utils import get_or_create_cart
+from .jobs import enqueue_invoice
+from .inventory import InsufficientStock, commit_order_stock, convert_reservations, reserve_cart
+from .pricing import price_cart_items
 
+@never_cache
 def checkout(request):
-    cart = get_or_create_cart(request)
-    cart_items = cart.items.all()
+    cart = request.cart
+    # Lines, products and categories were loaded with the cart by CartMiddleware
+    cart_items = list(cart.get_items())
 
-    if not cart_items.exists():
+    if not cart_items:
         messages.warning(request, "Your cart is empty!")
         return redirect("home")
 
-    # Calculate totals
-    subtotal = sum(item.product.get_selling_price() * item.quantity for item in cart_items)
-    gst_amount = sum((item.product.get_selling_price() * item.quantity * item.product.gst_rate)/100 for item in cart_items)
-    total_amount = subtotal + gst_amount
+    # Hold the stock while the customer fills in the form and pays
+    try:
+        reserve_cart(cart)
+    except InsufficientStock as e:
+        messages.error(request, f"Some items in your cart are no longer available. {e}")
+        return redirect("cart_view")
+
+    # Calculate totals in one pass over the lines
+    prices = price_cart_items(cart_items)
+    subtotal = prices.subtotal
+    gst_amount = prices.gst_amount
+    total_amount = prices.total
 
     if request.method == "POST":
         form = CheckoutForm(request.POST)
         if form.is_valid():
-            # Create Order
             order = form.save(commit=False)
             if request.user.is_authenticated:
                 order.user = request.user
@@ -157,24 +263,35 @@ def checkout(request):
             order.total_amount = total_amount
             order.payment_status = True  # Direct success
             order.status = 'processing'
-            order.save()
 
-            # Create Order Items
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=item.product.get_selling_price(),
-                    hsn_code=item.product.hsn_code,
-                    gst_rate=item.product.gst_rate
-                )
-
-            # Generate GST Invoice
-            generate_gst_invoice(order)
-
-            # Clear cart
-            cart.items.all().delete()
+            try:
+                with transaction.atomic():
+                    # Create Order and its items
+                    order.save()
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=order,
+                            product=item.product,
+                            quantity=item.quantity,
+                            price=line.unit_price,
+                            hsn_code=item.product.hsn_code,
+                            gst_rate=line.gst_rate
+                        )
+                        for item, line in zip(cart_items, prices.lines)
+                    ])
+
+                    # Payment is taken directly, so the reservation becomes a sale
+                    convert_reservations(cart, order)
+                    commit_order_stock(order)
+
+                    # Queue GST Invoice
+                    enqueue_invoice(order)
+
+                    # Clear cart
+                    cart.clear()
+            except InsufficientStock as e:
+                messages.error(request, f"Some items in your cart are no longer available. {e}")
+                return redirect("cart_view")
 
             messages.success(request, "Payment successful! Your order has been placed.")
             return redirect("order_success", order_id=order.order_id)
@@ -195,22 +312,26 @@ def checkout(request):
     return render(request, "store/checkout.html", context)
 
 
+@never_cache
 def order_success(request, order_id):
     order = get_object_or_404(Order, order_id=order_id)
     return render(request, "store/order_success.html", {"order": order})
 
 
+@never_cache
 def download_invoice(request, order_id):
     order = get_object_or_404(Order, order_id=order_id)
-    if not order.invoice_generated:
-        generate_gst_invoice(order)
-    if order.invoice_file:
+    if order.invoice_generated and order.invoice_file:
         from django.http import FileResponse
         response = FileResponse(order.invoice_file.open('rb'), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="invoice_{order.order_id}.pdf"'
         return response
-    messages.error(request, "Invoice not found!")
-    return redirect("home")
+    # Customers can't restart a job that has run out of attempts
+    if enqueue_invoice(order, retry_failed=False).status == 'failed':
+        messages.error(request, "We couldn't generate your invoice. Please contact us and we'll send it to you.")
+    else:
+        messages.info(request, "Your invoice is being generated. Please try again in a moment.")
+    return redirect("order_success", order_id=order.order_id)
 
 
 @csrf_exempt
@@ -226,48 +347,45 @@ def payment_success(request):
         messages.error(request, "Payment data missing!")
         return redirect('home')
 
-    params_dict = {
-        'razorpay_order_id': order_id,
-        'razorpay_payment_id': payment_id,
-        'razorpay_signature': signature
-    }
-
-    try:
-        # Verify Razorpay signature
-        razorpay_client.utility.verify_payment_signature(params_dict)
-
-        # Get order
-        order = get_object_or_404(Order, razorpay_order_id=order_id)
-        order.razorpay_payment_id = payment_id
-        order.razorpay_signature = signature
-        order.payment_status = True
-        order.status = 'processing'
-        order.save()
-
-        # Update product stock
-        for item in order.items.all():
-            product = item.product
-            product.stock -= item.quantity
-            product.save()
-
-        # Generate GST Invoice
-        generate_gst_invoice(order)
-
-        # Clear cart
-        cart = get_or_create_cart(request)
-        cart.items.all().delete()
-
-        messages.success(request, 'Payment successful! Your order has been placed.')
-        return redirect('order_success', order_id=order.order_id)
-
-    except razorpay.errors.SignatureVerificationError:
+    # Checked locally (store.payments); a callback for an order a webhook has
+    # already fulfilled only clears the cart
+    if not payments.verify_payment(order_id, payment_id, signature):
         messages.error(request, 'Payment verification failed!')
         return redirect('home')
-    except Exception as e:
-        messages.error(request, f'Error processing payment: {str(e)}')
-        return redirect('home')
-    
-        from django.shortcuts import render, redirect
+
+    order = get_object_or_404(Order, razorpay_order_id=order_id)
+    cart = request.cart
+    try:
+        payments.fulfil(order, payment_id, signature, cart=cart if cart.pk else None)
+    except InsufficientStock as e:
+        messages.error(request, f'Sorry, some items are no longer available. {e}')
+        return redirect('cart_view')
+
+    # Clear cart
+    if cart.pk:
+        cart.clear()
+
+    messages.success(request, 'Payment successful! Your order has been placed.')
+    return redirect('order_success', order_id=order.order_id)
+
+
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Verifies and stores a Razorpay webhook delivery; it is fulfilled later by
+    `manage.py process_payment_events`, so Razorpay gets its 200 straight away.
+    """
+    if not payments.verify_webhook(request.body, request.headers.get('X-Razorpay-Signature', '')):
+        return JsonResponse({'status': 'error', 'message': 'Invalid signature'}, status=400)
+    try:
+        payments.record_event(request.body, request.headers.get('X-Razorpay-Event-Id'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'ok'})
+
+
+from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages